@@ -0,0 +1,236 @@
+import codecs
+import json
+import os
+from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, request, session, stream_with_context
+import colaboracao
+import importacao
+import models as dbHandler
+import pdf_cache
+from db import get_db
+
+# API JSON versionada (/api/v1), para integrações que hoje raspam o HTML de
+# visualizar_ata uma ata por vez.
+#   GET  /api/v1/atas?ids=1,2,3            várias atas com os detalhes decodificados
+#   GET  /api/v1/atas?inicio=&fim=[&tipo=] (ou ?mes=, ?ano=) por período
+#   GET  ...&formato=ndjson                 uma ata por linha, em streaming, sem limite
+#   POST /api/v1/atas                       cria/substitui várias atas numa transação
+#   POST /api/v1/importar                   importação de CSV/JSON em lote (importacao.py)
+# Os detalhes saem de models.detalhes_das_atas, a mesma decodificação de
+# detalhes_sacramental/detalhes_batismo que a tela usa, só que em lote (três
+# consultas por bloco de atas em vez de duas por ata). O formato de escrita é
+# o mesmo da leitura: o que o GET devolve pode voltar no POST.
+# Autenticação pela sessão do login, como o resto da aplicação.
+
+bp = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+TIPOS = ('sacramental', 'batismo')
+
+# Atas por consulta de detalhes no streaming (fica bem abaixo do limite de ? do SQLite)
+BLOCO_NDJSON = 200
+
+
+def init_app(app):
+    app.config.setdefault('API_MAX_LOTE', int(os.environ.get('API_MAX_LOTE', 500)))
+    app.register_blueprint(bp)
+
+
+@bp.before_request
+def exigir_login():
+    if not session.get('logged_in'):
+        return jsonify({'erro': 'Não autenticado'}), 401
+
+
+def ata_com_detalhes(ata, detalhes):
+    return {**dict(ata), 'detalhes': detalhes}
+
+
+def _ler_ids(texto):
+    """Lista de ids sem repetição, na ordem pedida; ValueError se inválida"""
+    ids = []
+    for parte in texto.split(','):
+        if parte.strip():
+            ata_id = int(parte)
+            if ata_id not in ids:
+                ids.append(ata_id)
+    if not ids:
+        raise ValueError("ids vazio")
+    return ids
+
+
+def _atas_por_ids(ala_id, ids):
+    marcas = ','.join('?' * len(ids))
+    encontradas = {
+        ata['id']: ata for ata in get_db().execute(
+            f"SELECT * FROM atas WHERE ala_id = ? AND id IN ({marcas})", (ala_id, *ids)
+        )
+    }
+    return [encontradas[i] for i in ids if i in encontradas]
+
+
+def _em_blocos(linhas, tamanho):
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) == tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+@bp.route('/atas', methods=['GET'])
+def listar_atas():
+    ala_id = session['user_id']
+    limite = current_app.config['API_MAX_LOTE']
+    tipo = request.args.get('tipo') or None
+    if tipo not in (None, *TIPOS):
+        return jsonify({'erro': 'tipo inválido'}), 400
+
+    if request.args.get('ids'):
+        try:
+            ids = _ler_ids(request.args['ids'])
+        except ValueError:
+            return jsonify({'erro': 'ids inválido: use ids=1,2,3'}), 400
+        if len(ids) > limite:
+            return jsonify({'erro': f'no máximo {limite} ids por requisição'}), 400
+        atas = [a for a in _atas_por_ids(ala_id, ids) if tipo in (None, a['tipo'])]
+    else:
+        try:
+            inicio, fim = dbHandler.ler_periodo(request.args)
+        except ValueError:
+            return jsonify({'erro': 'informe ids=, mes=YYYY-MM, ano=YYYY ou inicio=YYYY-MM-DD&fim=YYYY-MM-DD'}), 400
+        # Cursor do SQLite: no NDJSON as atas são lidas aos poucos, junto com a resposta
+        atas = dbHandler.atas_do_periodo(ala_id, inicio, fim, tipo)
+        ids = None
+
+    if request.args.get('formato') == 'ndjson':
+        def gerar():
+            for bloco in _em_blocos(atas, BLOCO_NDJSON):
+                detalhes = dbHandler.detalhes_das_atas(bloco)
+                yield ''.join(
+                    json.dumps(ata_com_detalhes(ata, detalhes[ata['id']]), ensure_ascii=False) + '\n'
+                    for ata in bloco
+                )
+        return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+    if ids is None:
+        atas = atas.fetchmany(limite + 1)
+        if len(atas) > limite:
+            return jsonify({'erro': f'mais de {limite} atas no período: use formato=ndjson'}), 400
+    detalhes = dbHandler.detalhes_das_atas(atas)
+    resultado = {'atas': [ata_com_detalhes(ata, detalhes[ata['id']]) for ata in atas]}
+    if ids is not None:
+        vistas = {ata['id'] for ata in atas}
+        resultado['ausentes'] = [i for i in ids if i not in vistas]
+    return jsonify(resultado)
+
+
+def _validar_item(item, existentes):
+    """(ata_id ou None, tipo, data, detalhes) de um item do POST; ValueError com o motivo se inválido"""
+    if not isinstance(item, dict):
+        raise ValueError("item deve ser um objeto")
+    tipo = item.get('tipo')
+    if tipo not in TIPOS:
+        raise ValueError("tipo deve ser 'sacramental' ou 'batismo'")
+    data = item.get('data')
+    try:
+        datetime.strptime(data or '', "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError("data deve ser YYYY-MM-DD")
+
+    ata_id = item.get('id')
+    if ata_id is not None:
+        if ata_id not in existentes:
+            raise ValueError(f"ata {ata_id} não encontrada")
+        # A linha de detalhes antiga ficaria órfã na outra tabela
+        if existentes[ata_id] != tipo:
+            raise ValueError("o tipo de uma ata existente não pode mudar")
+
+    detalhes = item.get('detalhes') or {}
+    dbHandler.validar_detalhes(tipo, detalhes)
+    return ata_id, tipo, data, detalhes
+
+
+@bp.route('/atas', methods=['POST'])
+def gravar_atas():
+    """Cria (sem id) ou substitui (com id) várias atas; tudo ou nada"""
+    ala_id = session['user_id']
+    corpo = request.get_json(silent=True)
+    itens = corpo.get('atas') if isinstance(corpo, dict) else corpo
+    if not isinstance(itens, list) or not itens:
+        return jsonify({'erro': 'envie {"atas": [...]} com ao menos uma ata'}), 400
+    limite = current_app.config['API_MAX_LOTE']
+    if len(itens) > limite:
+        return jsonify({'erro': f'no máximo {limite} atas por requisição'}), 400
+
+    ids = [item['id'] for item in itens if isinstance(item, dict) and item.get('id') is not None]
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return jsonify({'erro': 'id deve ser um número inteiro'}), 400
+    if len(set(ids)) != len(ids):
+        return jsonify({'erro': 'a mesma ata aparece mais de uma vez'}), 400
+    existentes = {ata['id']: ata['tipo'] for ata in _atas_por_ids(ala_id, ids)} if ids else {}
+
+    # Valida tudo antes de escrever: um item ruim não deixa o lote pela metade
+    validos, erros = [], []
+    for posicao, item in enumerate(itens):
+        try:
+            validos.append(_validar_item(item, existentes))
+        except ValueError as e:
+            erros.append({'posicao': posicao, 'erro': str(e)})
+    if erros:
+        return jsonify({'erro': 'lote inválido, nada foi gravado', 'itens': erros}), 400
+
+    conn = get_db()
+    try:
+        gravados = [
+            (dbHandler.gravar_ata(ala_id, tipo, data, detalhes, ata_id), ata_id is None)
+            for ata_id, tipo, data, detalhes in validos
+        ]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    cache = pdf_cache.get_cache()
+    estado = colaboracao.get_estado(current_app.extensions['socketio'])
+    for ata_id, criada in gravados:
+        cache.invalidar(ata_id=ata_id)
+        if not criada:
+            # Quem estiver editando a ata recebe o valor novo, como depois do formulário
+            estado.recarregar(f"ata-{ata_id}")
+
+    revisoes = {
+        ata['id']: ata['revisao'] for ata in _atas_por_ids(ala_id, [ata_id for ata_id, _ in gravados])
+    }
+    print(f"API: {len(gravados)} ata(s) gravada(s) na ala {ala_id}")
+    return jsonify({'atas': [
+        {'id': ata_id, 'criada': criada, 'revisao': revisoes.get(ata_id)} for ata_id, criada in gravados
+    ]})
+
+
+@bp.route('/importar', methods=['POST'])
+def importar_atas():
+    """Importa CSV, JSON ou JSON Lines, no corpo da requisição ou no campo 'arquivo' de um formulário"""
+    arquivo = request.files.get('arquivo')
+    if arquivo:
+        fluxo, formato = arquivo.stream, importacao.formato_do_arquivo(arquivo.filename, arquivo.mimetype)
+    else:
+        fluxo, formato = request.stream, importacao.formato_do_arquivo(mimetype=request.mimetype)
+    formato = request.args.get('formato') or formato
+    if formato not in importacao.FORMATOS:
+        return jsonify({'erro': 'formato não reconhecido: use formato=csv ou formato=json'}), 400
+
+    codificacao = request.args.get('codificacao') or request.mimetype_params.get('charset') or 'utf-8-sig'
+    try:
+        # utf-8-sig também lê UTF-8 sem BOM
+        if codecs.lookup(codificacao).name == 'utf-8':
+            codificacao = 'utf-8-sig'
+    except LookupError:
+        return jsonify({'erro': f'codificação desconhecida: {codificacao}'}), 400
+
+    relatorio = importacao.importar(
+        session['user_id'], importacao.ler_arquivo(fluxo, formato, codificacao),
+        current_app.config['IMPORTACAO_LOTE']
+    )
+    return jsonify(relatorio)
@@ -1,31 +1,53 @@
 import os
+import sys
+import click
 import io
-import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash, session, jsonify
-from flask_socketio import SocketIO, join_room, leave_room, emit
+from flask import Flask, render_template, request, redirect, url_for, send_file, flash, session, jsonify, Response, stream_with_context
+from flask_socketio import SocketIO, join_room, emit
 from functools import wraps
 import json
 from datetime import datetime, timedelta
 import calendar
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.platypus import Paragraph, Table, TableStyle
-from reportlab.lib import colors
+import hashlib
 import models as dbHandler
+import db
+import migrations
+import pdf_cache
+import pdf_jobs
+import registro_templates
+import colaboracao
+import mensageria
+import compacto
+import api
+import importacao
+import exportacao
+import time
+import zipfile
 
 app = Flask(__name__)
 
+# Fila de mensagens entre workers (SOCKETIO_MESSAGE_QUEUE): sem ela, com
+# gunicorn -w N cada worker só entrega os emits aos seus próprios clientes
+mensageria.init_app(app)
+
+# Modo compacto da edição colaborativa (SOCKET_COMPACTO) e compressão das
+# respostas do long-polling a partir de SOCKET_COMPRESSAO_MIN_BYTES
+compacto.init_app(app)
+
 # Configuração do SocketIO para produção 
 try:
     import eventlet
     socketio = SocketIO(app, 
                        cors_allowed_origins="*",
-                       async_mode='eventlet')
+                       async_mode='eventlet',
+                       compression_threshold=app.config['SOCKET_COMPRESSAO_MIN_BYTES'],
+                       **mensageria.opcoes_socketio(app))
 except ImportError:
     socketio = SocketIO(app, 
                        cors_allowed_origins="*",
-                       async_mode='threading')
+                       async_mode='threading',
+                       compression_threshold=app.config['SOCKET_COMPRESSAO_MIN_BYTES'],
+                       **mensageria.opcoes_socketio(app))
 
 #Secret key para RENDER
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-123')
@@ -36,22 +58,40 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-123')
 # else:
 #     DB_PATH = "database/atas.db"
 
-# Configuração do Secret Key e Database para desenvolvimento local :)
-def get_db():
-    conn = sqlite3.connect("database/atas.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+# Pool de conexões SQLite (WAL + PRAGMAs) com checkout por requisição.
+# get_db() devolve sempre a mesma conexão dentro do contexto da aplicação e
+# ela volta ao pool sozinha no teardown, então as rotas não precisam fechá-la.
+# Tamanho do pool, caminho e PRAGMAs: DB_PATH, DB_POOL_SIZE, DB_PRAGMA_<NOME>.
+# Com eventlet a espera por uma conexão livre cede a vez (socketio.sleep).
+db.init_app(app, dormir=socketio.sleep if socketio.async_mode == 'eventlet' else None)
+get_db = db.get_db
+
+# Cache dos PDFs exportados: PDF_CACHE_DIR, PDF_CACHE_MEMORIA_MB, PDF_CACHE_DISCO_MB
+pdf_cache.init_app(app)
+
+# Geração dos PDFs fora do worker: PDF_PROCESSOS (0 = no próprio worker),
+# PDF_FILA_MAX e PDF_TIMEOUT. socketio.sleep cede a vez enquanto o PDF é gerado.
+pdf_jobs.init_app(app, dormir=socketio.sleep)
+
+# Templates em memória por worker, conferidos pela versão no banco
+# a cada TEMPLATES_VERIFICAR_SEGUNDOS
+registro_templates.init_app(app)
+
+# Edição colaborativa: field_update agrupado por sala a cada SOCKET_TICK_MS
+colaboracao.init_app(app)
 
-# Inicialização do banco de dados
+# API JSON em /api/v1 (leitura e escrita em lote, NDJSON): API_MAX_LOTE
+api.init_app(app)
+
+# Importação de atas antigas (CSV/JSON), IMPORTACAO_LOTE atas por transação
+importacao.init_app(app)
+
+# Inicialização do banco de dados: aplica as migrações pendentes de
+# database/migrations. Com o schema em dia é só um PRAGMA user_version.
 def init_db():
     with app.app_context():
-        conn = get_db()
-        try:
-            with open("database/schema.sql") as f:
-                conn.executescript(f.read())
-            conn.commit()
-        except Exception as e:
-            print(f"Erro ao inicializar banco: {e}")
+        for migracao in migrations.migrar(get_db()):
+            print(f"Migração aplicada: {migracao.versao:04d} {migracao.nome}")
 
 # Mensagem Autenticação no Login
 def login_required(f):
@@ -70,7 +110,6 @@ def authenticate_user(username, password):
         "SELECT * FROM users WHERE username = ? AND password = ?", 
         (username, password)
     ).fetchone()
-    conn.close()
     return user
 
 # ==================================================================
@@ -84,8 +123,7 @@ def configuracoes():
     conn = get_db()
     
     # Buscar templates
-    templates = conn.execute("SELECT * FROM templates").fetchall()
-    templates = [dict(template) for template in templates]
+    templates = registro_templates.get_registro().todos()
     
     # Buscar informações da unidade
     unidade = conn.execute(
@@ -97,39 +135,18 @@ def configuracoes():
     else:
         unidade = {}
     
-    # Buscar estatísticas
-    total_atas = conn.execute(
-        "SELECT COUNT(*) FROM atas WHERE ala_id = ?", 
-        (session['user_id'],)
-    ).fetchone()[0]
-    
-    atas_sacramentais = conn.execute(
-        "SELECT COUNT(*) FROM atas WHERE ala_id = ? AND tipo = 'sacramental'", 
-        (session['user_id'],)
-    ).fetchone()[0]
-    
-    atas_batismo = conn.execute(
-        "SELECT COUNT(*) FROM atas WHERE ala_id = ? AND tipo = 'batismo'", 
-        (session['user_id'],)
-    ).fetchone()[0]
-    
-    # Atas deste mês
+    # Estatísticas: uma consulta em estatisticas_ala (mantida por triggers)
     mes_atual = datetime.now().strftime("%Y-%m")
-    atas_mes = conn.execute(
-        "SELECT COUNT(*) FROM atas WHERE ala_id = ? AND strftime('%Y-%m', data) = ?", 
-        (session['user_id'], mes_atual)
-    ).fetchone()[0]
-    
-    conn.close()
+    estatisticas = dbHandler.estatisticas_da_ala(session['user_id'], mes_atual)
     
     return render_template(
         "configuracoes.html",
         templates=templates,
         unidade=unidade,
-        total_atas=total_atas,
-        atas_sacramentais=atas_sacramentais,
-        atas_batismo=atas_batismo,
-        atas_mes=atas_mes
+        total_atas=estatisticas['total'],
+        atas_sacramentais=estatisticas['sacramentais'],
+        atas_batismo=estatisticas['batismos'],
+        atas_mes=estatisticas['no_mes']
     )
 
 # Rota para salvar configurações da ala
@@ -165,7 +182,7 @@ def salvar_configuracoes_ala():
         """, (session['user_id'], nome_ala, bispo, conselheiros, horario, estaca))
     
     conn.commit()
-    conn.close()
+    pdf_cache.get_cache().invalidar(ala_id=session['user_id'])
     
     flash("Configurações da ala salvas com sucesso!", "success")
     return redirect(url_for("configuracoes"))
@@ -174,18 +191,11 @@ def salvar_configuracoes_ala():
 @app.route("/configuracoes/template/<int:template_id>")
 @login_required
 def editar_template(template_id):
-    conn = get_db()
-    template = conn.execute(
-        "SELECT * FROM templates WHERE id = ?", 
-        (template_id,)
-    ).fetchone()
+    template = registro_templates.get_registro().por_id(template_id)
     
     if template:
-        template = dict(template)
-        conn.close()
         return render_template("_editar_template.html", template=template)
     else:
-        conn.close()
         return "Template não encontrado", 404
 
 # Rota para salvar template
@@ -225,13 +235,13 @@ def salvar_template(template_id):
         ))
         
         conn.commit()
-        conn.close()
+        registro_templates.get_registro().invalidar()
+        pdf_cache.get_cache().invalidar(template_id=template_id)
         
         flash("Template atualizado com sucesso!", "success")
         return redirect(url_for("configuracoes"))
         
     except Exception as e:
-        conn.close()
         print(f"Erro ao salvar template: {e}")
         flash("Erro ao salvar template", "error")
         return redirect(url_for("configuracoes"))
@@ -268,13 +278,12 @@ def criar_template():
         ))
         
         conn.commit()
-        conn.close()
+        registro_templates.get_registro().invalidar()
         
         flash("Novo template criado com sucesso!", "success")
         return redirect(url_for("configuracoes"))
         
     except Exception as e:
-        conn.close()
         print(f"Erro ao criar template: {e}")
         flash("Erro ao criar template", "error")
         return redirect(url_for("configuracoes"))
@@ -286,34 +295,33 @@ def apagar_template(template_id):
     conn = get_db()
     
     try:
-        # Verificar se o template existe
-        template = conn.execute(
-            "SELECT * FROM templates WHERE id = ?", 
+        # Não permitir apagar todos os templates - manter pelo menos um de cada tipo.
+        # A contagem é feita no banco, no próprio DELETE: o registro em memória pode
+        # estar atrasado em relação a outro worker que acabou de apagar um template.
+        apagados = conn.execute(
+            """
+            DELETE FROM templates
+            WHERE id = ?
+              AND (SELECT COUNT(*) FROM templates t WHERE t.tipo_template = templates.tipo_template) > 1
+            """,
             (template_id,)
-        ).fetchone()
-        
-        if not template:
-            return jsonify({
-                'success': False,
-                'message': 'Template não encontrado'
-            }), 404
-        
-        # Não permitir apagar todos os templates - manter pelo menos um de cada tipo
-        templates_restantes = conn.execute(
-            "SELECT COUNT(*) FROM templates WHERE tipo_template = ?", 
-            (template['tipo_template'],)
-        ).fetchone()[0]
-        
-        if templates_restantes <= 1:
+        ).rowcount
+        conn.commit()
+
+        if not apagados:
+            if conn.execute("SELECT 1 FROM templates WHERE id = ?", (template_id,)).fetchone() is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Template não encontrado'
+                }), 404
             return jsonify({
                 'success': False,
                 'message': 'Não é possível apagar o último template deste tipo'
             }), 400
-        
-        # Apagar o template
-        conn.execute("DELETE FROM templates WHERE id = ?", (template_id,))
-        conn.commit()
-        conn.close()
+
+        registro = registro_templates.get_registro()
+        registro.invalidar()
+        pdf_cache.get_cache().invalidar(template_id=template_id)
         
         return jsonify({
             'success': True,
@@ -321,7 +329,6 @@ def apagar_template(template_id):
         })
         
     except Exception as e:
-        conn.close()
         print(f"Erro ao apagar template: {e}")
         return jsonify({
             'success': False,
@@ -335,46 +342,11 @@ def apagar_template(template_id):
 # Aba de discursantes recentes na criação de atas sacramentais
 def get_discursantes_recentes():
     """Busca discursantes dos últimos 3 meses"""
-    conn = get_db()
-    
     # Data de 3 meses atrás
     tres_meses_atras = (datetime.now().replace(day=1) - timedelta(days=90)).strftime("%Y-%m-%d")
     
-    discursantes = conn.execute("""
-        SELECT s.discursantes, a.data 
-        FROM sacramental s 
-        JOIN atas a ON s.ata_id = a.id 
-        WHERE a.data >= ? AND a.tipo = 'sacramental' AND a.ala_id = ?
-        ORDER BY a.data DESC
-    """, (tres_meses_atras, session['user_id'])).fetchall()
-    
-    # Processar e consolidar discursantes
-    todos_discursantes = []
-    nomes_ja_adicionados = set()  # Para evitar duplicatas
-    
-    for row in discursantes:
-        if row['discursantes']:
-            try:
-                discursantes_lista = json.loads(row['discursantes'])
-                for discursante in discursantes_lista:
-                    if discursante and discursante.strip():
-                        nome_limpo = discursante.strip()
-                        # Evitar duplicatas
-                        if nome_limpo not in nomes_ja_adicionados:
-                            # Formatar data para exibição
-                            data_obj = datetime.strptime(row['data'], "%Y-%m-%d")
-                            data_formatada = data_obj.strftime("%d/%m/%Y")
-                            
-                            todos_discursantes.append({
-                                'nome': nome_limpo,
-                                'data': data_formatada
-                            })
-                            nomes_ja_adicionados.add(nome_limpo)
-            except json.JSONDecodeError:
-                continue
-    
     # Limitar a 20 discursantes mais recentes
-    return todos_discursantes[:20]
+    return dbHandler.discursantes_recentes(session['user_id'], tres_meses_atras, limite=20)
 
 # Próxima reunião sacramental automática na página inicial
 def get_proxima_reuniao_sacramental():
@@ -447,8 +419,6 @@ def logout():
 @app.route('/index')
 @login_required
 def index():
-    conn = get_db()
-    
     # Gerar lista de meses para o seletor EM PORTUGUÊS
     meses = []
     current_year = datetime.now().year
@@ -473,10 +443,7 @@ def index():
     mes_nome = meses_ptbr[datetime.now().month] + " " + str(datetime.now().year)  # CORREÇÃO: Definir mes_nome
     
     # Carregar atas do mês atual da ala do usuário
-    atas = conn.execute(
-        "SELECT * FROM atas WHERE strftime('%Y-%m', data) = ? AND ala_id = ? ORDER BY data DESC", 
-        (mes_atual, session['user_id'])
-    ).fetchall()
+    atas = dbHandler.atas_do_mes(session['user_id'], mes_atual)
     
     # Buscar próxima reunião sacramental
     proxima_reuniao = get_proxima_reuniao_sacramental()
@@ -490,55 +457,53 @@ def index():
         proxima_reuniao=proxima_reuniao
     )
 
-# Rota para visualizar todas as atas
+# Atas por página em /atas (o resto vem por rolagem, em JSON)
+app.config.setdefault('ATAS_POR_PAGINA', int(os.environ.get('ATAS_POR_PAGINA', 30)))
+
+def ata_para_lista(ata):
+    """Item da lista de /atas para o JSON da rolagem infinita"""
+    return {
+        'id': ata['id'],
+        'tipo': ata['tipo'],
+        'data': ata['data'],
+        'status': ata['status'],
+        'tema': ata['tema'],
+        'url_ver': url_for('visualizar_ata', ata_id=ata['id']),
+        'url_editar': url_for('editar_ata', ata_id=ata['id']),
+        'url_pdf': url_for('exportar_sacramental_pdf' if ata['tipo'] == 'sacramental' else 'exportar_pdf', ata_id=ata['id']),
+    }
+
+# Rota para visualizar todas as atas.
+# Uma página por vez (paginação por chave, ver models.pagina_de_atas):
+# ?cursor= continua de onde a anterior parou e ?formato=json devolve só as
+# atas e o próximo cursor, para a rolagem infinita de todas_atas.html.
 @app.route("/atas")
 @login_required
 def listar_todas_atas():
     conn = get_db()
+    formato_json = request.args.get("formato") == "json"
+    limite = request.args.get("limite", app.config['ATAS_POR_PAGINA'], type=int)
+    limite = max(1, min(limite, 100))
     
-    # Buscar todas as atas da ala, ordenadas da mais recente para a mais antiga
-    atas = conn.execute("""
-        SELECT a.*, s.tema 
-        FROM atas a 
-        LEFT JOIN sacramental s ON a.id = s.ata_id 
-        WHERE a.ala_id = ? 
-        ORDER BY a.data DESC
-    """, (session['user_id'],)).fetchall()
+    try:
+        atas, proximo = dbHandler.pagina_de_atas(session['user_id'], request.args.get("cursor"), limite)
+    except ValueError:
+        if formato_json:
+            return jsonify({'erro': 'cursor inválido'}), 400
+        flash("Página inválida", "error")
+        return redirect(url_for("listar_todas_atas"))
+    
+    if formato_json:
+        return jsonify({'atas': [ata_para_lista(ata) for ata in atas], 'proximo': proximo})
+    
+    total_atas = dbHandler.estatisticas_da_ala(session['user_id'], datetime.now().strftime("%Y-%m"))['total']
     
     # Buscar discursantes dos últimos 3 meses
     tres_meses_atras = (datetime.now().replace(day=1) - timedelta(days=90)).strftime("%Y-%m-%d")
     
-    discursantes_recentes = conn.execute("""
-        SELECT s.discursantes, a.data, s.tema
-        FROM sacramental s 
-        JOIN atas a ON s.ata_id = a.id 
-        WHERE a.data >= ? AND a.tipo = 'sacramental' AND a.ala_id = ?
-        ORDER BY a.data DESC
-    """, (tres_meses_atras, session['user_id'])).fetchall()
-    
-    # Processar discursantes
-    todos_discursantes = []
-    nomes_ja_adicionados = set()
-    
-    for row in discursantes_recentes:
-        if row['discursantes']:
-            try:
-                discursantes_lista = json.loads(row['discursantes'])
-                for discursante in discursantes_lista:
-                    if discursante and discursante.strip():
-                        nome_limpo = discursante.strip()
-                        if nome_limpo not in nomes_ja_adicionados:
-                            data_obj = datetime.strptime(row['data'], "%Y-%m-%d")
-                            data_formatada = data_obj.strftime("%d/%m/%Y")
-                            
-                            todos_discursantes.append({
-                                'nome': nome_limpo,
-                                'data': data_formatada,
-                                'tema': row['tema'] or 'Sem tema definido'
-                            })
-                            nomes_ja_adicionados.add(nome_limpo)
-            except json.JSONDecodeError:
-                continue
+    todos_discursantes = dbHandler.discursantes_recentes(session['user_id'], tres_meses_atras, limite=20)
+    for discursante in todos_discursantes:
+        discursante['tema'] = discursante['tema'] or 'Sem tema definido'
     
     # Buscar temas dos últimos 3 meses
     temas_recentes = conn.execute("""
@@ -559,15 +524,40 @@ def listar_todas_atas():
                 'data': data_formatada
             })
     
-    conn.close()
-    
     return render_template(
         "todas_atas.html",
         atas=atas,
-        discursantes_recentes=todos_discursantes[:20],  # Limitar a 20
+        proximo=proximo,
+        total_atas=total_atas,
+        discursantes_recentes=todos_discursantes,
         temas_recentes=temas_formatados
     )
 
+# Busca de texto completo nas atas da ala (FTS5, ver models.buscar_atas).
+# ?q= é o texto digitado; ?formato=json devolve os resultados em JSON, com os
+# trechos já escapados e destacados com <mark>.
+@app.route("/atas/buscar")
+@login_required
+def buscar_atas():
+    texto = request.args.get("q", "").strip()
+    limite = max(1, min(request.args.get("limite", 20, type=int), 50))
+    inicio = time.perf_counter()
+    resultados = dbHandler.buscar_atas(session['user_id'], texto, limite) if texto else []
+    tempo_ms = round((time.perf_counter() - inicio) * 1000, 2)
+    
+    if request.args.get("formato") == "json":
+        return jsonify({
+            'q': texto,
+            'tempo_ms': tempo_ms,
+            'resultados': [
+                dict(r, tema=str(r['tema']), trecho=str(r['trecho']),
+                     url_ver=url_for('visualizar_ata', ata_id=r['id']))
+                for r in resultados
+            ],
+        })
+    
+    return render_template("buscar_atas.html", q=texto, resultados=resultados, tempo_ms=tempo_ms)
+
 # Rota para editar uma ata existente
 @app.route("/ata/editar/<int:ata_id>")
 @login_required
@@ -599,14 +589,19 @@ def excluir_ata(ata_id: int):
     # Primeiro, exclui os detalhes específicos
     ata = conn.execute("SELECT * FROM atas WHERE id=?", (ata_id,)).fetchone()
     if ata:
+        chaves_discursantes = dbHandler.chaves_discursantes(ata_id)
         if ata["tipo"] == "sacramental":
             conn.execute("DELETE FROM sacramental WHERE ata_id=?", (ata_id,))
         else:
             conn.execute("DELETE FROM batismo WHERE ata_id=?", (ata_id,))
+        dbHandler.excluir_participantes(ata_id)
         
         # Depois exclui a ata principal
         conn.execute("DELETE FROM atas WHERE id=?", (ata_id,))
+        dbHandler.atualizar_ultimas_falas(ata["ala_id"], chaves_discursantes)
         conn.commit()
+        pdf_cache.get_cache().invalidar(ata_id=ata_id)
+        colaboracao.get_estado(socketio).descartar(f"ata-{ata_id}")
         flash("Ata excluída com sucesso!", "success")
     else:
         flash("Ata não encontrada", "error")
@@ -618,16 +613,18 @@ def excluir_ata(ata_id: int):
 @app.route("/atas/mes/<string:mes>")
 @login_required
 def listar_atas_mes(mes):
-    conn = get_db()
-    
     try:
         # Validar formato do mês (YYYY-MM)
         datetime.strptime(mes, "%Y-%m")
         
-        atas = conn.execute(
-            "SELECT * FROM atas WHERE strftime('%Y-%m', data) = ? AND ala_id = ? ORDER BY data DESC", 
-            (mes, session['user_id'])
-        ).fetchall()
+        # Validador do mês: maior revisão + quantidade de atas (ver nao_modificado)
+        revisao, quantidade = dbHandler.revisao_do_mes(session['user_id'], mes)
+        etag = f"mes{session['user_id']}-{mes}-r{revisao}-n{quantidade}-{VERSAO_PAGINAS}"
+        resposta = nao_modificado(etag)
+        if resposta:
+            return resposta
+        
+        atas = dbHandler.atas_do_mes(session['user_id'], mes)
         
         # Formatar nome do mês para exibição EM PORTUGUÊS
         meses_ptbr = [
@@ -637,29 +634,15 @@ def listar_atas_mes(mes):
         data_mes = datetime.strptime(mes, "%Y-%m")
         mes_nome = meses_ptbr[data_mes.month] + " " + str(data_mes.year)
         
-        return render_template("_atas_list.html", 
+        html = render_template("_atas_list.html", 
                              atas=atas, 
+                             mes=mes,
                              mes_selecionado_nome=mes_nome)
+        return com_validador(html, etag)
     
     except ValueError:
         return "<div class='info-card'>Mês inválido.</div>"
 
-# Filtro de template para carregar listas JSON
-@app.template_filter('loads')
-def json_loads_filter(s: str) -> list:
-    """Template filter to parse JSON strings - always returns a list"""
-    if not s:
-        return []
-    try:
-        result = json.loads(s)
-        # Ensure we always return a list, even if JSON contains other types
-        if isinstance(result, list):
-            return result
-        else:
-            return [result] if result is not None else []
-    except (json.JSONDecodeError, TypeError, ValueError):
-        return []
-
 # Rota para criar nova ata
 @app.route("/ata/nova", methods=["GET", "POST"])
 @login_required
@@ -725,17 +708,6 @@ def form_ata():
             if not ata_existente:
                 flash("Você não tem permissão para editar esta ata.", "error")
                 return redirect(url_for('index'))
-            
-            # Atualiza a ata existente
-            conn.execute("UPDATE atas SET tipo=?, data=? WHERE id=?", (tipo, data, ata_id_editar))
-            ata_id = ata_id_editar
-        else:
-            # Modo criação - insere nova ata com ala_id
-            conn.execute(
-                "INSERT INTO atas (tipo, data, ala_id) VALUES (?, ?, ?)", 
-                (tipo, data, session['user_id'])
-            )
-            ata_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
 
         if tipo == "sacramental":
             discursantes = request.form.getlist("discursantes[]")
@@ -770,65 +742,6 @@ def form_ata():
                 "oracao_encerramento": request.form.get("oracao_encerramento", ""),
                 "discursantes": discursantes
             }
-            
-            if ata_id_editar:
-                # Atualiza registro existente COM NOVOS CAMPOS
-                conn.execute("""
-                    UPDATE sacramental 
-                    SET presidido=?, dirigido=?, recepcionistas=?, pianista=?, regente_musica=?, 
-                        reconhecemos_presenca=?, anuncios=?, hinos=?, oracoes=?, discursantes=?, 
-                        hino_sacramental=?, hino_intermediario=?, desobrigacoes=?, apoios=?, 
-                        confirmacoes_batismo=?, apoio_membros=?, bencao_criancas=?, ultimo_discursante=?
-                    WHERE ata_id=?
-                """, (
-                    detalhes["presidido"], 
-                    detalhes["dirigido"],
-                    detalhes["recepcionistas"],  # NOVO
-                    detalhes["pianista"],
-                    detalhes["regente_musica"],
-                    detalhes["reconhecemos_presenca"],  # NOVO
-                    json.dumps(detalhes["anuncios"]),
-                    json.dumps([detalhes["hino_abertura"], detalhes["hino_encerramento"]]), 
-                    json.dumps([detalhes["oracao_abertura"], detalhes["oracao_encerramento"]]), 
-                    json.dumps(detalhes["discursantes"]),
-                    detalhes["hino_sacramental"],
-                    detalhes["hino_intermediario"],
-                    detalhes["desobrigacoes"],  # NOVO
-                    detalhes["apoios"],  # NOVO
-                    detalhes["confirmacoes_batismo"],  # NOVO
-                    detalhes["apoio_membros"],  # NOVO
-                    detalhes["bencao_criancas"],  # NOVO
-                    detalhes["ultimo_discursante"],  # NOVO
-                    ata_id
-                ))
-            else:
-                # Insere novo registro COM NOVOS CAMPOS
-                conn.execute("""
-                    INSERT INTO sacramental (ata_id, presidido, dirigido, recepcionistas, pianista, regente_musica, 
-                        reconhecemos_presenca, anuncios, hinos, oracoes, discursantes, hino_sacramental, hino_intermediario,
-                        desobrigacoes, apoios, confirmacoes_batismo, apoio_membros, bencao_criancas, ultimo_discursante) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    ata_id, 
-                    detalhes["presidido"], 
-                    detalhes["dirigido"],
-                    detalhes["recepcionistas"],  # NOVO
-                    detalhes["pianista"],
-                    detalhes["regente_musica"],
-                    detalhes["reconhecemos_presenca"],  # NOVO
-                    json.dumps(detalhes["anuncios"]),
-                    json.dumps([detalhes["hino_abertura"], detalhes["hino_encerramento"]]), 
-                    json.dumps([detalhes["oracao_abertura"], detalhes["oracao_encerramento"]]), 
-                    json.dumps(detalhes["discursantes"]),
-                    detalhes["hino_sacramental"],
-                    detalhes["hino_intermediario"],
-                    detalhes["desobrigacoes"],  # NOVO
-                    detalhes["apoios"],  # NOVO
-                    detalhes["confirmacoes_batismo"],  # NOVO
-                    detalhes["apoio_membros"],  # NOVO
-                    detalhes["bencao_criancas"],  # NOVO
-                    detalhes["ultimo_discursante"]  # NOVO
-                ))
         
         elif tipo == "batismo":
             batizados = request.form.getlist("batizados[]")
@@ -843,38 +756,24 @@ def form_ata():
                 "testemunha2": request.form.get("testemunha2", ""),
                 "batizados": batizados
             }
-            
-            if ata_id_editar:
-                # Atualiza registro existente
-                conn.execute("""
-                    UPDATE batismo 
-                    SET dedicado=?, presidido=?, dirigido=?, batizados=?, testemunha1=?, testemunha2=? 
-                    WHERE ata_id=?
-                """, (
-                    detalhes["dedicado"], 
-                    detalhes["presidido"], 
-                    detalhes["dirigido"], 
-                    json.dumps(detalhes["batizados"]), 
-                    detalhes["testemunha1"], 
-                    detalhes["testemunha2"], 
-                    ata_id
-                ))
-            else:
-                # Insere novo registro
-                conn.execute("""
-                    INSERT INTO batismo (ata_id, dedicado, presidido, dirigido, batizados, testemunha1, testemunha2) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    ata_id, 
-                    detalhes["dedicado"], 
-                    detalhes["presidido"], 
-                    detalhes["dirigido"], 
-                    json.dumps(detalhes["batizados"]), 
-                    detalhes["testemunha1"], 
-                    detalhes["testemunha2"]
-                ))
+        else:
+            flash("Tipo de ata não reconhecido", "error")
+            return redirect(url_for("nova_ata"))
+        
+        # Mesma gravação da API (models.gravar_ata): ata, detalhes, participantes e discursantes recentes
+        ata_id = dbHandler.gravar_ata(session['user_id'], tipo, data, detalhes, int(ata_id_editar) if ata_id_editar else None)
         
+        if not ata_id_editar:
+            dbHandler.apagar_rascunho(f"nova-{session['user_id']}-{tipo}-{data}")
         conn.commit()
+        pdf_cache.get_cache().invalidar(ata_id=ata_id)
+        
+        # O formulário enviado vale mais que o estado da edição colaborativa
+        estado = colaboracao.get_estado(socketio)
+        if ata_id_editar:
+            estado.recarregar(f"ata-{ata_id}")
+        else:
+            estado.descartar(f"nova-{session['user_id']}-{tipo}-{data}")
         flash("Ata salva com sucesso!", "success")
         return redirect(url_for("visualizar_ata", ata_id=ata_id))
 
@@ -886,30 +785,10 @@ def form_ata():
     # Lógica para carregar dados existentes se estiver editando
     dados_existentes = {}
     if editar:
-        conn = get_db()
         if tipo == "sacramental":
-            dados = conn.execute("SELECT * FROM sacramental WHERE ata_id=?", (editar,)).fetchone()
-            if dados:
-                dados_existentes = dict(dados)
-                # Converter JSON strings de volta para objetos
-                if dados_existentes.get('hinos'):
-                    hinos = json.loads(dados_existentes['hinos'])
-                    dados_existentes['hino_abertura'] = hinos[0] if len(hinos) > 0 else ''
-                    dados_existentes['hino_encerramento'] = hinos[1] if len(hinos) > 1 else ''
-                if dados_existentes.get('oracoes'):
-                    oracoes = json.loads(dados_existentes['oracoes'])
-                    dados_existentes['oracao_abertura'] = oracoes[0] if len(oracoes) > 0 else ''
-                    dados_existentes['oracao_encerramento'] = oracoes[1] if len(oracoes) > 1 else ''
-                if dados_existentes.get('discursantes'):
-                    dados_existentes['discursantes'] = json.loads(dados_existentes['discursantes'])
-                if dados_existentes.get('anuncios'):
-                    dados_existentes['anuncios'] = json.loads(dados_existentes['anuncios'])
+            dados_existentes = dbHandler.detalhes_sacramental(editar)
         else:
-            dados = conn.execute("SELECT * FROM batismo WHERE ata_id=?", (editar,)).fetchone()
-            if dados:
-                dados_existentes = dict(dados)
-                if dados_existentes.get('batizados'):
-                    dados_existentes['batizados'] = json.loads(dados_existentes['batizados'])
+            dados_existentes = dbHandler.detalhes_batismo(editar)
     
     if not tipo or not data:
         flash("Erro: Tipo e data são obrigatórios", "error")
@@ -938,6 +817,43 @@ def form_ata():
         flash("Tipo de ata não reconhecido", "error")
         return redirect(url_for("nova_ata"))
 
+# Respostas condicionais das páginas de ata. O ETag vem da revisão das atas
+# (migração 0010, mantida por triggers), da versão dos templates de ata e dos
+# arquivos HTML da aplicação; com If-None-Match igual a resposta é 304 sem
+# nenhuma renderização. no-cache faz o navegador sempre revalidar, então uma
+# edição aparece na hora.
+def _calcular_versao_paginas():
+    resumo = hashlib.sha256()
+    pasta = os.path.join(app.root_path, app.template_folder)
+    for raiz, pastas, arquivos in os.walk(pasta):
+        pastas.sort()
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            resumo.update(os.path.relpath(caminho, pasta).encode())
+            with open(caminho, 'rb') as arquivo:
+                resumo.update(arquivo.read())
+    return resumo.hexdigest()[:12]
+
+# Muda a cada deploy que altere os templates HTML
+VERSAO_PAGINAS = _calcular_versao_paginas()
+
+def nao_modificado(etag):
+    """Resposta 304 se o navegador já tem essa versão, senão None"""
+    if etag not in request.if_none_match:
+        return None
+    resposta = app.response_class(status=304)
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
+
+def com_validador(html, etag, modificada_em=None):
+    resposta = app.make_response(html)
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    if modificada_em:
+        resposta.last_modified = datetime.strptime(modificada_em, "%Y-%m-%d %H:%M:%S")
+    return resposta
+
 # Rota para visualizar uma ata selecionada
 @app.route("/ata/<int:ata_id>")
 @login_required
@@ -952,554 +868,308 @@ def visualizar_ata(ata_id):
         flash("Ata não encontrada ou você não tem permissão para visualizá-la.", "error")
         return redirect(url_for("index"))
         
+    versao_templates = registro_templates.get_registro().versao() if ata["tipo"] == "sacramental" else 0
+    etag = f"ata{ata_id}-r{ata['revisao']}-t{versao_templates}-{VERSAO_PAGINAS}"
+    resposta = nao_modificado(etag)
+    if resposta:
+        return resposta
+    
     # Buscar template padrão para sacramental
     template = None
     if ata["tipo"] == "sacramental":
-        # Tente diferentes formas de buscar o template
-        template = conn.execute(
-            "SELECT * FROM templates WHERE nome = 'Sacramental Padrão'"
-        ).fetchone()
-        
-        if not template:
-            template = conn.execute(
-                "SELECT * FROM templates WHERE tipo_template = 1"
-            ).fetchone()
-        
-        if template:
-            template = dict(template)
-            print(f"DEBUG: Template carregado - {template.get('nome', 'Sem nome')}")
+        template = registro_templates.get_registro().sacramental()
     
     if ata["tipo"] == "sacramental":
-        detalhes = conn.execute("SELECT * FROM sacramental WHERE ata_id=?", (ata_id,)).fetchone()
-        if detalhes:
-            # Converter para dicionário para facilitar o acesso
-            detalhes_dict = dict(detalhes)
-            if detalhes_dict.get('hinos'):
-                try:
-                    hinos = json.loads(detalhes_dict['hinos'])
-                    detalhes_dict['hino_abertura'] = hinos[0] if len(hinos) > 0 else ''
-                    detalhes_dict['hino_encerramento'] = hinos[1] if len(hinos) > 1 else ''
-                except:
-                    detalhes_dict['hino_abertura'] = ''
-                    detalhes_dict['hino_encerramento'] = ''
-                    
-            if detalhes_dict.get('oracoes'):
-                try:
-                    oracoes = json.loads(detalhes_dict['oracoes'])
-                    detalhes_dict['oracao_abertura'] = oracoes[0] if len(oracoes) > 0 else ''
-                    detalhes_dict['oracao_encerramento'] = oracoes[1] if len(oracoes) > 1 else ''
-                except:
-                    detalhes_dict['oracao_abertura'] = ''
-                    detalhes_dict['oracao_encerramento'] = ''
-                    
-            if detalhes_dict.get('discursantes'):
-                try:
-                    detalhes_dict['discursantes'] = json.loads(detalhes_dict['discursantes'])
-                except:
-                    detalhes_dict['discursantes'] = []
-                    
-            if detalhes_dict.get('anuncios'):
-                try:
-                    detalhes_dict['anuncios'] = json.loads(detalhes_dict['anuncios'])
-                except:
-                    detalhes_dict['anuncios'] = []
-                    
-            detalhes = detalhes_dict
-        else:
-            detalhes = {}
+        detalhes = dbHandler.detalhes_sacramental(ata_id)
     else:
-        detalhes = conn.execute("SELECT * FROM batismo WHERE ata_id=?", (ata_id,)).fetchone()
-        if detalhes:
-            detalhes_dict = dict(detalhes)
-            if detalhes_dict.get('batizados'):
-                try:
-                    detalhes_dict['batizados'] = json.loads(detalhes_dict['batizados'])
-                except:
-                    detalhes_dict['batizados'] = []
-            detalhes = detalhes_dict
-        else:
-            detalhes = {}
-    
-    conn.close()
+        detalhes = dbHandler.detalhes_batismo(ata_id)
     
-    return render_template("visualizar_ata.html", ata=ata, detalhes=detalhes, template=template)
+    html = render_template("visualizar_ata.html", ata=ata, detalhes=detalhes, template=template)
+    return com_validador(html, etag, ata["atualizada_em"])
 
 
-# Rota para exportar ata como PDF simples (em desenvolvimento, ajustando para ser dinamica com cada ala)
-@app.route("/ata/exportar/<int:ata_id>")
-@login_required
-def exportar_pdf(ata_id):
+# PDFs passam pelo cache endereçado por conteúdo (pdf_cache.py): a chave/ETag
+# vem dos dados, então um If-None-Match válido nem chega a gerar o PDF.
+# Num miss, o ReportLab roda na fila de processos (pdf_jobs.py) e a requisição
+# espera sem travar o hub do eventlet.
+def dados_pdf(ata_id, tipo):
+    """(ata, detalhes, template, unidade) para gerar o PDF, ou None se a ata não servir para o tipo"""
     conn = get_db()
     ata = conn.execute("SELECT * FROM atas WHERE id=?", (ata_id,)).fetchone()
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    c.setFont("Helvetica", 14)
-    c.drawString(50, 800, f"Ata de {ata['tipo'].capitalize()} - {ata['data']}")
-    c.setFont("Helvetica", 12)
+    if not ata:
+        return None
+    return montar_dados_pdf(ata, tipo)
 
+def montar_dados_pdf(ata, tipo):
+    ata_id = ata["id"]
+    if tipo == "sacramental":
+        if ata["tipo"] != "sacramental":
+            return None
+        detalhes = dbHandler.detalhes_sacramental(ata_id)
+        if not detalhes:
+            return None
+        return dict(ata), detalhes, registro_templates.get_registro().sacramental(), dbHandler.unidade_da_ala(ata["ala_id"])
+    
     if ata["tipo"] == "sacramental":
-        detalhes = conn.execute("SELECT * FROM sacramental WHERE ata_id=?", (ata_id,)).fetchone()
-        if detalhes:
-            # Converter para dicionário para evitar o erro do .get()
-            detalhes_dict = dict(detalhes)
-            hinos = json.loads(detalhes_dict["hinos"])
-            oracoes = json.loads(detalhes_dict["oracoes"])
-            discursantes = json.loads(detalhes_dict["discursantes"])
-            anuncios = json.loads(detalhes_dict["anuncios"]) if detalhes_dict.get("anuncios") else []
-            
-            c.drawString(50, 770, f"Presidido por: {detalhes_dict['presidido']}")
-            c.drawString(50, 750, f"Dirigido por: {detalhes_dict['dirigido']}")
-            c.drawString(50, 730, f"Pianista: {detalhes_dict.get('pianista', '')}")  # NOVO
-            c.drawString(50, 710, f"Regente de Música: {detalhes_dict.get('regente_musica', '')}")
-            
-            # Anúncios
-            y = 690
-            if anuncios and len(anuncios) > 0:
-                c.drawString(50, 690, "Anúncios:")
-                y = 670
-                for a in anuncios:
-                    c.drawString(70, y, f"- {a}")
-                    y -= 20
-            
-            c.drawString(50, y-20, f"Hino de Abertura: {hinos[0] if len(hinos) > 0 else ''}")
-            c.drawString(50, y-40, f"Oração de Abertura: {oracoes[0] if len(oracoes) > 0 else ''}")
-            c.drawString(50, y-60, f"Hino Sacramental: {detalhes_dict.get('hino_sacramental', '')}")
-            
-            # Discursantes
-            y_disc = y-80
-            if discursantes and len(discursantes) > 0:
-                c.drawString(50, y_disc, "Discursantes:")
-                y_disc -= 20
-                for d in discursantes:
-                    c.drawString(70, y_disc, f"- {d}")
-                    y_disc -= 20
-            
-            c.drawString(50, y_disc-20, f"Hino Intermediário: {detalhes_dict.get('hino_intermediario', '')}")
-            c.drawString(50, y_disc-40, f"Hino de Encerramento: {hinos[1] if len(hinos) > 1 else ''}")
-            c.drawString(50, y_disc-60, f"Oração de Encerramento: {oracoes[1] if len(oracoes) > 1 else ''}")
+        detalhes = dbHandler.detalhes_sacramental(ata_id)
     else:
-        detalhes = conn.execute("SELECT * FROM batismo WHERE ata_id=?", (ata_id,)).fetchone()
-        if detalhes:
-            # Converter para dicionário para evitar o erro do .get()
-            detalhes_dict = dict(detalhes)
-            batizados = json.loads(detalhes_dict["batizados"])
-            c.drawString(50, 770, f"Presidido por: {detalhes_dict['presidido']}")
-            c.drawString(50, 750, f"Dirigido por: {detalhes_dict['dirigido']}")
-            c.drawString(50, 730, f"Dedicado a: {detalhes_dict['dedicado']}")
-            c.drawString(50, 710, f"Testemunha 1: {detalhes_dict.get('testemunha1', '')}")
-            c.drawString(50, 690, f"Testemunha 2: {detalhes_dict.get('testemunha2', '')}")
-            y = 670
-            if batizados and len(batizados) > 0:
-                c.drawString(50, 670, "Batizados:")
-                y = 650
-                for b in batizados:
-                    c.drawString(70, y, f"- {b}")
-                    y -= 20
-
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f"ata_{ata_id}.pdf", mimetype="application/pdf")
+        detalhes = dbHandler.detalhes_batismo(ata_id)
+    return dict(ata), detalhes, None, None
+
+def enviar_pdf_em_cache(tipo, ata, detalhes, template, unidade, download_name):
+    cache = pdf_cache.get_cache()
+    nome = cache.nome_entrada(tipo, ata, detalhes, template, unidade)
+    etag = cache.etag(nome)
+    
+    if etag in request.if_none_match:
+        resposta = app.response_class(status=304)
+        resposta.set_etag(etag)
+        return resposta
+    
+    nivel, conteudo = cache.buscar(nome)
+    if nivel is None:
+        try:
+            conteudo = pdf_jobs.get_fila().renderizar(nome, tipo, ata, detalhes, template, unidade)
+        except (pdf_jobs.FilaCheia, pdf_jobs.TempoEsgotado) as e:
+            print(f"PDF da ata {ata['id']} não gerado: {e}")
+            flash("Muitos PDFs sendo gerados agora. Tente novamente em alguns segundos.", "error")
+            return redirect(url_for("visualizar_ata", ata_id=ata["id"]))
+    elif nivel == "disco":
+        # Servido direto do arquivo em disco
+        return send_file(conteudo, as_attachment=True, download_name=download_name,
+                         mimetype="application/pdf", etag=etag, conditional=True)
+    
+    return send_file(io.BytesIO(conteudo), as_attachment=True, download_name=download_name,
+                     mimetype="application/pdf", etag=etag, conditional=True)
+
+# Rota para exportar ata como PDF simples (em desenvolvimento, ajustando para ser dinamica com cada ala)
+@app.route("/ata/exportar/<int:ata_id>")
+@login_required
+def exportar_pdf(ata_id):
+    dados = dados_pdf(ata_id, "simples")
+    if not dados:
+        flash("Ata não encontrada", "error")
+        return redirect(url_for("index"))
+    
+    return enviar_pdf_em_cache("simples", *dados, download_name=f"ata_{ata_id}.pdf")
 
 # Rota para exportar ata sacramental como PDF formatado e bunitinho (*SAMUEL ESTÁ EM DESENVOLVIMENTO :), AJUSTANDO PARA SER DINAMICA A CADA ALA COM O BD*)
 @app.route("/ata/exportar_sacramental/<int:ata_id>")
 @login_required
 def exportar_sacramental_pdf(ata_id):
-    conn = get_db()
-    ata = conn.execute("SELECT * FROM atas WHERE id=?", (ata_id,)).fetchone()
-    
-    if not ata or ata["tipo"] != "sacramental":
+    dados = dados_pdf(ata_id, "sacramental")
+    if not dados:
         flash("Ata sacramental não encontrada", "error")
         return redirect(url_for("index"))
     
-    detalhes = conn.execute("SELECT * FROM sacramental WHERE ata_id=?", (ata_id,)).fetchone()
-    if not detalhes:
-        flash("Detalhes da ata não encontrados", "error")
-        return redirect(url_for("visualizar_ata", ata_id=ata_id))
-    
-    # Converter para dicionário
-    detalhes_dict = dict(detalhes)
-    
-    # Processar dados
-    if detalhes_dict.get('hinos'):
-        hinos = json.loads(detalhes_dict['hinos'])
-        detalhes_dict['hino_abertura'] = hinos[0] if len(hinos) > 0 else ''
-        detalhes_dict['hino_encerramento'] = hinos[1] if len(hinos) > 1 else ''
-    
-    if detalhes_dict.get('oracoes'):
-        oracoes = json.loads(detalhes_dict['oracoes'])
-        detalhes_dict['oracao_abertura'] = oracoes[0] if len(oracoes) > 0 else ''
-        detalhes_dict['oracao_encerramento'] = oracoes[1] if len(oracoes) > 1 else ''
-    
-    if detalhes_dict.get('discursantes'):
-        detalhes_dict['discursantes'] = json.loads(detalhes_dict['discursantes'])
-    
-    if detalhes_dict.get('anuncios'):
-        detalhes_dict['anuncios'] = json.loads(detalhes_dict['anuncios'])
-    
-    buffer = io.BytesIO()
+    return enviar_pdf_em_cache("sacramental", *dados, download_name=f"ata_sacramental_{ata_id}.pdf")
+
+# Exportação em lote: todas as atas do período num ZIP montado em streaming.
+# Os PDFs são gerados na fila de processos (no máximo PDF_FILA_MAX por vez) e
+# cada um vai para o cliente assim que fica pronto; na memória fica só a janela
+# de PDFs em andamento, nunca o arquivo inteiro.
+@app.route("/atas/exportar_zip")
+@login_required
+def exportar_atas_zip():
+    try:
+        inicio, fim = dbHandler.ler_periodo(request.args)
+    except ValueError:
+        flash("Período inválido para exportação", "error")
+        return redirect(url_for("index"))
     
-    # Criar PDF com duas páginas
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
+    tipo = request.args.get("tipo") or None
+    if tipo not in (None, "sacramental", "batismo"):
+        flash("Tipo de ata inválido", "error")
+        return redirect(url_for("index"))
     
-    # CORES - Baseadas no site da Igreja
-    AZUL_IGREJA = colors.HexColor("#004272")  # Azul escuro
-    AZUL_CLARO = colors.HexColor("#E6F2FF")   # Azul claro para fundos
-    CINZA_CLARO = colors.HexColor("#F8F9FA")  # Cinza muito claro
+    ala_id = session["user_id"]
+    cache = pdf_cache.get_cache()
     
-    # ========== PÁGINA 1 (FRENTE) ==========
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(180, height - 50, "ATA REUNIÃO SACRAMENTAL")
+    def itens():
+        for ata in dbHandler.atas_do_periodo(ala_id, inicio, fim, tipo):
+            tipo_pdf = "sacramental" if ata["tipo"] == "sacramental" else "simples"
+            dados = montar_dados_pdf(ata, tipo_pdf)
+            if not dados:
+                continue
+            nome_arquivo = f"{ata['data']}_{ata['tipo']}_{ata['id']}.pdf"
+            yield (nome_arquivo, cache.nome_entrada(tipo_pdf, *dados), tipo_pdf, *dados)
+    
+    def gerar_zip():
+        saida = exportacao.SaidaZip()
+        erros = []
+        # PDFs já vêm comprimidos do ReportLab: ZIP_STORED não gasta CPU à toa
+        with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_STORED) as arquivo:
+            for nome_arquivo, conteudo, erro in pdf_jobs.get_fila().renderizar_varios(itens()):
+                if erro:
+                    erros.append(f"{nome_arquivo}: {erro}")
+                    continue
+                arquivo.writestr(nome_arquivo, conteudo)
+                yield saida.esvaziar()
+            if erros:
+                print(f"Exportação em lote da ala {ala_id} com {len(erros)} erro(s)")
+                arquivo.writestr("erros.txt", "\n".join(erros) + "\n")
+        yield saida.esvaziar()
+    
+    nome_zip = f"atas_{inicio}_{fim}.zip"
+    return Response(
+        stream_with_context(gerar_zip()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={nome_zip}"},
+    )
+
+# Histórico da ala em planilha (exportacao.py): uma linha por ata, gerada em
+# blocos direto do cursor, sem montar o arquivo na memória. Sem período, vai
+# tudo; ?mes=, ?ano= ou ?inicio=&fim= limitam, como no ZIP.
+@app.route("/atas/exportar")
+@login_required
+def exportar_atas_planilha():
+    formato = request.args.get("formato", "csv")
+    if formato not in exportacao.FORMATOS:
+        flash("Formato de exportação inválido", "error")
+        return redirect(url_for("index"))
     
+    inicio = fim = None
+    if any(request.args.get(chave) for chave in ("mes", "ano", "inicio", "fim")):
+        try:
+            inicio, fim = dbHandler.ler_periodo(request.args)
+        except ValueError:
+            flash("Período inválido para exportação", "error")
+            return redirect(url_for("index"))
+    
+    blocos = exportacao.blocos_de_linhas(session["user_id"], inicio, fim)
+    nome_arquivo = f"atas_{inicio}_{fim}.{formato}" if inicio else f"atas.{formato}"
+    return Response(
+        stream_with_context(exportacao.gerar(formato, blocos)),
+        mimetype=exportacao.MIMETYPES[formato],
+        headers={"Content-Disposition": f"attachment; filename={nome_arquivo}"},
+    )
+
+# Geração assíncrona: o cliente cria o job, consulta o status e baixa quando
+# estiver pronto, sem segurar uma requisição aberta durante a renderização
+@app.route("/pdf/jobs", methods=["POST"])
+@login_required
+def criar_job_pdf():
+    parametros = request.get_json(silent=True) or request.form
+    tipo = parametros.get("tipo", "sacramental")
+    try:
+        ata_id = int(parametros.get("ata_id", ""))
+    except ValueError:
+        return jsonify({"erro": "ata_id inválido"}), 400
+    if tipo not in ("simples", "sacramental"):
+        return jsonify({"erro": "tipo inválido"}), 400
     
-    # Tabela de informações
-    data_ata = datetime.strptime(ata['data'], "%Y-%m-%d")
-    data_formatada = data_ata.strftime("%d/%m/%Y")
+    dados = dados_pdf(ata_id, tipo)
+    if not dados or dados[0]["ala_id"] != session["user_id"]:
+        return jsonify({"erro": "Ata não encontrada"}), 404
     
-    table_data = [
-        ["ALA [NOME]", "ESTACA CRICIÚMA", f"HORÁRIO [ARRUMAR]", f"DATA {data_formatada}"]
-    ]
+    cache = pdf_cache.get_cache()
+    nome = cache.nome_entrada(tipo, *dados)
+    if cache.buscar(nome)[0] is not None:
+        rota = "exportar_sacramental_pdf" if tipo == "sacramental" else "exportar_pdf"
+        return jsonify({"status": pdf_jobs.PRONTO, "download": url_for(rota, ata_id=ata_id)}), 200
     
-    jooj = 125
-
-    table = Table(table_data, colWidths=[jooj, jooj, jooj, jooj])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), AZUL_IGREJA),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.white),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    table.wrapOn(c, width, height)
-    table.drawOn(c, 50, height - 100)
-    
-    font_a = 12
-
-    # Boas-vindas
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", 13)
-    texto_boas_vindas = f"Bom dia irmãos e irmãs! Gostaríamos de fazer todos muito bem vindos a mais uma Reunião Sacramental da ALA [NOME], Estaca Criciúma, neste dia {data_formatada}. Desejamos que todos se sintam bem entre nós, especialmente aqueles que nos visitam."
-    
-    estilo_paragrafo = ParagraphStyle(
-        'Normal',
-        fontName='Helvetica',
-        fontSize=13,
-        leading=12,
-        alignment=4,  # Justificado
-        textColor=colors.black,
-        spaceBefore=15,
-        spaceAfter=12
-    )
+    try:
+        job = pdf_jobs.get_fila().submeter(nome, tipo, *dados)
+    except pdf_jobs.FilaCheia as e:
+        resposta = jsonify({"erro": str(e)})
+        resposta.headers["Retry-After"] = "5"
+        return resposta, 503
     
-    p = Paragraph(texto_boas_vindas, estilo_paragrafo)
-    p.wrapOn(c, width - 100, height)
-    p.drawOn(c, 50, height - 160)
-    
-    # Informações de presidência
-    y_pos = height - 180
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "Esta Reunião está sendo presidida por:")
-    c.setFont("Helvetica", font_a)
-    c.drawString(280, y_pos, detalhes_dict.get('presidido', 'Não informado'))
-    
-    y_pos -= 20
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "E dirigida por:")
-    c.setFont("Helvetica", font_a)
-    c.drawString(200, y_pos, detalhes_dict.get('dirigido', 'Não informado'))
-    
-    y_pos -= 20
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "Como recepcionistas:")
-    # Aqui você pode adicionar recepcionistas se tiver o campo
-    
-    y_pos -= 20
-    c.drawString(50, y_pos, "Como pianista:")
-    c.setFont("Helvetica", font_a)
-    c.drawString(200, y_pos, detalhes_dict.get('pianista', 'Não informado'))
-    
-    y_pos -= 20
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "E regente de música:")
-    c.setFont("Helvetica", font_a)
-    c.drawString(200, y_pos, detalhes_dict.get('regente_musica', 'Não informado'))
-    
-    # Linha divisória
-    y_pos -= 20
-    c.setStrokeColor(colors.HexColor("#E2E8F0"))  # Cinza claro
-    c.setLineWidth(3)
-    c.line(50, y_pos, width - 50, y_pos)
-    y_pos -= 12
-
-    # SEÇÃO: ABERTURA
-    y_pos -= 20
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(50, y_pos, "ABERTURA (6 min)")
-    
-    y_pos -= 32
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold",font_a)
-    c.drawString(50, y_pos, "Reconhecemos a Presença:")
-    
-    y_pos -= 20
-    c.drawString(50, y_pos, "Temos como anúncios:")
-    
-    # Anúncios
-    y_pos -= 20
-    c.setFont("Helvetica", font_a)
-    if detalhes_dict.get('anuncios'):
-        for anuncio in detalhes_dict['anuncios']:
-            if anuncio and anuncio.strip():
-                p_anuncio = Paragraph(f"• {anuncio}", estilo_paragrafo)
-                p_anuncio.wrapOn(c, width - 100, height)
-                p_anuncio.drawOn(c, 65, y_pos)
-                y_pos -= 15
-    else:
-        c.drawString(65, y_pos, "Nenhum anúncio informado")
-        y_pos -= 15
-    
-    # Hino e Oração de Abertura
-    y_pos -= 60
-    table_encerramento = Table([
-        ["CANTAREMOS O HINO DE ABERTURA:", 
-         "E A PRIMEIRA ORAÇÃO SERÁ FEITA POR: "],
-        [f"{detalhes_dict.get('hino_abertura', 'Não informado')}", 
-         f"{detalhes_dict.get('oracao_abertura', 'Não informado')}"]
-    ], colWidths=[250,250,250,250])
-    
-    table_encerramento.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), AZUL_CLARO),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    table_encerramento.wrapOn(c, width, height)
-    table_encerramento.drawOn(c, 50, y_pos - 20)
-    
-    # Linha divisória
-    y_pos -= 30
-    c.setStrokeColor(colors.HexColor("#E2E8F0"))  # Cinza claro
-    c.setLineWidth(3)
-    c.line(50, y_pos, width - 50, y_pos)
-    y_pos -= 12
-
-    # SEÇÃO: AÇÕES
-    y_pos -= 20
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(50, y_pos, "AÇÕES (5 min)")
-    
-    y_pos -= 30
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "DESOBRIGAÇÕES")
-    
-    y_pos -= 20
-    c.setFont("Helvetica", 10)
-    texto_desobrigacoes = "É proposto dar um voto de agradecimento aos serviços prestados pelo(a) irmã(o) [NOME] que serviu como [CHAMADO]. Todos os que desejam se manifestar, levantem a mão"
-    p_desobrigacoes = Paragraph(texto_desobrigacoes, estilo_paragrafo)
-    p_desobrigacoes.wrapOn(c, width - 100, height)
-    p_desobrigacoes.drawOn(c, 50, y_pos - 30)
-    
-    y_pos -= 60
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "APOIOS")
-    
-    y_pos -= 20
-    c.setFont("Helvetica", 10)
-    texto_apoios = "O(a) irmã(o) [NOME] está sendo chamado(a) como [CHAMADO]. Todos que forem a favor manifestem-se. Os que forem contrários, manifestem-se"
-    p_apoios = Paragraph(texto_apoios, estilo_paragrafo)
-    p_apoios.wrapOn(c, width - 100, height)
-    p_apoios.drawOn(c, 50, y_pos - 20)
-
-    # Confirmações Batismais
-    y_pos -= 60
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "CONFIRMAÇÕES BATISMAIS")
-
-    y_pos -= 20
-    c.setFont("Helvetica", 10)
-    texto_confirmacoes = "O(a) irmã(o) [NOME] foram batizados, gostaríamos de convida-los(a) para virem até o púlpito para que possamos fazer sua confirmação como Membro de A Igreja de Jesus Cristo dos Santos dos Ultimos Dias."
-    p_confirmacoes = Paragraph(texto_confirmacoes, estilo_paragrafo)
-    p_confirmacoes.wrapOn(c, width - 100, height)
-    p_confirmacoes.drawOn(c, 50, y_pos - 20)
-    
-    c.showPage()  # Fim da página 1
-    
-    # ========== PÁGINA 2 (VERSO) ==========
-    
-    # SEÇÃO: AÇÕES (continuação)
-    y_pos = height - 50
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(50, y_pos, "AÇÕES (continuação)")
-    
-    # Apoio a Novos Membros
-    y_pos -= 30
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "APOIO A NOVOS MEMBROS")
-    
-    y_pos -= 15
-    c.setFont("Helvetica", 10)
-    texto_novos_membros = "O(a) irmã(o) [NOME] foi batizado e confirmado membro da igreja, e gostarámos do apoio de todos os irmãos de plena aceitação como mais novo membro da ala. Todos a favor, manifestem-se"
-    p_novos_membros = Paragraph(texto_novos_membros, estilo_paragrafo)
-    p_novos_membros.wrapOn(c, width - 100, height)
-    p_novos_membros.drawOn(c, 50, y_pos - 40)
-    
-    # Benção de Crianças
-    y_pos -= 70
-    c.setFont("Helvetica-Bold", font_a)
-    c.drawString(50, y_pos, "BENÇÃO DE CRIANÇAS")
-    
-    y_pos -= 20
-    c.setFont("Helvetica", 10)
-    texto_bencao = "Gostaríamos de chamar ao púlpito o irmão [NOME] que irá dar a benção de apresentação da(a) [NOME]"
-    p_bencao = Paragraph(texto_bencao, estilo_paragrafo)
-    p_bencao.wrapOn(c, width - 100, height)
-    p_bencao.drawOn(c, 50, y_pos - 20)
-    
-    # Linha divisória
-    y_pos -= 50
-    c.setStrokeColor(colors.HexColor("#E2E8F0"))  # Cinza claro
-    c.setLineWidth(3)
-    c.line(50, y_pos, width - 50, y_pos)
-    y_pos -= 12
-
-    # SEÇÃO: SACRAMENTO
-    y_pos -= 20
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(50, y_pos, "SACRAMENTO (10 min)")
-    
-    y_pos -= 30
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", font_a)
-    texto_sacramento = f"Passaremos ao Sacramento, que é a parte mais importante de nossa reunião. Cantaremos como Hino Sacramental {detalhes_dict.get('hino_sacramental', 'Não informado')}, o Sacramento será abençoado e distribuído a todos"
-    p_sacramento = Paragraph(texto_sacramento, estilo_paragrafo)
-    p_sacramento.wrapOn(c, width - 100, height)
-    p_sacramento.drawOn(c, 50, y_pos - 20)
-    
-    y_pos -= 50
-    c.setFont("Helvetica-Bold", 10)
-    hino_sacramento = f"HINO SACRAMENTAL (3 min): {detalhes_dict.get('hino_sacramental', 'Não informado')}"
-    c.drawString(50, y_pos, hino_sacramento)
-    
-    # Linha divisória
-    y_pos -= 20
-    c.setStrokeColor(colors.HexColor("#E2E8F0"))  # Cinza claro
-    c.setLineWidth(3)
-    c.line(50, y_pos, width - 50, y_pos)
-    y_pos -= 12
-
-    # SEÇÃO: MENSAGENS
-    y_pos -= 20
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(50, y_pos, "MENSAGENS (35 min)")
-    
-    y_pos -= 20
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", font_a)
-    texto_mensagens = "Agradecemos a todos pela reverência durante o Sacramento. Passaremos agora a parte dos discursantes. Gostaria de lembrar todos que estejam assitindo a transmissão da reunião, que se identifiquem para que possamos contá-los também"
-    p_mensagens = Paragraph(texto_mensagens, estilo_paragrafo)
-    p_mensagens.wrapOn(c, width - 100, height)
-    p_mensagens.drawOn(c, 50, y_pos - 20)
-    
-    # Discursantes
-    y_pos -= 50
-    if detalhes_dict.get('discursantes'):
-        discursantes_data = []
-        for i, discursante in enumerate(detalhes_dict['discursantes']):
-            if discursante and discursante.strip():
-                tempo = "3-5 min" if i == 0 else "5-7 min" if i == 1 else "8-10 min"
-                discursantes_data.append([f"{i+1}º ORADOR ({tempo})", discursante])
-        
-        if discursantes_data:
-            table_discursantes = Table(discursantes_data, colWidths=[120, 350])
-            table_discursantes.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), AZUL_CLARO),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            table_discursantes.wrapOn(c, width, height)
-            table_discursantes.drawOn(c, 50, y_pos - len(discursantes_data) * 20)
-            y_pos -= len(discursantes_data) * 25
-    
-    # Hino Intermediário
-    if detalhes_dict.get('hino_intermediario'):
-        y_pos -= 20
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(50, y_pos, "HINO INTERMEDIÁRIO (3 min):")
-        c.setFont("Helvetica", 12)
-        c.drawString(230, y_pos, detalhes_dict.get('hino_intermediario', 'Não informado'))
-    
-
-    # Linha divisória
-    y_pos -= 20
-    c.setStrokeColor(colors.HexColor("#E2E8F0"))  # Cinza claro
-    c.setLineWidth(3)
-    c.line(50, y_pos, width - 50, y_pos)
-    y_pos -= 12
-
-    # SEÇÃO: AGRADECIMENTOS FINAIS
-    y_pos -= 20
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(50, y_pos, "AGRADECIMENTOS FINAIS")
-    
-    y_pos -= 40
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica", 12)
-    texto_agradecimentos = f"Agradecemos a presença e participação de todos, especialmente aqueles que contribuíram de alguma forma para que essa reunião acontecesse. E convidamos todos para que estejam aqui no próximo domingo. Ouviremos como último orador o(a) irmã(o) [NOME]. Logo após, cantaremos o hino {detalhes_dict.get('hino_encerramento', 'Não informado')}, e o(a) irmã(o) {detalhes_dict.get('oracao_encerramento', 'Não informado')} oferecerá a última oração. Desejamos a todos uma ótima semana e que o Espírito do Senhor os acompanhe."
-    
-    p_agradecimentos = Paragraph(texto_agradecimentos, estilo_paragrafo)
-    p_agradecimentos.wrapOn(c, width - 100, height)
-    p_agradecimentos.drawOn(c, 50, y_pos - 40)
-    
-    # SEÇÃO: ENCERRAMENTO
-    y_pos -= 70
-    c.setFillColor(AZUL_IGREJA)
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(50, y_pos, "ENCERRAMENTO (2 min)")
-    
-    # Hino e Oração de Abertura
-    y_pos -= 20
-    table_encerramento = Table([
-        ["HINO DE ENCERRAMENTO:", 
-         "ORAÇÃO DE ENCERRAMENTO:"],
-        [f"{detalhes_dict.get('hino_encerramento', 'Não informado')}", 
-         f"{detalhes_dict.get('oracao_encerramento', 'Não informado')}"]
-    ], colWidths=[250, 250,250,250])
-    
-    table_encerramento.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), AZUL_CLARO),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    table_encerramento.wrapOn(c, width, height)
-    table_encerramento.drawOn(c, 50, y_pos - 20)
-    
-    c.showPage()
-    c.save()
-    
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f"ata_sacramental_{ata_id}.pdf", mimetype="application/pdf")
+    return jsonify({**job.to_dict(), "status_url": url_for("status_job_pdf", job_id=job.id)}), 202
+
+@app.route("/pdf/jobs/<job_id>")
+@login_required
+def status_job_pdf(job_id):
+    fila = pdf_jobs.get_fila()
+    job = fila.job(job_id)
+    if not job or not job.nome.startswith(f"ala{session['user_id']}_"):
+        return jsonify({"erro": "Job não encontrado"}), 404
+    
+    # Quem ninguém está esperando também expira
+    if not job.future.done() and time.time() - job.criado > fila.timeout:
+        fila.expirar(job)
+    
+    resultado = job.to_dict()
+    if job.status == pdf_jobs.PRONTO:
+        resultado["download"] = url_for("baixar_job_pdf", job_id=job.id)
+    return jsonify(resultado)
+
+@app.route("/pdf/jobs/<job_id>/download")
+@login_required
+def baixar_job_pdf(job_id):
+    job = pdf_jobs.get_fila().job(job_id)
+    if not job or not job.nome.startswith(f"ala{session['user_id']}_") or job.status != pdf_jobs.PRONTO:
+        return jsonify({"erro": "PDF não disponível"}), 404
+    
+    nivel, conteudo = pdf_cache.get_cache().buscar(job.nome)
+    if nivel is None and job.concluido is None:
+        # Future pronto, mas o _finalizar ainda não gravou no cache: o PDF está no próprio future
+        nivel, conteudo = "memoria", job.future.result()
+    elif nivel is None:
+        # Removido do cache (invalidação) depois de pronto
+        return jsonify({"erro": "PDF expirou, gere novamente"}), 410
+    if nivel == "memoria":
+        conteudo = io.BytesIO(conteudo)
+    download_name = f"ata_sacramental_{job.ata_id}.pdf" if job.tipo == "sacramental" else f"ata_{job.ata_id}.pdf"
+    return send_file(conteudo, as_attachment=True, download_name=download_name,
+                     mimetype="application/pdf", etag=pdf_cache.PdfCache.etag(job.nome), conditional=True)
+
+# ==================================================================
+# Rotas de diagnóstico
+# ==================================================================
+
+# Estatísticas do pool de conexões deste worker
+@app.route("/debug/db/pool")
+@login_required
+def debug_db_pool():
+    return jsonify(db.get_pool().stats())
+
+# Acertos/erros do cache de PDFs deste worker
+@app.route("/debug/pdf/cache")
+@login_required
+def debug_pdf_cache():
+    return jsonify(pdf_cache.get_cache().stats())
+
+# Fila de geração de PDFs deste worker
+@app.route("/debug/pdf/jobs")
+@login_required
+def debug_pdf_jobs():
+    return jsonify(pdf_jobs.get_fila().stats())
+
+# Versão e recargas do registro de templates deste worker
+@app.route("/debug/templates")
+@login_required
+def debug_templates():
+    return jsonify(registro_templates.get_registro().stats())
+
+# Eventos recebidos x frames enviados na edição colaborativa deste worker
+@app.route("/debug/socket")
+@login_required
+def debug_socket():
+    return jsonify({
+        'buffer': colaboracao.get_buffer(socketio).stats(),
+        'estado': colaboracao.get_estado(socketio).stats(),
+        'fila': mensageria.stats(socketio),
+        'presenca': colaboracao.get_presenca(socketio).stats(),
+    })
+
+# Salas ativas e sessões em cada uma (todos os workers, tabela presenca)
+@app.route("/debug/presenca")
+@login_required
+def debug_presenca():
+    salas = {}
+    for row in dbHandler.listar_presenca():
+        salas.setdefault(row['sala'], []).append({
+            'sid': row['sid'],
+            'worker': row['worker'],
+            'entrou_em': row['entrou_em'],
+            'visto_ha_segundos': round(time.time() - row['visto_em'], 1),
+        })
+    return jsonify({
+        'total_sessoes': sum(len(sessoes) for sessoes in salas.values()),
+        'salas': salas,
+        'worker': colaboracao.get_presenca(socketio).stats(),
+    })
 
 # Sistema de mensagens flash
 @app.context_processor
@@ -1507,29 +1177,175 @@ def inject_flash_messages():
     messages = []
     return dict(flash_messages=messages)
 
-# WebSocket para edição colaborativa em tempo real
-users_editing = {}
+# Esquema do modo compacto para o data-esquema dos formulários colaborativos
+@app.context_processor
+def inject_esquema_colaboracao():
+    if not app.config['SOCKET_COMPACTO']:
+        return dict(esquema_colaboracao=None)
+    return dict(esquema_colaboracao=compacto.esquema())
+
+# WebSocket para edição colaborativa em tempo real.
+# A sala é decidida pelo servidor a partir do formulário aberto (ver
+# colaboracao.resolver_sala), nunca pelo nome que o cliente manda.
+# Quem está em cada sala fica em colaboracao.Presenca (por sid, com a tabela
+# presenca compartilhada entre workers).
+
 @socketio.on('join')
 def handle_join(data):
-    ata_id = data['ata_id']
-    users_editing[ata_id] = users_editing.get(ata_id, 0) + 1
-    join_room(ata_id)
-    emit('update_users', {'count': users_editing[ata_id]}, to=ata_id)
+    if not session.get('logged_in'):
+        return
+    resolvida = colaboracao.resolver_sala(session['user_id'], data or {})
+    if not resolvida:
+        return
+    sala, ata_id, tipo, data_ata = resolvida
+    # Modo compacto só se o cliente tem o mesmo esquema (aba aberta antes de um deploy fica no JSON)
+    usar_compacto = app.config['SOCKET_COMPACTO'] and (data or {}).get('compacto') == compacto.VERSAO
+    
+    total = colaboracao.get_presenca(socketio).entrar(request.sid, sala, usar_compacto)
+    join_room(compacto.sala_socket(sala, usar_compacto))
+    colaboracao.emitir_sala(socketio, 'update_users', {'count': total}, sala)
+    
+    # Quem chega recebe o formulário inteiro, inclusive o que foi digitado antes
+    campos, revisoes = colaboracao.get_estado(socketio).abrir(sala, session['user_id'], tipo, data_ata, ata_id)
+    inicial = {'campos': campos, 'revisoes': revisoes, 'delta': list(colaboracao.CAMPOS_DELTA)}
+    if usar_compacto:
+        inicial['compacto'] = True
+        inicial['eu'] = compacto.autor(request.sid)
+    emit('estado_inicial', inicial)
 
 @socketio.on('leave')
-def handle_leave(data):
-    ata_id = data['ata_id']
-    if ata_id in users_editing:
-        users_editing[ata_id] = max(users_editing[ata_id] - 1, 0)
-        if users_editing[ata_id] == 0:
-            del users_editing[ata_id]
-        leave_room(ata_id)
-        emit('update_users', {'count': users_editing.get(ata_id, 0)}, to=ata_id)
+def handle_leave(data=None):
+    colaboracao.get_presenca(socketio).sair(request.sid)
+
+# Aba fechada, rede caiu ou ping expirado: sai da sala sem esperar o 'leave'
+@socketio.on('disconnect')
+def handle_disconnect():
+    colaboracao.get_presenca(socketio).sair(request.sid, desconectou=True)
 
 @socketio.on('field_update')
-def handle_field_update(data):
-    ata_id = data['ata_id']
-    emit('field_update', {'name': data['name'], 'value': data['value']}, to=ata_id, include_self=False)
+def handle_field_update(data, tamanho=None):
+    sala = colaboracao.get_presenca(socketio).sala_de(request.sid)
+    if sala is None:
+        return
+    try:
+        campo = colaboracao.normalizar_campo(data['name'])
+    except (KeyError, ValueError):
+        return
+    valor = data.get('value')
+    if not colaboracao.valor_valido(campo, valor):
+        # Um dict ou número no estado quebraria todo autosave seguinte da sala
+        return
+    # Estado da sala (autosave) + buffer de saída: o envio sai agrupado em fields_update no próximo tick
+    revisao = colaboracao.get_estado(socketio).atualizar(sala, campo, valor)
+    colaboracao.get_buffer(socketio).adicionar(sala, campo, valor, request.sid, revisao, tamanho)
+
+# Campos longos (colaboracao.CAMPOS_DELTA): só a operação de texto, sobre uma revisão
+@socketio.on('field_delta')
+def handle_field_delta(data, tamanho=None):
+    sala = colaboracao.get_presenca(socketio).sala_de(request.sid)
+    if sala is None:
+        return
+    try:
+        campo = colaboracao.normalizar_campo(data['name'])
+    except (KeyError, ValueError):
+        return
+    if not colaboracao.campo_delta(campo):
+        return
+    resultado = colaboracao.get_estado(socketio).aplicar_delta(sala, campo, data.get('rev'), data.get('op'))
+    if resultado is None:
+        # Revisão velha demais ou operação inválida: o cliente recomeça do valor inteiro
+        handle_field_resync({'name': campo})
+        return
+    revisao, op, checkpoint = resultado
+    if tamanho is None:
+        tamanho = len(json.dumps(data, ensure_ascii=False).encode())
+    colaboracao.get_buffer(socketio).adicionar_delta(sala, campo, revisao, op, request.sid, checkpoint, tamanho)
+
+# Modo compacto: field_update e field_delta chegam como bytes (compacto.py)
+@socketio.on('b')
+def handle_compacto(dados):
+    try:
+        evento, data = compacto.decodificar(dados)
+    except ValueError as e:
+        print(f"Mensagem compacta inválida de {request.sid}: {e}")
+        return
+    if evento == 'field_update':
+        handle_field_update(data, len(dados))
+    else:
+        handle_field_delta(data, len(dados))
+
+@socketio.on('field_resync')
+def handle_field_resync(data):
+    sala = colaboracao.get_presenca(socketio).sala_de(request.sid)
+    if sala is None:
+        return
+    try:
+        campo = colaboracao.normalizar_campo(data['name'])
+    except (KeyError, ValueError):
+        return
+    atual = colaboracao.get_estado(socketio).valor_campo(sala, campo)
+    if atual is not None:
+        emit('campo_estado', {'name': campo, 'rev': atual[0], 'value': atual[1]})
+
+# ==================================================================
+# Comandos administrativos (flask --app app <comando>)
+# ==================================================================
+
+@app.cli.command("reconstruir-discursantes")
+def reconstruir_discursantes_command():
+    """Recalcula a tabela ultimas_falas (discursantes recentes) do zero."""
+    total = dbHandler.reconstruir_ultimas_falas()
+    print(f"ultimas_falas reconstruída: {total} discursante(s)")
+
+@app.cli.command("verificar-estatisticas")
+@click.option("--corrigir", is_flag=True, help="Recalcula estatisticas_ala a partir das atas se houver divergência.")
+def verificar_estatisticas_command(corrigir):
+    """Confere estatisticas_ala contra a contagem real das atas."""
+    divergencias = dbHandler.divergencias_estatisticas()
+    for ala_id, tipo, mes, guardado, real in divergencias:
+        print(f"ala {ala_id} {tipo} {mes}: guardado {guardado}, real {real}")
+    if not divergencias:
+        print("estatisticas_ala consistente")
+        return
+    if corrigir:
+        total = dbHandler.reconstruir_estatisticas()
+        print(f"estatisticas_ala reconstruída: {total} linha(s)")
+    else:
+        print(f"{len(divergencias)} divergência(s); rode com --corrigir para recalcular")
+        sys.exit(1)
+
+@app.cli.command("importar-atas")
+@click.argument("arquivo", type=click.File("rb"))
+@click.option("--ala", "ala_id", type=int, required=True, help="Ala (id do usuário) que recebe as atas.")
+@click.option("--formato", type=click.Choice(importacao.FORMATOS), help="Sem a opção, vem da extensão do arquivo.")
+@click.option("--codificacao", default="utf-8-sig", show_default=True, help="Codificação do arquivo (planilhas antigas: latin-1).")
+@click.option("--lote", "tamanho_lote", type=int, help="Atas por transação (padrão: IMPORTACAO_LOTE).")
+def importar_atas_command(arquivo, ala_id, formato, codificacao, tamanho_lote):
+    """Importa atas de um arquivo CSV, JSON ou JSON Lines ('-' lê da entrada padrão)."""
+    formato = formato or importacao.formato_do_arquivo(arquivo.name)
+    if not formato:
+        print("Formato não reconhecido pela extensão: use --formato csv ou --formato json")
+        sys.exit(2)
+    if not get_db().execute("SELECT 1 FROM users WHERE id = ?", (ala_id,)).fetchone():
+        print(f"Ala {ala_id} não encontrada")
+        sys.exit(2)
+    relatorio = importacao.importar(
+        ala_id, importacao.ler_arquivo(arquivo, formato, codificacao),
+        tamanho_lote or app.config['IMPORTACAO_LOTE']
+    )
+    for erro in relatorio["erros"]:
+        print(f"linha {erro['linha']}: {erro['erro']}")
+    if relatorio["total_erros"] > len(relatorio["erros"]):
+        print(f"... e mais {relatorio['total_erros'] - len(relatorio['erros'])} erro(s)")
+    if relatorio["campos_ignorados"]:
+        print(f"Campos ignorados: {', '.join(relatorio['campos_ignorados'])}")
+    if relatorio["total_erros"]:
+        sys.exit(1)
+
+# Migrações rodam ao carregar o módulo, então valem também para gunicorn app:app
+# (AUTO_MIGRATE=false desliga, deixando para `python migrations.py aplicar`)
+if os.environ.get('AUTO_MIGRATE', 'true').lower() == 'true':
+    init_db()
 
 # Rodar o app
 if __name__ == "__main__":
@@ -1537,9 +1353,6 @@ if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     
-    # Inicializar banco
-    init_db()
-    
     # Rodar servidor - permitir produção
     socketio.run(app, 
                  host='0.0.0.0', 
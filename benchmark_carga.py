@@ -0,0 +1,415 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from urllib.parse import urlencode
+import gerador_dados
+
+# Teste de carga de ponta a ponta, por HTTP, com linha de base por rota.
+#
+# Cria um banco novo com --alas alas e --anos anos de atas até hoje
+# (gerador_dados.py: todo domingo e alguns batismos), sobe a aplicação num
+# processo separado (python app.py, o mesmo servidor eventlet de produção) numa
+# porta livre e solta --clientes clientes simultâneos por --duracao segundos. Cada
+# cliente faz login e navega como um usuário: /index, /atas, /atas/mes/<mes>,
+# /ata/<id>, salva atas pelo formulário (form_ata) e baixa os dois PDFs. A
+# cada --por-sessao requisições o cliente sai e faz login de novo.
+#
+# Por rota: requisições, erros, requisições por segundo e latência (p50, p95,
+# p99, em ms). --saida grava o resultado em JSON; --baseline compara com um
+# resultado gravado antes e termina com código 1 se alguma rota piorou além de
+# --tolerancia (latência maior ou vazão total menor, em fração da linha de
+# base), ou se passou a dar erro.
+#
+#   python benchmark_carga.py --saida base.json            (na versão de referência)
+#   python benchmark_carga.py --baseline base.json         (depois da mudança)
+#   python benchmark_carga.py --alas 10 --anos 5 --clientes 16 --duracao 60
+#   python benchmark_carga.py --servidor "gunicorn -k eventlet -w 2 -b 127.0.0.1:{porta} app:app"
+#
+# Só biblioteca padrão do lado do cliente (http.client), sem requests. Compare
+# resultados da mesma máquina e com os mesmos parâmetros.
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+# Peso de cada rota no sorteio da navegação (o login conta à parte)
+PESOS_ROTAS = {
+    'index': 3,
+    'atas': 2,
+    'atas_mes': 3,
+    'ata': 4,
+    'salvar_ata': 1,
+    'pdf_simples': 1,
+    'pdf_sacramental': 1,
+}
+ROTAS = ('login', *PESOS_ROTAS)
+PERCENTIS = (50, 95, 99)
+
+# Abaixo disso uma diferença de latência é ruído, qualquer que seja a fração
+FOLGA_MS = 5.0
+
+
+def semear(caminho_db, alas, anos, semente):
+    """Cria o banco (migrações do app.py) e grava as alas de carga (gerador_dados) até hoje"""
+    os.environ['DB_PATH'] = caminho_db
+    os.environ.setdefault('PDF_CACHE_DIR', os.path.join(os.path.dirname(caminho_db), 'pdf_cache'))
+    sys.path.insert(0, RAIZ)
+    from app import app
+
+    inicio = time.perf_counter()
+    with app.app_context():
+        total = gerador_dados.gerar(alas, anos, semente, date.today(), prefixo='carga')
+    print(f"Banco: {alas} ala(s), {total} atas em {time.perf_counter() - inicio:.1f} s")
+
+
+def carregar_alas(caminho_db):
+    """Alas de carga do banco, com as atas e os meses de cada uma"""
+    conn = sqlite3.connect(caminho_db)
+    alas = []
+    usuarios = conn.execute(
+        "SELECT id, username, password FROM users WHERE username LIKE 'carga%' ORDER BY id"
+    ).fetchall()
+    for ala_id, usuario, senha in usuarios:
+        atas = conn.execute("SELECT id, tipo, data FROM atas WHERE ala_id = ? ORDER BY data", (ala_id,)).fetchall()
+        alas.append({
+            'usuario': usuario,
+            'senha': senha,
+            'sacramentais': [(ata_id, data) for ata_id, tipo, data in atas if tipo == 'sacramental'],
+            'batismos': [ata_id for ata_id, tipo, _ in atas if tipo == 'batismo'],
+            'meses': sorted({data[:7] for _, _, data in atas}),
+        })
+    conn.close()
+    return alas
+
+
+# ------------------------------------------------------------------
+# Servidor
+# ------------------------------------------------------------------
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def subir_servidor(comando, porta, caminho_db, pasta, espera=30):
+    env = {
+        **os.environ,
+        'DB_PATH': caminho_db,
+        'PORT': str(porta),
+        'PDF_CACHE_DIR': os.path.join(pasta, 'pdf_cache'),
+    }
+    log = open(os.path.join(pasta, 'servidor.log'), 'wb')
+    processo = subprocess.Popen(
+        comando.format(porta=porta, python=sys.executable), shell=True, cwd=RAIZ,
+        env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            break
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            conexao.request('GET', '/')
+            if conexao.getresponse().status == 200:
+                conexao.close()
+                return processo
+        except OSError:
+            time.sleep(0.2)
+    parar_servidor(processo)
+    raise RuntimeError(f"servidor não respondeu em {espera} s (ver {log.name})")
+
+
+def parar_servidor(processo):
+    if processo.poll() is None:
+        processo.terminate()
+        try:
+            processo.wait(10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+
+
+# ------------------------------------------------------------------
+# Clientes
+# ------------------------------------------------------------------
+
+class Cliente:
+    """Um navegador: conexão keep-alive e o cookie de sessão do Flask"""
+
+    def __init__(self, porta, ala, sorteio):
+        self.porta = porta
+        self.ala = ala
+        self.sorteio = sorteio
+        self.gerador = gerador_dados.GeradorAla(sorteio)
+        self.conexao = None
+        self.cookie = None
+
+    def pedir(self, metodo, caminho, corpo=None):
+        """(status, segundos); a resposta é lida inteira, como um navegador faria"""
+        cabecalhos = {'Cookie': self.cookie} if self.cookie else {}
+        if corpo is not None:
+            corpo = urlencode(corpo).encode('utf-8')
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        for tentativa in (1, 2):
+            if self.conexao is None:
+                self.conexao = http.client.HTTPConnection('127.0.0.1', self.porta, timeout=60)
+            inicio = time.perf_counter()
+            try:
+                self.conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = self.conexao.getresponse()
+                resposta.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Keep-alive fechado pelo servidor entre duas requisições: reabre uma vez
+                self.conexao.close()
+                self.conexao = None
+                if tentativa == 2:
+                    raise
+                continue
+            segundos = time.perf_counter() - inicio
+            cookie = resposta.getheader('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            if resposta.getheader('Connection', '').lower() == 'close':
+                self.conexao.close()
+                self.conexao = None
+            return resposta.status, segundos
+
+    def login(self):
+        self.cookie = None
+        return self.pedir('POST', '/', {'username': self.ala['usuario'], 'password': self.ala['senha']})
+
+    def requisicao(self, rota):
+        """(método, caminho, corpo, status esperado) de uma rota sorteada"""
+        ala, sorteio = self.ala, self.sorteio
+        if rota == 'index':
+            return 'GET', '/index', None, 200
+        if rota == 'atas':
+            return 'GET', '/atas', None, 200
+        if rota == 'atas_mes':
+            return 'GET', f"/atas/mes/{sorteio.choice(ala['meses'])}", None, 200
+        if rota == 'ata':
+            if sorteio.random() < 0.8:
+                ata_id = sorteio.choice(ala['sacramentais'])[0]
+            else:
+                ata_id = sorteio.choice(ala['batismos'])
+            return 'GET', f"/ata/{ata_id}", None, 200
+        if rota == 'salvar_ata':
+            ata_id, data = sorteio.choice(ala['sacramentais'])
+            corpo = [('editar', ata_id)]
+            for campo, valor in self.gerador.sacramental(date.fromisoformat(data)).items():
+                if isinstance(valor, list):
+                    corpo.extend((f"{campo}[]", item) for item in valor)
+                else:
+                    corpo.append((campo, valor))
+            return 'POST', '/ata/form', corpo, 302
+        if rota == 'pdf_simples':
+            return 'GET', f"/ata/exportar/{sorteio.choice(ala['batismos'])}", None, 200
+        if rota == 'pdf_sacramental':
+            return 'GET', f"/ata/exportar_sacramental/{sorteio.choice(ala['sacramentais'])[0]}", None, 200
+        raise ValueError(rota)
+
+
+class Medicoes:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tempos = {rota: [] for rota in ROTAS}
+        self.erros = {rota: 0 for rota in ROTAS}
+        self.exemplos_erro = {}
+
+    def registrar(self, rota, ok, segundos, detalhe=None):
+        with self.lock:
+            if ok:
+                self.tempos[rota].append(segundos * 1000)
+            else:
+                self.erros[rota] += 1
+                self.exemplos_erro.setdefault(rota, detalhe)
+
+
+def navegar(cliente, medicoes, fim_aquecimento, fim, por_sessao):
+    rotas = list(PESOS_ROTAS)
+    pesos = list(PESOS_ROTAS.values())
+    feitas = por_sessao
+    while time.monotonic() < fim:
+        if feitas >= por_sessao:
+            rota, esperado, pedido = 'login', 302, cliente.login
+            feitas = 0
+        else:
+            rota = cliente.sorteio.choices(rotas, pesos)[0]
+            metodo, caminho, corpo, esperado = cliente.requisicao(rota)
+            pedido = lambda: cliente.pedir(metodo, caminho, corpo)
+            feitas += 1
+        medir = time.monotonic() >= fim_aquecimento
+        try:
+            status, segundos = pedido()
+        except OSError as e:
+            if medir:
+                medicoes.registrar(rota, False, 0, f"{type(e).__name__}: {e}")
+            feitas = por_sessao
+            continue
+        if medir:
+            medicoes.registrar(rota, status == esperado, segundos, f"status {status}")
+        if status != esperado:
+            # Sessão perdida ou servidor com problema: recomeça pelo login
+            feitas = por_sessao
+
+
+# ------------------------------------------------------------------
+# Resultado e comparação
+# ------------------------------------------------------------------
+
+def percentil(ordenados, p):
+    """Percentil pelo método do posto mais próximo"""
+    if not ordenados:
+        return None
+    posto = max(1, -(-p * len(ordenados) // 100))
+    return ordenados[posto - 1]
+
+
+def resumir(medicoes, duracao):
+    rotas = {}
+    for rota in ROTAS:
+        tempos = sorted(medicoes.tempos[rota])
+        rotas[rota] = {
+            'requisicoes': len(tempos),
+            'erros': medicoes.erros[rota],
+            'por_segundo': round(len(tempos) / duracao, 2),
+            **{f"p{p}_ms": round(percentil(tempos, p), 2) if tempos else None for p in PERCENTIS},
+            'max_ms': round(tempos[-1], 2) if tempos else None,
+        }
+    total = sum(r['requisicoes'] for r in rotas.values())
+    return {
+        'rotas': rotas,
+        'total': {
+            'requisicoes': total,
+            'erros': sum(r['erros'] for r in rotas.values()),
+            'por_segundo': round(total / duracao, 2),
+        },
+    }
+
+
+def comparar(atual, base, tolerancia, folga_ms=FOLGA_MS):
+    """Lista de regressões (textos) do resultado atual em relação à linha de base"""
+    regressoes = []
+    for rota, medida in atual['rotas'].items():
+        anterior = base['rotas'].get(rota)
+        if not anterior:
+            continue
+        if medida['erros'] and not anterior['erros']:
+            regressoes.append(f"{rota}: {medida['erros']} erro(s), a linha de base não tinha nenhum")
+        for p in PERCENTIS:
+            chave = f"p{p}_ms"
+            agora, antes = medida[chave], anterior[chave]
+            if agora is None or antes is None:
+                continue
+            if agora > antes * (1 + tolerancia) and agora - antes > folga_ms:
+                regressoes.append(f"{rota}: p{p} {antes:.1f} ms -> {agora:.1f} ms (+{(agora / antes - 1) * 100:.0f}%)")
+    antes, agora = base['total']['por_segundo'], atual['total']['por_segundo']
+    if agora < antes * (1 - tolerancia):
+        regressoes.append(f"vazão total: {antes:.1f} -> {agora:.1f} req/s ({(agora / antes - 1) * 100:.0f}%)")
+    return regressoes
+
+
+def imprimir(resultado):
+    print(f"{'rota':<16}{'req':>7}{'erros':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for rota, r in resultado['rotas'].items():
+        ms = [f"{r[c]:>9.1f}" if r[c] is not None else f"{'-':>9}" for c in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')]
+        print(f"{rota:<16}{r['requisicoes']:>7}{r['erros']:>7}{r['por_segundo']:>9.1f}{''.join(ms)}")
+    total = resultado['total']
+    print(f"{'total':<16}{total['requisicoes']:>7}{total['erros']:>7}{total['por_segundo']:>9.1f}  (latências em ms)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP com linha de base por rota")
+    parser.add_argument('--alas', type=int, default=3)
+    parser.add_argument('--anos', type=int, default=2, help="anos de atas por ala")
+    parser.add_argument('--clientes', type=int, default=8, help="clientes simultâneos")
+    parser.add_argument('--duracao', type=float, default=20, help="segundos medidos")
+    parser.add_argument('--aquecimento', type=float, default=3, help="segundos iniciais fora da medição")
+    parser.add_argument('--por-sessao', type=int, default=20, help="requisições entre dois logins")
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--banco', help="banco a reutilizar (criado e semeado se não existir); padrão: temporário")
+    parser.add_argument('--servidor', default='{python} app.py',
+                        help="comando do servidor; {porta} e {python} são substituídos (PORT também vai no ambiente)")
+    parser.add_argument('--saida', help="grava o resultado em JSON (para usar depois como --baseline)")
+    parser.add_argument('--baseline', help="resultado anterior para comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="piora aceita, em fração (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix='benchmark_carga_')
+    try:
+        caminho_db = os.path.abspath(args.banco) if args.banco else os.path.join(pasta, 'atas.db')
+        if not os.path.exists(caminho_db):
+            semear(caminho_db, args.alas, args.anos, args.semente)
+        alas = carregar_alas(caminho_db)
+        if not alas:
+            print(f"Nenhuma ala de carga em {caminho_db}")
+            return 2
+
+        porta = porta_livre()
+        processo = subir_servidor(args.servidor, porta, caminho_db, pasta)
+        try:
+            medicoes = Medicoes()
+            inicio = time.monotonic()
+            fim_aquecimento = inicio + args.aquecimento
+            fim = fim_aquecimento + args.duracao
+            clientes = [
+                Cliente(porta, alas[i % len(alas)], random.Random(args.semente * 1000 + i))
+                for i in range(args.clientes)
+            ]
+            threads = [
+                threading.Thread(target=navegar, args=(c, medicoes, fim_aquecimento, fim, args.por_sessao))
+                for c in clientes
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            parar_servidor(processo)
+
+        resultado = {
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'parametros': {
+                'alas': len(alas), 'anos': args.anos, 'clientes': args.clientes,
+                'duracao': args.duracao, 'servidor': args.servidor, 'semente': args.semente,
+            },
+            **resumir(medicoes, args.duracao),
+        }
+        print(f"{args.clientes} cliente(s), {args.duracao:.0f} s, servidor: {args.servidor}")
+        imprimir(resultado)
+        for rota, exemplo in medicoes.exemplos_erro.items():
+            print(f"Erro em {rota}: {exemplo}")
+
+        if args.saida:
+            with open(args.saida, 'w', encoding='utf-8') as arquivo:
+                json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+            print(f"Resultado gravado em {args.saida}")
+
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as arquivo:
+                base = json.load(arquivo)
+            if base.get('parametros') != resultado['parametros']:
+                print(f"Aviso: parâmetros diferentes da linha de base ({base.get('parametros')})")
+            regressoes = comparar(resultado, base, args.tolerancia)
+            if regressoes:
+                print(f"REGRESSÃO em relação a {args.baseline} (tolerância {args.tolerancia:.0%}):")
+                for texto in regressoes:
+                    print(f"  {texto}")
+                return 1
+            print(f"Sem regressão em relação a {args.baseline} (tolerância {args.tolerancia:.0%})")
+        return 0
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
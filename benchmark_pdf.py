@@ -0,0 +1,119 @@
+import argparse
+import importlib.util
+import statistics
+import sys
+import time
+import tracemalloc
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import TableStyle
+
+# Micro-benchmark da geração do PDF sacramental.
+#
+# Gera uma ata grande (muitos anúncios e discursantes) várias vezes e mostra o
+# tempo por PDF, o pico de memória (tracemalloc), quantos estilos são criados
+# por render e o número de páginas. Para comparar com outra versão do layout,
+# aponte --modulo para outro pdf.py (ex.: git show HEAD~1:pdf.py > /tmp/pdf_antigo.py).
+#
+#   python benchmark_pdf.py
+#   python benchmark_pdf.py --modulo /tmp/pdf_antigo.py --anuncios 40 --discursantes 12
+
+
+def carregar_modulo(caminho):
+    if not caminho:
+        import pdf
+        return pdf
+    spec = importlib.util.spec_from_file_location('pdf_comparado', caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def ata_grande(anuncios, discursantes):
+    ata = {'id': 1, 'ala_id': 1, 'tipo': 'sacramental', 'data': '2025-06-01'}
+    detalhes = {
+        'presidido': 'Bispo Fulano de Tal',
+        'dirigido': 'Irmão Ciclano',
+        'pianista': 'Irmã Beltrana',
+        'regente_musica': 'Irmã Fulana',
+        'recepcionistas': 'Irmão A e Irmão B',
+        'reconhecemos_presenca': 'Presidente da Estaca',
+        'hino_sacramental': '169 - Enquanto Aqui Reunidos',
+        'hino_intermediario': '85 - Que Firme Alicerce',
+        'hino_abertura': '2 - Alva Luz',
+        'hino_encerramento': '152 - Deus Vos Guarde',
+        'oracao_abertura': 'Irmão Primeiro',
+        'oracao_encerramento': 'Irmã Última',
+        'anuncios': [
+            f"Anúncio {i + 1}: atividade da ala no sábado às 19h, tragam um prato para compartilhar & convidem os amigos."
+            for i in range(anuncios)
+        ],
+        'discursantes': [f"Discursante número {i + 1}" for i in range(discursantes)],
+    }
+    unidade = {'nome': 'Ala Criciúma 1', 'estaca': 'Criciúma', 'horario': '09:00'}
+    return ata, detalhes, unidade
+
+
+class ContadorEstilos:
+    """Conta ParagraphStyle/TableStyle criados enquanto está ativo"""
+
+    def __enter__(self):
+        self.total = 0
+        self._originais = {}
+        for classe in (ParagraphStyle, TableStyle):
+            original = classe.__init__
+            self._originais[classe] = original
+
+            def contar(objeto, *args, _original=original, **kwargs):
+                self.total += 1
+                return _original(objeto, *args, **kwargs)
+            classe.__init__ = contar
+        return self
+
+    def __exit__(self, *exc):
+        for classe, original in self._originais.items():
+            classe.__init__ = original
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do PDF sacramental")
+    parser.add_argument('--modulo', help="pdf.py alternativo para comparar (padrão: o pdf.py do projeto)")
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--anuncios', type=int, default=25)
+    parser.add_argument('--discursantes', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    modulo = carregar_modulo(args.modulo)
+    ata, detalhes, unidade = ata_grande(args.anuncios, args.discursantes)
+
+    def gerar():
+        return modulo.gerar_pdf_sacramental(ata, detalhes, None, unidade)
+
+    pdf_bytes = gerar()  # aquecimento (imports, fontes, estilos do módulo)
+
+    tempos = []
+    for _ in range(args.repeticoes):
+        inicio = time.perf_counter()
+        gerar()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    with ContadorEstilos() as contador:
+        gerar()
+
+    tracemalloc.start()
+    gerar()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Módulo: {modulo.__file__}")
+    print(f"Ata: {args.anuncios} anúncios, {args.discursantes} discursantes")
+    print(f"Páginas: {pdf_bytes.count(b'/Type /Page') - pdf_bytes.count(b'/Type /Pages')}")
+    print(f"Tamanho: {len(pdf_bytes) / 1024:.1f} KiB")
+    print(f"Tempo por PDF: mediana {statistics.median(tempos):.2f} ms, "
+          f"mínimo {min(tempos):.2f} ms ({args.repeticoes} repetições)")
+    print(f"Estilos criados por PDF: {contador.total}")
+    print(f"Pico de memória: {pico / 1024:.0f} KiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
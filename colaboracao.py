@@ -0,0 +1,724 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from flask import current_app
+import models as dbHandler
+import compacto
+import deltas
+import pdf_cache
+from socketio import PubSubManager
+
+# Edição colaborativa: buffer de saída por sala.
+#
+# Cada tecla digitada chega como um field_update. Em vez de reenviar um frame
+# por caractere para cada pessoa da sala, os valores ficam num buffer por sala
+# (só o último valor de cada campo) e a cada SOCKET_TICK_MS uma tarefa em
+# segundo plano manda um único fields_update com tudo que mudou.
+#
+# Formato enviado aos clientes:
+#   {'campos': {nome: valor, ...}, 'autores': {nome: sid, ...}, 'revisoes': {nome: rev}}
+# 'autores' só vai quando o lote tem mais de um autor; com um só, o frame nem é
+# enviado para ele (skip_sid). O cliente ignora os campos que ele mesmo enviou.
+# 'revisoes' só vai quando há campos longos (CAMPOS_DELTA) no lote.
+#
+# Os campos longos chegam como field_delta e saem no mesmo tick, depois do
+# fields_update, num fields_delta para a sala inteira (inclusive o autor, que
+# usa a própria operação como confirmação):
+#   {'deltas': [[nome, rev, sid, operação], ...], 'checkpoints': {nome: [rev, valor]}}
+# Aqui não dá para guardar só o último: as operações vão todas, em ordem.
+#
+# Os clientes no modo compacto (compacto.py) ficam numa sala Socket.IO à parte
+# e recebem as mesmas mensagens como bytes no evento 'b'; emitir_sala manda
+# para os dois grupos.
+
+
+def emitir_sala(socketio, evento, mensagem, sala, skip_sid=None):
+    """Emite para a sala nos dois modos: JSON para uns, 'b' compacto para outros.
+    Devolve {modo: (destinatários neste worker, bytes da mensagem)} do que foi emitido."""
+    # Com fila de mensagens (mensageria.py) pode haver gente da sala em outro
+    # worker: emite mesmo sem destinatários aqui
+    distribuido = isinstance(socketio.server.manager, PubSubManager)
+    enviados = {}
+    destinatarios = _destinatarios(socketio, sala, skip_sid)
+    if destinatarios or distribuido:
+        socketio.emit(evento, mensagem, to=sala, skip_sid=skip_sid)
+        enviados['json'] = (destinatarios, len(json.dumps(mensagem, ensure_ascii=False).encode()))
+
+    sala_b = compacto.sala_socket(sala, True)
+    destinatarios = _destinatarios(socketio, sala_b, skip_sid)
+    if destinatarios or distribuido:
+        dados = compacto.codificar(evento, mensagem)
+        if dados is not None:
+            socketio.emit('b', dados, to=sala_b, skip_sid=skip_sid)
+            enviados['compacto'] = (destinatarios, len(dados))
+    return enviados
+
+
+def _destinatarios(socketio, sala, skip_sid):
+    # Só os deste worker; os dos outros entram na conta do worker deles
+    participantes = socketio.server.manager.get_participants('/', sala)
+    return sum(1 for sid, _ in participantes if sid != skip_sid)
+
+
+class BufferSalas:
+    def __init__(self, socketio, intervalo):
+        self.socketio = socketio
+        self.intervalo = intervalo  # segundos; 0 = envia na hora, sem agrupar
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._pendentes = {}  # sala -> {campo: (valor, sid, revisão ou None)}
+        self._deltas = {}     # sala -> [[campo, revisão, sid, operação], ...]
+        self._checkpoints = {}  # sala -> {campo: [revisão, valor]}
+        self._tarefa = None
+        self._contadores = {
+            'eventos_recebidos': 0,
+            'deltas_recebidos': 0,
+            'campos_substituidos': 0,  # valores descartados porque chegou outro mais novo antes do envio
+            'mensagens_enviadas': 0,   # um emit por sala
+            'frames_enviados': 0,      # mensagens x destinatários
+            'bytes_recebidos': 0,      # eventos recebidos, JSON ou compacto (sem o envelope do Socket.IO)
+            'bytes_enviados': 0,       # mensagens x destinatários (JSON ou compacto)
+            'frames_compactos': 0,     # dos frames_enviados, quantos no modo compacto
+        }
+
+    def adicionar(self, sala, campo, valor, sid, revisao=None, tamanho=None):
+        if tamanho is None:
+            tamanho = len(json.dumps({'name': campo, 'value': valor}, ensure_ascii=False).encode())
+        with self._lock:
+            self._contadores['eventos_recebidos'] += 1
+            self._contadores['bytes_recebidos'] += tamanho
+            campos = self._pendentes.setdefault(sala, {})
+            if campo in campos:
+                self._contadores['campos_substituidos'] += 1
+            campos[campo] = (valor, sid, revisao)
+            iniciar = self._reservar_tarefa()
+        self._agendar(iniciar)
+
+    def adicionar_delta(self, sala, campo, revisao, op, sid, checkpoint=None, tamanho=0):
+        with self._lock:
+            self._contadores['deltas_recebidos'] += 1
+            self._contadores['bytes_recebidos'] += tamanho
+            self._deltas.setdefault(sala, []).append([campo, revisao, sid, op])
+            if checkpoint is not None:
+                self._checkpoints.setdefault(sala, {})[campo] = [revisao, checkpoint]
+            iniciar = self._reservar_tarefa()
+        self._agendar(iniciar)
+
+    def _reservar_tarefa(self):
+        # Chamado com o lock: reserva a tarefa antes de soltá-lo
+        iniciar = self.intervalo > 0 and self._tarefa is None
+        if iniciar:
+            self._tarefa = True
+        return iniciar
+
+    def _agendar(self, iniciar):
+        if self.intervalo <= 0:
+            self.enviar_pendentes()
+        elif iniciar:
+            self._tarefa = self.socketio.start_background_task(self._laco)
+
+    def _laco(self):
+        while True:
+            self.socketio.sleep(self.intervalo)
+            try:
+                self.enviar_pendentes()
+            except Exception as e:
+                print(f"Erro ao enviar fields_update: {e}")
+
+    def descartar_sala(self, sala):
+        """Esquece o que estava pendente para a sala (ninguém mais nela)"""
+        with self._lock:
+            self._pendentes.pop(sala, None)
+            self._deltas.pop(sala, None)
+            self._checkpoints.pop(sala, None)
+
+    def enviar_pendentes(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+            lotes_deltas, self._deltas = self._deltas, {}
+            checkpoints, self._checkpoints = self._checkpoints, {}
+
+        for sala, campos in pendentes.items():
+            autores = {sid for _, sid, _ in campos.values()}
+            mensagem = {'campos': {campo: valor for campo, (valor, _, _) in campos.items()}}
+            revisoes = {campo: rev for campo, (_, _, rev) in campos.items() if rev is not None}
+            if revisoes:
+                mensagem['revisoes'] = revisoes
+            skip_sid = None
+            if len(autores) == 1:
+                skip_sid = next(iter(autores))
+            else:
+                mensagem['autores'] = {campo: sid for campo, (_, sid, _) in campos.items()}
+            self._emitir('fields_update', mensagem, sala, skip_sid)
+
+        for sala, lista in lotes_deltas.items():
+            mensagem = {'deltas': lista}
+            if sala in checkpoints:
+                mensagem['checkpoints'] = checkpoints[sala]
+            self._emitir('fields_delta', mensagem, sala, None)
+
+    def _emitir(self, evento, mensagem, sala, skip_sid):
+        enviados = emitir_sala(self.socketio, evento, mensagem, sala, skip_sid)
+        with self._lock:
+            for modo, (frames, tamanho) in enviados.items():
+                self._contadores['mensagens_enviadas'] += 1
+                self._contadores['frames_enviados'] += frames
+                self._contadores['bytes_enviados'] += tamanho * frames
+                if modo == 'compacto':
+                    self._contadores['frames_compactos'] += frames
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats['salas_pendentes'] = len(self._pendentes)
+        recebidos = stats['eventos_recebidos'] + stats['deltas_recebidos']
+        stats['frames_por_evento'] = round(stats['frames_enviados'] / recebidos, 3) if recebidos else None
+        stats['pid'] = self.pid
+        stats['tick_ms'] = round(self.intervalo * 1000)
+        return stats
+
+
+# ==================================================================
+# Estado autoritativo das salas + autosave
+# ==================================================================
+# O servidor guarda o mapa {campo: valor} de cada sala ativa. Quem entra
+# recebe tudo numa mensagem (estado_inicial) e os campos alterados são
+# gravados em lote a cada AUTOSAVE_SEGUNDOS e quando a sala esvazia:
+#   ata-<id>                  -> colunas de sacramental/batismo + ata_participantes
+#   nova-<ala>-<tipo>-<data>  -> tabela rascunhos (a ata ainda não existe)
+#
+# Campos de lista chegam como 'discursantes[]#<posição>'; hinos e orações de
+# abertura/encerramento são posições fixas em ata_participantes.
+LISTAS = {'discursantes[]': 'discursante', 'anuncios[]': 'anuncio', 'batizados[]': 'batizado'}
+POSICIONAIS = {
+    'hino_abertura': ('hino', 0), 'hino_encerramento': ('hino', 1),
+    'oracao_abertura': ('oracao', 0), 'oracao_encerramento': ('oracao', 1),
+}
+TIPOS = ('sacramental', 'batismo')
+
+# Salas sem alteração há mais tempo que isso liberam o mapa de campos (recarregado se alguém voltar)
+OCIOSA_SEGUNDOS = 600
+
+# Campos de texto longo: em vez do valor inteiro a cada tecla, o cliente manda
+# field_delta (operação de deltas.py sobre uma revisão do campo). O servidor
+# rebaseia a operação sobre as que entraram depois daquela revisão, aplica e
+# repassa só a operação em fields_delta. A cada DELTA_CHECKPOINT revisões o
+# valor inteiro vai junto, para os clientes conferirem que estão iguais.
+CAMPOS_DELTA = ('anuncios[]', 'desobrigacoes', 'apoios', 'confirmacoes_batismo',
+                'reconhecemos_presenca', 'apoio_membros')
+DELTA_HISTORICO = 200   # operações guardadas por campo para rebasear; mais velhas pedem resync
+DELTA_CHECKPOINT = 50
+
+
+def campo_delta(campo):
+    return campo.partition('#')[0] in CAMPOS_DELTA
+
+
+def normalizar_campo(nome):
+    """'discursantes[]' -> 'discursantes[]#0': listas sempre com posição. ValueError se a posição for inválida."""
+    base, _, indice = str(nome).partition('#')
+    if base.endswith('[]'):
+        return f"{base}#{int(indice or 0)}"
+    return base
+
+
+def valor_valido(campo, valor):
+    """Campos são texto; só os checkboxes incluir_* são booleanos"""
+    if isinstance(valor, bool):
+        return campo.startswith('incluir_')
+    return isinstance(valor, str)
+
+
+def _itens_da_lista(campos, lista):
+    prefixo = lista + '#'
+    posicoes = sorted((int(c[len(prefixo):]), c) for c in campos if c.startswith(prefixo))
+    return [campos[c] for _, c in posicoes]
+
+
+def campos_da_ata(tipo, detalhes):
+    """Mapa {campo do formulário: valor} a partir de detalhes_sacramental/detalhes_batismo"""
+    if not detalhes:
+        return {}
+    campos = {c: detalhes.get(c) or '' for c in dbHandler.COLUNAS_AUTOSAVE[tipo]}
+    if tipo == 'sacramental':
+        for campo in POSICIONAIS:
+            campos[campo] = detalhes.get(campo) or ''
+        listas = {'discursantes[]': detalhes.get('discursantes'), 'anuncios[]': detalhes.get('anuncios')}
+    else:
+        listas = {'batizados[]': detalhes.get('batizados')}
+    for lista, itens in listas.items():
+        for i, valor in enumerate(itens or []):
+            campos[f"{lista}#{i}"] = valor
+    return campos
+
+
+def resolver_sala(ala_id, dados):
+    """(sala, ata_id, tipo, data) do formulário aberto pelo cliente, ou None se inválido/sem permissão"""
+    editar = str(dados.get('editar') or '').strip()
+    if editar:
+        if not editar.isdigit():
+            return None
+        ata = dbHandler.get_db().execute(
+            "SELECT id, tipo, data FROM atas WHERE id = ? AND ala_id = ?", (int(editar), ala_id)
+        ).fetchone()
+        if not ata or ata['tipo'] not in TIPOS:
+            return None
+        return f"ata-{ata['id']}", ata['id'], ata['tipo'], ata['data']
+
+    tipo, data = dados.get('tipo'), str(dados.get('data') or '')
+    if tipo not in TIPOS:
+        return None
+    try:
+        time.strptime(data, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return f"nova-{ala_id}-{tipo}-{data}", None, tipo, data
+
+
+class Sala:
+    def __init__(self, nome, ala_id, tipo, data, ata_id):
+        self.nome = nome
+        self.ala_id = ala_id
+        self.tipo = tipo
+        self.data = data
+        self.ata_id = ata_id
+        self.campos = None    # None = ainda não carregado (ou liberado por ociosidade)
+        self.sujos = set()
+        self.revisoes = {}    # campo de texto longo -> revisão (sobrevive à liberação por ociosidade)
+        self.historico = {}   # campo -> deque[(revisão, operação)]
+        self.alterada_em = time.monotonic()
+
+
+class EstadoSalas:
+    def __init__(self, app, socketio, intervalo):
+        self.app = app
+        self.socketio = socketio
+        self.intervalo = intervalo  # segundos entre autosaves; 0 = só quando a sala esvazia
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._salas = {}
+        self._tarefa = None
+        self._contadores = {
+            'alteracoes': 0,
+            'autosaves': 0,             # transações de autosave com algo gravado
+            'salas_gravadas': 0,
+            'campos_gravados': 0,
+            'erros_autosave': 0,
+            'snapshots_enviados': 0,
+            'carregamentos': 0,
+            'deltas_aplicados': 0,
+            'deltas_rebaseados': 0,     # chegaram sobre uma revisão antiga e foram transformados
+            'deltas_recusados': 0,      # revisão fora do histórico ou operação inválida: cliente recebe o valor inteiro
+        }
+
+    def _carregar(self, sala):
+        """Mapa inicial: o banco (ata existente) ou o rascunho (ata nova)"""
+        with self.app.app_context():
+            if sala.ata_id is not None:
+                if sala.tipo == 'sacramental':
+                    campos = campos_da_ata('sacramental', dbHandler.detalhes_sacramental(sala.ata_id))
+                else:
+                    campos = campos_da_ata('batismo', dbHandler.detalhes_batismo(sala.ata_id))
+            else:
+                campos = dbHandler.carregar_rascunho(sala.nome) or {}
+        with self._lock:
+            self._contadores['carregamentos'] += 1
+            if sala.campos is None:
+                sala.campos = campos
+
+    def abrir(self, nome, ala_id, tipo, data, ata_id):
+        """Registra a sala (se nova) e devolve (campos, revisões dos campos longos) para o snapshot"""
+        with self._lock:
+            sala = self._salas.get(nome)
+            if sala is None:
+                sala = self._salas[nome] = Sala(nome, ala_id, tipo, data, ata_id)
+            iniciar = self.intervalo > 0 and self._tarefa is None
+            if iniciar:
+                self._tarefa = True
+        if iniciar:
+            self._tarefa = self.socketio.start_background_task(self._laco)
+        while True:
+            if sala.campos is None:
+                self._carregar(sala)
+            with self._lock:
+                if sala.campos is None:
+                    continue  # liberada por ociosidade entre o carregamento e o lock
+                sala.alterada_em = time.monotonic()
+                self._contadores['snapshots_enviados'] += 1
+                return dict(sala.campos), dict(sala.revisoes)
+
+    def atualizar(self, nome, campo, valor):
+        """Valor inteiro do campo. Devolve a nova revisão se for um campo longo (senão None)."""
+        sala = self._salas.get(nome)
+        if sala is None:
+            return None
+        while True:
+            if sala.campos is None:
+                self._carregar(sala)
+            with self._lock:
+                if sala.campos is None:
+                    continue
+                sala.campos[campo] = valor
+                sala.sujos.add(campo)
+                sala.alterada_em = time.monotonic()
+                self._contadores['alteracoes'] += 1
+                if not campo_delta(campo):
+                    return None
+                # Operações pendentes sobre o valor antigo não valem mais
+                sala.historico.pop(campo, None)
+                sala.revisoes[campo] = sala.revisoes.get(campo, 0) + 1
+                return sala.revisoes[campo]
+
+    def aplicar_delta(self, nome, campo, base, op):
+        """Aplica a operação feita sobre a revisão base. Devolve (revisão, operação rebaseada,
+        valor se for hora de checkpoint) ou None se o cliente precisa recomeçar do valor inteiro."""
+        sala = self._salas.get(nome)
+        if sala is None:
+            return None
+        while True:
+            if sala.campos is None:
+                self._carregar(sala)
+            with self._lock:
+                if sala.campos is None:
+                    continue
+                revisao = sala.revisoes.get(campo, 0)
+                historico = sala.historico.setdefault(campo, deque(maxlen=DELTA_HISTORICO))
+                if not isinstance(base, int) or base > revisao or base < revisao - len(historico):
+                    self._contadores['deltas_recusados'] += 1
+                    return None
+                try:
+                    deltas.validar(op)
+                    for rev, anterior in historico:
+                        if rev > base:
+                            op = deltas.transformar(op, anterior)[0]
+                    valor = deltas.aplicar(str(sala.campos.get(campo) or ''), op)
+                except ValueError:
+                    self._contadores['deltas_recusados'] += 1
+                    return None
+                if base < revisao:
+                    self._contadores['deltas_rebaseados'] += 1
+                revisao += 1
+                sala.revisoes[campo] = revisao
+                historico.append((revisao, op))
+                sala.campos[campo] = valor
+                sala.sujos.add(campo)
+                sala.alterada_em = time.monotonic()
+                self._contadores['alteracoes'] += 1
+                self._contadores['deltas_aplicados'] += 1
+                return revisao, op, (valor if revisao % DELTA_CHECKPOINT == 0 else None)
+
+    def valor_campo(self, nome, campo):
+        """(revisão, valor) atuais do campo, para o cliente que pediu resync"""
+        sala = self._salas.get(nome)
+        if sala is None:
+            return None
+        while True:
+            if sala.campos is None:
+                self._carregar(sala)
+            with self._lock:
+                if sala.campos is None:
+                    continue
+                return sala.revisoes.get(campo, 0), sala.campos.get(campo) or ''
+
+    def _laco(self):
+        while True:
+            self.socketio.sleep(self.intervalo)
+            try:
+                self.salvar_pendentes()
+                self._liberar_ociosas()
+            except Exception as e:
+                print(f"Erro no autosave das salas: {e}")
+
+    def salvar_pendentes(self, nomes=None):
+        """Grava numa única transação os campos alterados das salas (todas ou só as informadas).
+        Devolve quantas salas foram gravadas; as que falharem continuam pendentes."""
+        with self._lock:
+            lote = []
+            for sala in self._salas.values():
+                if sala.sujos and (nomes is None or sala.nome in nomes):
+                    lote.append((sala, sala.sujos, dict(sala.campos)))
+                    sala.sujos = set()
+        if not lote:
+            return 0
+
+        with self.app.app_context():
+            conn = dbHandler.get_db()
+            # Uma transação, um SAVEPOINT por sala: a sala que falhar não impede as outras
+            gravadas, falhas = [], []
+            try:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN")
+                for sala, sujos, campos in lote:
+                    conn.execute("SAVEPOINT sala")
+                    try:
+                        self._gravar(sala, sujos, campos)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO sala")
+                        falhas.append((sala, sujos, e))
+                    else:
+                        gravadas.append((sala, sujos))
+                    conn.execute("RELEASE sala")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                with self._lock:
+                    for sala, sujos, _ in lote:
+                        sala.sujos |= sujos  # tenta de novo no próximo autosave
+                    self._contadores['erros_autosave'] += 1
+                raise
+
+            if falhas:
+                with self._lock:
+                    for sala, sujos, _ in falhas:
+                        sala.sujos |= sujos
+                    self._contadores['erros_autosave'] += len(falhas)
+                for sala, _, e in falhas:
+                    print(f"Autosave da sala {sala.nome} falhou: {e}")
+
+            cache = pdf_cache.get_cache(self.app)
+            for sala, _ in gravadas:
+                if sala.ata_id is not None:
+                    cache.invalidar(ata_id=sala.ata_id)
+
+        with self._lock:
+            self._contadores['autosaves'] += 1
+            self._contadores['salas_gravadas'] += len(gravadas)
+            self._contadores['campos_gravados'] += sum(len(sujos) for _, sujos in gravadas)
+        return len(gravadas)
+
+    def _gravar(self, sala, sujos, campos):
+        if sala.ata_id is None:
+            dbHandler.salvar_rascunho(sala.nome, sala.ala_id, sala.tipo, sala.data, campos)
+            return
+
+        dbHandler.salvar_colunas_ata(sala.ata_id, sala.tipo, {c: campos[c] for c in sujos if c in campos})
+
+        itens = {}
+        for lista, papel in LISTAS.items():
+            if any(c.startswith(lista + '#') for c in sujos):
+                itens[papel] = _itens_da_lista(campos, lista)
+        for campo, (papel, _) in POSICIONAIS.items():
+            if campo in sujos and papel not in itens:
+                posicoes = sorted((pos, c) for c, (p, pos) in POSICIONAIS.items() if p == papel)
+                itens[papel] = [campos.get(c, '') for _, c in posicoes]
+        if not itens:
+            return
+
+        chaves_antes = dbHandler.chaves_discursantes(sala.ata_id) if 'discursante' in itens else set()
+        dbHandler.salvar_participantes(sala.ata_id, itens)
+        if 'discursante' in itens:
+            dbHandler.atualizar_ultimas_falas(
+                sala.ala_id, chaves_antes | dbHandler.chaves_discursantes(sala.ata_id)
+            )
+
+    def _liberar_ociosas(self):
+        limite = time.monotonic() - OCIOSA_SEGUNDOS
+        with self._lock:
+            for sala in self._salas.values():
+                if not sala.sujos and sala.alterada_em < limite:
+                    sala.campos = None
+
+    def fechar(self, nome):
+        """Última pessoa saiu: grava o que falta e esquece a sala"""
+        try:
+            self.salvar_pendentes([nome])
+        finally:
+            with self._lock:
+                sala = self._salas.get(nome)
+                if sala is not None and not sala.sujos:
+                    del self._salas[nome]
+
+    def recarregar(self, nome):
+        """O formulário foi enviado (POST vale mais que o rascunho): descarta alterações pendentes e relê do banco"""
+        with self._lock:
+            sala = self._salas.get(nome)
+            if sala is not None:
+                sala.sujos = set()
+                sala.campos = None
+                # O valor pode ter mudado: quem ainda estiver na sala recomeça do valor inteiro
+                for campo in sala.revisoes:
+                    sala.revisoes[campo] += 1
+                sala.historico = {}
+
+    def descartar(self, nome):
+        with self._lock:
+            self._salas.pop(nome, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats['salas'] = len(self._salas)
+            stats['salas_carregadas'] = sum(1 for s in self._salas.values() if s.campos is not None)
+            stats['campos_pendentes'] = sum(len(s.sujos) for s in self._salas.values())
+        stats['pid'] = self.pid
+        stats['autosave_segundos'] = self.intervalo
+        return stats
+
+
+# ==================================================================
+# Presença nas salas
+# ==================================================================
+# Cada conexão (sid) em uma sala é uma linha da tabela presenca, vista por
+# todos os workers, e uma entrada no mapa local do worker que a atende. A
+# conexão sai da sala no 'leave' ou no 'disconnect' (aba fechada, rede caiu,
+# ping do engine.io expirou). Além disso, a cada PRESENCA_BATIMENTO_SEGUNDOS
+# cada worker renova visto_em das suas linhas e apaga as de qualquer worker
+# que não renovou há PRESENCA_EXPIRA_SEGUNDOS (processo que morreu).
+
+class Presenca:
+    def __init__(self, app, socketio, intervalo, expira):
+        self.app = app
+        self.socketio = socketio
+        self.intervalo = intervalo  # segundos entre batimentos
+        self.expira = expira        # segundos sem batimento até a linha ser apagada
+        self.pid = os.getpid()
+        self.worker = f"{socket.gethostname()}:{self.pid}"
+
+        self._lock = threading.Lock()
+        self._salas_por_sid = {}
+        self._sids_por_sala = {}
+        self._compactos = set()  # sids no modo compacto (sala Socket.IO à parte)
+        self._tarefa = None
+        self._contadores = {
+            'entradas': 0,
+            'saidas': 0,
+            'desconexoes': 0,
+            'batimentos': 0,
+            'orfas_removidas': 0,     # linhas deste worker sem conexão viva
+            'salas_expiradas': 0,     # salas com linhas de workers mortos
+        }
+
+    def entrar(self, sid, sala, compacto=False):
+        """Registra a conexão na sala e devolve quantas pessoas há nela (em todos os workers)"""
+        anterior = self.sala_de(sid)
+        if anterior is not None and anterior != sala:
+            self.sair(sid)
+        with self._lock:
+            iniciar = self._tarefa is None
+            if iniciar:
+                self._tarefa = True
+            self._salas_por_sid[sid] = sala
+            self._sids_por_sala.setdefault(sala, set()).add(sid)
+            if compacto:
+                self._compactos.add(sid)
+            self._contadores['entradas'] += 1
+        if iniciar:
+            # Linhas de um processo anterior com o mesmo host:pid não são mais de ninguém
+            dbHandler.limpar_presenca_worker(self.worker)
+            self._tarefa = self.socketio.start_background_task(self._laco)
+        dbHandler.registrar_presenca(sid, sala, self.worker, time.time())
+        return dbHandler.contar_presenca(sala)
+
+    def sala_de(self, sid):
+        return self._salas_por_sid.get(sid)
+
+    def sair(self, sid, desconectou=False):
+        """Tira a conexão da sala. Devolve (sala, total restante) ou None se ela não estava em nenhuma."""
+        with self._lock:
+            sala = self._salas_por_sid.pop(sid, None)
+            if sala is None:
+                return None
+            sids = self._sids_por_sala.get(sala)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._sids_por_sala[sala]
+            ultima_local = sala not in self._sids_por_sala
+            modo_compacto = sid in self._compactos
+            self._compactos.discard(sid)
+            self._contadores['desconexoes' if desconectou else 'saidas'] += 1
+
+        dbHandler.remover_presenca(sid)
+        self.socketio.server.leave_room(sid, compacto.sala_socket(sala, modo_compacto), namespace='/')
+        if ultima_local:
+            # O estado e o buffer da sala são deste worker: fecha quando o último
+            # cliente dele sai, mesmo que ainda haja gente na sala por outro worker
+            get_buffer(self.socketio, self.app).descartar_sala(sala)
+            get_estado(self.socketio, self.app).fechar(sala)
+        total = dbHandler.contar_presenca(sala)
+        emitir_sala(self.socketio, 'update_users', {'count': total}, sala)
+        return sala, total
+
+    def _laco(self):
+        while True:
+            self.socketio.sleep(self.intervalo)
+            try:
+                with self.app.app_context():
+                    self.batimento()
+            except Exception as e:
+                print(f"Erro no batimento da presença: {e}")
+
+    def batimento(self):
+        # sids que o engine.io já não conhece mas não passaram pelo disconnect
+        manager = self.socketio.server.manager
+        with self._lock:
+            perdidos = [sid for sid in self._salas_por_sid if not manager.is_connected(sid, '/')]
+        for sid in perdidos:
+            self.sair(sid, desconectou=True)
+
+        with self._lock:
+            vivos = list(self._salas_por_sid)
+        agora = time.time()
+        orfas = dbHandler.renovar_presenca(self.worker, vivos, agora)
+        salas = dbHandler.expirar_presenca(agora - self.expira)
+        for sala in salas:
+            emitir_sala(self.socketio, 'update_users', {'count': dbHandler.contar_presenca(sala)}, sala)
+
+        with self._lock:
+            self._contadores['batimentos'] += 1
+            self._contadores['orfas_removidas'] += orfas
+            self._contadores['salas_expiradas'] += len(salas)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats['sessoes_locais'] = len(self._salas_por_sid)
+            stats['sessoes_compactas'] = len(self._compactos)
+            stats['salas_locais'] = {sala: len(sids) for sala, sids in self._sids_por_sala.items()}
+        stats['worker'] = self.worker
+        stats['batimento_segundos'] = self.intervalo
+        stats['expira_segundos'] = self.expira
+        return stats
+
+
+def init_app(app):
+    app.config.setdefault('SOCKET_TICK_MS', int(os.environ.get('SOCKET_TICK_MS', 50)))
+    app.config.setdefault('AUTOSAVE_SEGUNDOS', float(os.environ.get('AUTOSAVE_SEGUNDOS', 3)))
+    app.config.setdefault('PRESENCA_BATIMENTO_SEGUNDOS', float(os.environ.get('PRESENCA_BATIMENTO_SEGUNDOS', 15)))
+    app.config.setdefault('PRESENCA_EXPIRA_SEGUNDOS', float(os.environ.get('PRESENCA_EXPIRA_SEGUNDOS', 60)))
+
+
+def get_buffer(socketio, app=None):
+    """Buffer do processo atual (recriado após fork)"""
+    app = app or current_app._get_current_object()
+    buffer = app.extensions.get('buffer_salas')
+    if buffer is None or buffer.pid != os.getpid():
+        buffer = BufferSalas(socketio, app.config['SOCKET_TICK_MS'] / 1000)
+        app.extensions['buffer_salas'] = buffer
+    return buffer
+
+
+def get_estado(socketio, app=None):
+    """Estado das salas do processo atual (recriado após fork)"""
+    app = app or current_app._get_current_object()
+    estado = app.extensions.get('estado_salas')
+    if estado is None or estado.pid != os.getpid():
+        estado = EstadoSalas(app, socketio, app.config['AUTOSAVE_SEGUNDOS'])
+        app.extensions['estado_salas'] = estado
+    return estado
+
+
+def get_presenca(socketio, app=None):
+    """Presença do processo atual (recriada após fork)"""
+    app = app or current_app._get_current_object()
+    presenca = app.extensions.get('presenca')
+    if presenca is None or presenca.pid != os.getpid():
+        presenca = Presenca(app, socketio, app.config['PRESENCA_BATIMENTO_SEGUNDOS'],
+                            app.config['PRESENCA_EXPIRA_SEGUNDOS'])
+        app.extensions['presenca'] = presenca
+    return presenca
@@ -0,0 +1,240 @@
+import os
+import struct
+import zlib
+
+# Modo compacto da edição colaborativa (opcional, por conexão).
+#
+# No modo normal cada evento é um dict JSON com os nomes dos campos por
+# extenso ({'name': 'reconhecemos_presenca', 'value': ...}). O cliente que
+# manda {'compacto': <versão do esquema>} no join passa a trocar os eventos
+# frequentes como bytes num único evento 'b':
+#   - o nome do campo vira um número pequeno, pela posição em ESQUEMA (a mesma
+#     lista vai para o template, em data-esquema do formulário);
+#   - números são varints e textos são UTF-8 com o tamanho na frente.
+# Quem não pede (ou tem um esquema de outra versão, ex.: aba aberta antes de
+# um deploy) continua no JSON. Os dois grupos ficam em salas Socket.IO
+# separadas ('ata-2' e 'ata-2|b'), e cada mensagem é codificada uma vez por
+# sala, não por destinatário.
+#
+# Compressão: com eventlet o websocket já negocia permessage-deflate quando o
+# navegador oferece; no long-polling vale SOCKET_COMPRESSAO_MIN_BYTES.
+
+# Só acrescente no fim: a posição (+1) é o id que vai no fio
+ESQUEMA = (
+    'presidido', 'dirigido', 'recepcionistas', 'tema', 'pianista', 'regente_musica',
+    'reconhecemos_presenca', 'hino_sacramental', 'hino_intermediario', 'desobrigacoes',
+    'apoios', 'confirmacoes_batismo', 'apoio_membros', 'bencao_criancas', 'ultimo_discursante',
+    'hino_abertura', 'hino_encerramento', 'oracao_abertura', 'oracao_encerramento',
+    'discursantes[]', 'anuncios[]', 'batizados[]',
+    'dedicado', 'testemunha1', 'testemunha2',
+    'incluir_hino_intermediario', 'incluir_desobrigacoes', 'incluir_apoios',
+    'incluir_confirmacoes', 'incluir_apoio_membros', 'incluir_bencao',
+)
+VERSAO = zlib.crc32(','.join(ESQUEMA).encode())
+_IDS = {nome: i + 1 for i, nome in enumerate(ESQUEMA)}
+
+SUFIXO_SALA = '|b'
+
+# Tipos de mensagem (primeiro byte)
+FIELD_UPDATE = 1     # cliente -> servidor
+FIELD_DELTA = 2      # cliente -> servidor
+FIELDS_UPDATE = 3    # servidor -> clientes
+FIELDS_DELTA = 4     # servidor -> clientes
+UPDATE_USERS = 5     # servidor -> clientes
+
+_TEXTO, _VERDADEIRO, _FALSO, _NULO = 0, 1, 2, 3
+
+
+def sala_socket(sala, compacto):
+    """Nome da sala Socket.IO onde ficam as conexões de um dos modos"""
+    return sala + SUFIXO_SALA if compacto else sala
+
+
+def autor(sid):
+    """Identificador de 4 bytes da conexão (no lugar do sid de 20 caracteres)"""
+    return zlib.crc32(sid.encode()) if sid else 0
+
+
+def esquema():
+    """O que o template precisa para falar o modo compacto"""
+    return {'versao': VERSAO, 'campos': list(ESQUEMA)}
+
+
+# ------------------------------------------------------------------
+# Escrita
+# ------------------------------------------------------------------
+
+def _varint(saida, n):
+    while n > 0x7F:
+        saida.append((n & 0x7F) | 0x80)
+        n >>= 7
+    saida.append(n)
+
+
+def _texto(saida, texto):
+    # Surrogate solto (só chega por JSON) vira '?': mesmo tamanho em UTF-16, e o
+    # TextDecoder do navegador não lê surrogates codificados em UTF-8
+    dados = texto.encode('utf-8', 'replace')
+    _varint(saida, len(dados))
+    saida += dados
+
+
+def _campo(saida, campo):
+    base, _, indice = campo.partition('#')
+    id_campo = _IDS.get(base, 0)
+    _varint(saida, id_campo << 1 | bool(indice))
+    if id_campo == 0:
+        _texto(saida, base)
+    if indice:
+        _varint(saida, int(indice))
+
+
+def _valor(saida, valor):
+    if valor is True:
+        saida.append(_VERDADEIRO)
+    elif valor is False:
+        saida.append(_FALSO)
+    elif valor is None:
+        saida.append(_NULO)
+    else:
+        saida.append(_TEXTO)
+        _texto(saida, str(valor))
+
+
+def _op(saida, op):
+    _varint(saida, len(op))
+    for componente in op:
+        if isinstance(componente, str):
+            dados = componente.encode('utf-8', 'replace')
+            _varint(saida, len(dados) << 2 | 2)
+            saida += dados
+        elif componente > 0:
+            _varint(saida, componente << 2)
+        else:
+            _varint(saida, -componente << 2 | 1)
+
+
+def codificar(evento, mensagem):
+    """bytes do evento no modo compacto, ou None se o evento não tem forma compacta"""
+    saida = bytearray()
+    if evento == 'fields_update':
+        saida.append(FIELDS_UPDATE)
+        autores = mensagem.get('autores', {})
+        revisoes = mensagem.get('revisoes', {})
+        _varint(saida, len(mensagem['campos']))
+        for campo, valor in mensagem['campos'].items():
+            _campo(saida, campo)
+            _valor(saida, valor)
+            saida += struct.pack('<I', autor(autores.get(campo)))
+            _varint(saida, revisoes[campo] + 1 if campo in revisoes else 0)
+    elif evento == 'fields_delta':
+        saida.append(FIELDS_DELTA)
+        _varint(saida, len(mensagem['deltas']))
+        for campo, revisao, sid, op in mensagem['deltas']:
+            _campo(saida, campo)
+            _varint(saida, revisao)
+            saida += struct.pack('<I', autor(sid))
+            _op(saida, op)
+        checkpoints = mensagem.get('checkpoints', {})
+        _varint(saida, len(checkpoints))
+        for campo, (revisao, valor) in checkpoints.items():
+            _campo(saida, campo)
+            _varint(saida, revisao)
+            _texto(saida, valor)
+    elif evento == 'update_users':
+        saida.append(UPDATE_USERS)
+        _varint(saida, mensagem['count'])
+    else:
+        return None
+    return bytes(saida)
+
+
+# ------------------------------------------------------------------
+# Leitura (o que os clientes mandam)
+# ------------------------------------------------------------------
+
+class _Leitor:
+    def __init__(self, dados):
+        self.dados = dados
+        self.posicao = 0
+
+    def byte(self):
+        if self.posicao >= len(self.dados):
+            raise ValueError("mensagem truncada")
+        self.posicao += 1
+        return self.dados[self.posicao - 1]
+
+    def varint(self):
+        n = deslocamento = 0
+        while True:
+            b = self.byte()
+            n |= (b & 0x7F) << deslocamento
+            if b < 0x80:
+                return n
+            deslocamento += 7
+            if deslocamento > 63:
+                raise ValueError("varint longo demais")
+
+    def bruto(self, tamanho):
+        fim = self.posicao + tamanho
+        if fim > len(self.dados):
+            raise ValueError("mensagem truncada")
+        trecho = self.dados[self.posicao:fim]
+        self.posicao = fim
+        return trecho.decode('utf-8')
+
+    def texto(self):
+        return self.bruto(self.varint())
+
+    def campo(self):
+        cabecalho = self.varint()
+        id_campo = cabecalho >> 1
+        if id_campo == 0:
+            base = self.texto()
+        elif id_campo <= len(ESQUEMA):
+            base = ESQUEMA[id_campo - 1]
+        else:
+            raise ValueError(f"campo desconhecido: {id_campo}")
+        if cabecalho & 1:
+            return f"{base}#{self.varint()}"
+        return base
+
+    def valor(self):
+        tipo = self.byte()
+        if tipo == _TEXTO:
+            return self.texto()
+        if tipo in (_VERDADEIRO, _FALSO, _NULO):
+            return {_VERDADEIRO: True, _FALSO: False, _NULO: None}[tipo]
+        raise ValueError(f"tipo de valor desconhecido: {tipo}")
+
+    def op(self):
+        componentes = []
+        for _ in range(self.varint()):
+            n = self.varint()
+            if n & 3 == 2:
+                componentes.append(self.bruto(n >> 2))
+            elif n & 3 == 1:
+                componentes.append(-(n >> 2))
+            elif n & 3 == 0:
+                componentes.append(n >> 2)
+            else:
+                raise ValueError("componente inválido")
+        return componentes
+
+
+def decodificar(dados):
+    """(evento, dict no formato JSON do evento) de uma mensagem do cliente. ValueError se inválida."""
+    if not isinstance(dados, (bytes, bytearray)):
+        raise ValueError("mensagem compacta deve ser binária")
+    leitor = _Leitor(bytes(dados))
+    tipo = leitor.byte()
+    if tipo == FIELD_UPDATE:
+        return 'field_update', {'name': leitor.campo(), 'value': leitor.valor()}
+    if tipo == FIELD_DELTA:
+        return 'field_delta', {'name': leitor.campo(), 'rev': leitor.varint(), 'op': leitor.op()}
+    raise ValueError(f"tipo de mensagem desconhecido: {tipo}")
+
+
+def init_app(app):
+    app.config.setdefault('SOCKET_COMPACTO', os.environ.get('SOCKET_COMPACTO', 'true').lower() == 'true')
+    app.config.setdefault('SOCKET_COMPRESSAO_MIN_BYTES', int(os.environ.get('SOCKET_COMPRESSAO_MIN_BYTES', 512)))
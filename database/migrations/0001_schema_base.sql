@@ -1,3 +1,6 @@
+-- Migração 0001: schema base (antigo database/schema.sql)
+-- Tudo com IF NOT EXISTS / OR IGNORE para adotar bancos criados antes das migrações.
+
 -- Tabela de usuários
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -38,6 +41,14 @@ CREATE TABLE IF NOT EXISTS sacramental (
     discursantes TEXT,
     id_tipo INTEGER,
     tema TEXT,
+    recepcionistas TEXT,
+    reconhecemos_presenca TEXT,
+    desobrigacoes TEXT,
+    apoios TEXT,
+    confirmacoes_batismo TEXT,
+    apoio_membros TEXT,
+    bencao_criancas TEXT,
+    ultimo_discursante TEXT,
     FOREIGN KEY(ata_id) REFERENCES atas(id),
     FOREIGN KEY(id_tipo) REFERENCES templates(id)
 );
@@ -91,9 +102,11 @@ CREATE TABLE IF NOT EXISTS templates (
     encerramento TEXT NOT NULL
 );
 
-INSERT OR IGNORE INTO templates (
+-- Templates padrão só entram num banco ainda sem templates
+-- (INSERT OR IGNORE sem id duplicava os dois a cada boot)
+INSERT INTO templates (
     tipo_template,nome,boas_vindas,desobrigacoes,apoios,confirmacoes_batismo,apoio_membro_novo,bencao_crianca,sacramento,mensagens,live,encerramento) 
-VALUES
+SELECT * FROM (VALUES
 (
     1,
     "Sacramental Padrão",
@@ -121,20 +134,14 @@ VALUES
     "Agradecemos a todos pela reverência durante o Sacramento. Hoje é nossa reunião de Jejum e Testemunhos. Gostaríamos de convidar todos a prestar seus testemunhos de forma breve e direta, dando assim tempo para que o máximo de irmãos tenham este privilégio.",
     "Gostaria de lembrar todos que estejam assitindo a trasmissão da reunião, que se identifiquem para que possamos contá-los também",
     "Agradecemos a presença e participação de todos, especialmente aqueles que contribuiram de alguma forma para que essa reunião acontecesse. E convidamos todos para que estejam aqui no próximo domingo. Cantaremos o último hino [NOME] e o(a) irmã(o) [NOME] oferecerá a última oração."
-);
+))
+WHERE NOT EXISTS (SELECT 1 FROM templates);
 
 -- Criar índices para melhor performance
 CREATE INDEX IF NOT EXISTS idx_atas_ala_id ON atas(ala_id);
 CREATE INDEX IF NOT EXISTS idx_atas_data ON atas(data);
+-- Atas de uma ala num intervalo de datas (visões por mês); ver models.FILTRO_MES
+CREATE INDEX IF NOT EXISTS idx_atas_ala_data ON atas(ala_id, data DESC);
 CREATE INDEX IF NOT EXISTS idx_atas_tipo ON atas(tipo);
 CREATE INDEX IF NOT EXISTS idx_sacramental_ata_id ON sacramental(ata_id);
 CREATE INDEX IF NOT EXISTS idx_batismo_ata_id ON batismo(ata_id);
-
-ALTER TABLE sacramental ADD COLUMN recepcionistas TEXT;
-ALTER TABLE sacramental ADD COLUMN reconhecemos_presenca TEXT;
-ALTER TABLE sacramental ADD COLUMN desobrigacoes TEXT;
-ALTER TABLE sacramental ADD COLUMN apoios TEXT;
-ALTER TABLE sacramental ADD COLUMN confirmacoes_batismo TEXT;
-ALTER TABLE sacramental ADD COLUMN apoio_membros TEXT;
-ALTER TABLE sacramental ADD COLUMN bencao_criancas TEXT;
-ALTER TABLE sacramental ADD COLUMN ultimo_discursante TEXT;
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""Colunas que o schema.sql antigo adicionava com ALTER TABLE a cada boot.
+
+Bancos criados pelo schema_inicial.sql (ou que pararam no meio dos ALTERs)
+ganham só as colunas que faltam; bancos novos já as têm pela 0001.
+"""
+
+COLUNAS = [
+    'hino_sacramental',
+    'hino_intermediario',
+    'recepcionistas',
+    'reconhecemos_presenca',
+    'desobrigacoes',
+    'apoios',
+    'confirmacoes_batismo',
+    'apoio_membros',
+    'bencao_criancas',
+    'ultimo_discursante',
+]
+
+
+def aplicar(conn):
+    existentes = {row[1] for row in conn.execute("PRAGMA table_info(sacramental)")}
+    for coluna in COLUNAS:
+        if coluna not in existentes:
+            conn.execute(f"ALTER TABLE sacramental ADD COLUMN {coluna} TEXT")
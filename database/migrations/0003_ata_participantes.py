@@ -0,0 +1,63 @@
+"""Tira discursantes, anúncios, hinos, orações e batizados das colunas JSON.
+
+Cada item vira uma linha de ata_participantes(ata_id, papel, ordem, nome),
+onde ordem é a posição no array original (para hino/oracao: 0 = abertura,
+1 = encerramento). Depois do backfill as colunas JSON são removidas, para
+que nada volte a ler uma cópia desatualizada.
+"""
+import json
+import sqlite3
+
+# coluna JSON -> (tabela, papel)
+COLUNAS_JSON = [
+    ('sacramental', 'discursantes', 'discursante'),
+    ('sacramental', 'anuncios', 'anuncio'),
+    ('sacramental', 'hinos', 'hino'),
+    ('sacramental', 'oracoes', 'oracao'),
+    ('batismo', 'batizados', 'batizado'),
+]
+
+
+def _decodificar(valor):
+    if not valor:
+        return []
+    try:
+        lista = json.loads(valor)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return []
+    return lista if isinstance(lista, list) else [lista]
+
+
+def aplicar(conn):
+    # A chave primária (ata_id, papel, ordem) já atende buscas por (ata_id, papel)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ata_participantes (
+            ata_id INTEGER NOT NULL,
+            papel TEXT NOT NULL,
+            ordem INTEGER NOT NULL,
+            nome TEXT NOT NULL,
+            PRIMARY KEY (ata_id, papel, ordem),
+            FOREIGN KEY(ata_id) REFERENCES atas(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_participantes_nome ON ata_participantes(nome)")
+
+    for tabela, coluna, papel in COLUNAS_JSON:
+        linhas = []
+        for ata_id, valor in conn.execute(f"SELECT ata_id, {coluna} FROM {tabela} WHERE ata_id IS NOT NULL"):
+            for ordem, nome in enumerate(_decodificar(valor)):
+                if isinstance(nome, str) and nome.strip():
+                    linhas.append((ata_id, papel, ordem, nome.strip()))
+        conn.executemany(
+            "INSERT OR REPLACE INTO ata_participantes (ata_id, papel, ordem, nome) VALUES (?, ?, ?, ?)",
+            linhas
+        )
+
+    # DROP COLUMN existe a partir do SQLite 3.35; em versões antigas as colunas
+    # ficam, mas vazias, e o app não as lê mais
+    pode_remover = sqlite3.sqlite_version_info >= (3, 35, 0)
+    for tabela, coluna, _ in COLUNAS_JSON:
+        if pode_remover:
+            conn.execute(f"ALTER TABLE {tabela} DROP COLUMN {coluna}")
+        else:
+            conn.execute(f"UPDATE {tabela} SET {coluna} = NULL")
@@ -0,0 +1,51 @@
+"""Índice incremental de "quem falou por último" por ala.
+
+ata_participantes ganha a coluna chave (nome normalizado: minúsculo, sem
+acentos, espaços colapsados) e ultimas_falas guarda, para cada (ala, chave),
+a ata mais recente em que a pessoa discursou. O app mantém essa tabela a
+cada save/exclusão de ata; `flask --app app reconstruir-discursantes`
+recalcula tudo do zero.
+"""
+import unicodedata
+
+
+def _normalizar(nome):
+    # Mesma regra de models.normalizar_nome, copiada para a migração não mudar se ela mudar
+    sem_acento = ''.join(c for c in unicodedata.normalize('NFKD', nome) if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+
+def aplicar(conn):
+    conn.execute("ALTER TABLE ata_participantes ADD COLUMN chave TEXT")
+    conn.executemany(
+        "UPDATE ata_participantes SET chave = ? WHERE ata_id = ? AND papel = ? AND ordem = ?",
+        [
+            (_normalizar(nome), ata_id, papel, ordem)
+            for ata_id, papel, ordem, nome in conn.execute(
+                "SELECT ata_id, papel, ordem, nome FROM ata_participantes"
+            ).fetchall()
+        ]
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_participantes_chave ON ata_participantes(chave, papel)")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ultimas_falas (
+            ala_id INTEGER NOT NULL,
+            chave TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            data TEXT NOT NULL,
+            ata_id INTEGER NOT NULL,
+            ordem INTEGER NOT NULL,
+            PRIMARY KEY (ala_id, chave)
+        ) WITHOUT ROWID
+    """)
+    # Painel de discursantes recentes: WHERE ala_id = ? AND data >= ? ORDER BY data DESC, ordem LIMIT 20
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ultimas_falas_ala_data ON ultimas_falas(ala_id, data DESC, ordem)")
+    conn.execute("""
+        INSERT OR REPLACE INTO ultimas_falas (ala_id, chave, nome, data, ata_id, ordem)
+        SELECT a.ala_id, p.chave, p.nome, MAX(a.data), a.id, p.ordem
+        FROM ata_participantes p
+        JOIN atas a ON a.id = p.ata_id
+        WHERE p.papel = 'discursante' AND a.tipo = 'sacramental'
+        GROUP BY a.ala_id, p.chave
+    """)
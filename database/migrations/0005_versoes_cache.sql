@@ -0,0 +1,26 @@
+-- Migração 0005: contadores de versão para os caches em memória dos workers.
+-- Cada worker guarda sua cópia da tabela e só consulta o contador (uma linha
+-- pela chave primária) para saber se precisa recarregar. Os triggers garantem
+-- que qualquer escrita, de qualquer worker ou até direto no sqlite3, muda a versão.
+
+CREATE TABLE IF NOT EXISTS versoes_cache (
+    nome TEXT PRIMARY KEY,
+    versao INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO versoes_cache (nome, versao) VALUES ('templates', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_templates_versao_insert AFTER INSERT ON templates
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'templates';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_templates_versao_update AFTER UPDATE ON templates
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'templates';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_templates_versao_delete AFTER DELETE ON templates
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'templates';
+END;
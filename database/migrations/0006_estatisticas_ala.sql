@@ -0,0 +1,47 @@
+-- Migração 0006: contadores de atas por ala, tipo e mês.
+-- O painel de Configurações (e qualquer relatório da estaca) lê daqui em vez
+-- de contar a tabela atas. Os triggers mantêm os contadores em dia em toda
+-- escrita; `flask --app app verificar-estatisticas` confere contra as atas.
+
+CREATE TABLE IF NOT EXISTS estatisticas_ala (
+    ala_id INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    mes TEXT NOT NULL,              -- 'YYYY-MM'
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ala_id, tipo, mes)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_atas_estatisticas_insert AFTER INSERT ON atas
+BEGIN
+    INSERT INTO estatisticas_ala (ala_id, tipo, mes, total)
+    VALUES (NEW.ala_id, NEW.tipo, substr(NEW.data, 1, 7), 1)
+    ON CONFLICT (ala_id, tipo, mes) DO UPDATE SET total = total + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_atas_estatisticas_delete AFTER DELETE ON atas
+BEGIN
+    UPDATE estatisticas_ala SET total = total - 1
+    WHERE ala_id = OLD.ala_id AND tipo = OLD.tipo AND mes = substr(OLD.data, 1, 7);
+    DELETE FROM estatisticas_ala
+    WHERE ala_id = OLD.ala_id AND tipo = OLD.tipo AND mes = substr(OLD.data, 1, 7) AND total <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_atas_estatisticas_update AFTER UPDATE OF ala_id, tipo, data ON atas
+WHEN OLD.ala_id IS NOT NEW.ala_id OR OLD.tipo IS NOT NEW.tipo
+     OR substr(OLD.data, 1, 7) IS NOT substr(NEW.data, 1, 7)
+BEGIN
+    UPDATE estatisticas_ala SET total = total - 1
+    WHERE ala_id = OLD.ala_id AND tipo = OLD.tipo AND mes = substr(OLD.data, 1, 7);
+    DELETE FROM estatisticas_ala
+    WHERE ala_id = OLD.ala_id AND tipo = OLD.tipo AND mes = substr(OLD.data, 1, 7) AND total <= 0;
+    INSERT INTO estatisticas_ala (ala_id, tipo, mes, total)
+    VALUES (NEW.ala_id, NEW.tipo, substr(NEW.data, 1, 7), 1)
+    ON CONFLICT (ala_id, tipo, mes) DO UPDATE SET total = total + 1;
+END;
+
+DELETE FROM estatisticas_ala;
+
+INSERT INTO estatisticas_ala (ala_id, tipo, mes, total)
+SELECT ala_id, tipo, substr(data, 1, 7), COUNT(*)
+FROM atas
+GROUP BY ala_id, tipo, substr(data, 1, 7);
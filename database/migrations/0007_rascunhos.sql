@@ -0,0 +1,14 @@
+-- Migração 0007: rascunhos das atas que ainda não foram criadas.
+-- A edição colaborativa guarda o estado do formulário de uma ata nova aqui
+-- (as atas já existentes são salvas direto em sacramental/batismo), para que
+-- fechar a aba antes de salvar não perca o que foi digitado. O rascunho é
+-- apagado quando a ata é criada.
+
+CREATE TABLE IF NOT EXISTS rascunhos (
+    sala TEXT PRIMARY KEY,          -- nova-<ala>-<tipo>-<data>
+    ala_id INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    data TEXT NOT NULL,
+    campos TEXT NOT NULL,           -- JSON {campo: valor}
+    atualizado_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
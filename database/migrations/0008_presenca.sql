@@ -0,0 +1,14 @@
+-- Migração 0008: quem está editando cada sala, visível para todos os workers.
+-- Antes a contagem ficava num dict do processo (users_editing); com mais de um
+-- worker cada um via só os seus próprios clientes. Cada conexão Socket.IO que
+-- entra numa sala vira uma linha aqui, apagada quando ela sai.
+
+CREATE TABLE IF NOT EXISTS presenca (
+    sid TEXT PRIMARY KEY,           -- sid da conexão Socket.IO
+    sala TEXT NOT NULL,
+    worker TEXT NOT NULL,           -- <host>:<pid> do worker que atende a conexão
+    entrou_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_presenca_sala ON presenca (sala);
+CREATE INDEX IF NOT EXISTS idx_presenca_worker ON presenca (worker);
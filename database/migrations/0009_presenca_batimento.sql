@@ -0,0 +1,8 @@
+-- Migração 0009: batimento da presença.
+-- Cada worker renova visto_em das suas conexões periodicamente; linhas que
+-- param de ser renovadas (worker que morreu ou foi reiniciado) expiram e são
+-- apagadas por qualquer outro worker. Valor em segundos desde a época (time.time()).
+
+ALTER TABLE presenca ADD COLUMN visto_em REAL NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_presenca_visto_em ON presenca (visto_em);
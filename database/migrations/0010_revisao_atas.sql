@@ -0,0 +1,105 @@
+-- Migração 0010: revisão e data de alteração de cada ata, para ETag/304.
+-- Toda escrita na ata ou nos seus detalhes (sacramental, batismo,
+-- ata_participantes) dá à ata uma revisão nova, tirada de um contador único
+-- (versoes_cache 'atas'): revisões nunca se repetem, nem entre atas. Assim o
+-- par (maior revisão, quantidade de atas) identifica o conteúdo de um mês:
+-- editar muda o máximo, excluir muda a quantidade, criar muda os dois.
+-- Triggers, como na 0005: vale para form_ata, autosave, exclusão e qualquer
+-- escrita futura, sem depender de cada rota lembrar de incrementar.
+
+ALTER TABLE atas ADD COLUMN revisao INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE atas ADD COLUMN atualizada_em TEXT;
+
+INSERT OR IGNORE INTO versoes_cache (nome, versao) VALUES ('atas', 0);
+UPDATE atas SET revisao = id, atualizada_em = CURRENT_TIMESTAMP;
+UPDATE versoes_cache SET versao = (SELECT COALESCE(MAX(id), 0) FROM atas) WHERE nome = 'atas';
+
+CREATE TRIGGER IF NOT EXISTS trg_atas_revisao_insert AFTER INSERT ON atas
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.id;
+END;
+
+-- A condição evita que o UPDATE do próprio trigger conte de novo
+CREATE TRIGGER IF NOT EXISTS trg_atas_revisao_update AFTER UPDATE ON atas
+WHEN NEW.revisao = OLD.revisao
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sacramental_revisao_insert AFTER INSERT ON sacramental
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sacramental_revisao_update AFTER UPDATE ON sacramental
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sacramental_revisao_delete AFTER DELETE ON sacramental
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = OLD.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_batismo_revisao_insert AFTER INSERT ON batismo
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_batismo_revisao_update AFTER UPDATE ON batismo
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_batismo_revisao_delete AFTER DELETE ON batismo
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = OLD.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_participantes_revisao_insert AFTER INSERT ON ata_participantes
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_participantes_revisao_update AFTER UPDATE ON ata_participantes
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_participantes_revisao_delete AFTER DELETE ON ata_participantes
+BEGIN
+    UPDATE versoes_cache SET versao = versao + 1 WHERE nome = 'atas';
+    UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas'),
+                    atualizada_em = CURRENT_TIMESTAMP
+    WHERE id = OLD.ata_id;
+END;
@@ -0,0 +1,9 @@
+-- Migração 0011: índice da listagem paginada de /atas.
+-- A paginação por chave ordena por (data DESC, id DESC). Em
+-- idx_atas_ala_data (ala_id, data DESC) o rowid fica em ordem crescente dentro
+-- de cada data, e o SQLite precisava de um B-tree temporário para desempatar.
+-- Percorrido de trás para frente, (ala_id, data, id) dá a ordem exata, e
+-- continua servindo os filtros por mês; o índice antigo fica redundante.
+
+CREATE INDEX IF NOT EXISTS idx_atas_ala_data_id ON atas (ala_id, data, id);
+DROP INDEX IF EXISTS idx_atas_ala_data;
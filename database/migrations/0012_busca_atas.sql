@@ -0,0 +1,125 @@
+-- Migração 0012: busca de texto completo nas atas (FTS5).
+-- Um documento por ata (rowid = atas.id) com o texto que vale a pena buscar:
+-- tema, discursantes, anúncios, batizados, testemunhas, os campos livres das
+-- ações (desobrigações, apoios, confirmações...) e as demais pessoas citadas.
+-- O documento é montado pela view busca_atas_documentos, juntando atas,
+-- sacramental, batismo e ata_participantes. Qualquer escrita numa dessas
+-- tabelas refaz o documento da ata pelos triggers abaixo.
+-- remove_diacritics: "dizimo" encontra "dízimo".
+-- A ala entra no próprio índice, como o termo "ala<id>" na coluna ala: a
+-- busca é sempre "ala:ala7 AND (...)", e o FTS5 só ordena as atas da ala,
+-- em vez de ranquear as de todas as alas e filtrar depois.
+
+CREATE VIEW IF NOT EXISTS busca_atas_documentos AS
+SELECT
+    a.id AS ata_id,
+    s.tema AS tema,
+    COALESCE((SELECT group_concat(p.nome, ', ') FROM ata_participantes p
+              WHERE p.ata_id = a.id AND p.papel = 'discursante'), '')
+        || COALESCE(', ' || NULLIF(s.ultimo_discursante, ''), '') AS discursantes,
+    (SELECT group_concat(p.nome, ' / ') FROM ata_participantes p
+     WHERE p.ata_id = a.id AND p.papel = 'anuncio') AS anuncios,
+    (SELECT group_concat(p.nome, ', ') FROM ata_participantes p
+     WHERE p.ata_id = a.id AND p.papel = 'batizado') AS batizados,
+    COALESCE(b.testemunha1, '') || COALESCE(', ' || NULLIF(b.testemunha2, ''), '') AS testemunhas,
+    COALESCE(s.reconhecemos_presenca, '') || ' / ' || COALESCE(s.desobrigacoes, '') || ' / '
+        || COALESCE(s.apoios, '') || ' / ' || COALESCE(s.confirmacoes_batismo, '') || ' / '
+        || COALESCE(s.apoio_membros, '') || ' / ' || COALESCE(s.bencao_criancas, '') AS acoes,
+    COALESCE(s.presidido, b.presidido, '') || ', ' || COALESCE(s.dirigido, b.dirigido, '') || ', '
+        || COALESCE(s.pianista, '') || ', ' || COALESCE(s.regente_musica, '') || ', '
+        || COALESCE(s.recepcionistas, '') || ', ' || COALESCE(b.dedicado, '') || ', '
+        || COALESCE((SELECT group_concat(p.nome, ', ') FROM ata_participantes p
+                     WHERE p.ata_id = a.id AND p.papel = 'oracao'), '') AS pessoas,
+    'ala' || a.ala_id AS ala
+FROM atas a
+LEFT JOIN sacramental s ON s.ata_id = a.id
+LEFT JOIN batismo b ON b.ata_id = a.id
+GROUP BY a.id;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS busca_atas USING fts5(
+    tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Ordem de relevância (ORDER BY rank): pesos por coluna, na ordem acima
+INSERT INTO busca_atas (busca_atas, rank) VALUES ('rank', 'bm25(10.0, 6.0, 2.0, 6.0, 4.0, 1.0, 3.0, 0.0)');
+
+INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+SELECT * FROM busca_atas_documentos;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_sacramental_insert AFTER INSERT ON sacramental
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = NEW.ata_id;
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_sacramental_update AFTER UPDATE ON sacramental
+BEGIN
+    DELETE FROM busca_atas WHERE rowid IN (OLD.ata_id, NEW.ata_id);
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id IN (OLD.ata_id, NEW.ata_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_sacramental_delete AFTER DELETE ON sacramental
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = OLD.ata_id;
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id = OLD.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_batismo_insert AFTER INSERT ON batismo
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = NEW.ata_id;
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_batismo_update AFTER UPDATE ON batismo
+BEGIN
+    DELETE FROM busca_atas WHERE rowid IN (OLD.ata_id, NEW.ata_id);
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id IN (OLD.ata_id, NEW.ata_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_batismo_delete AFTER DELETE ON batismo
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = OLD.ata_id;
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id = OLD.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_participantes_insert AFTER INSERT ON ata_participantes
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = NEW.ata_id;
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id = NEW.ata_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_participantes_update AFTER UPDATE ON ata_participantes
+BEGIN
+    DELETE FROM busca_atas WHERE rowid IN (OLD.ata_id, NEW.ata_id);
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id IN (OLD.ata_id, NEW.ata_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_participantes_delete AFTER DELETE ON ata_participantes
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = OLD.ata_id;
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id = OLD.ata_id;
+END;
+
+-- Ata excluída sai da busca; ata que mudou de ala muda de escopo
+CREATE TRIGGER IF NOT EXISTS trg_busca_atas_delete AFTER DELETE ON atas
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_busca_atas_update AFTER UPDATE OF ala_id ON atas
+BEGIN
+    DELETE FROM busca_atas WHERE rowid = NEW.id;
+    INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+    SELECT * FROM busca_atas_documentos WHERE ata_id = NEW.id;
+END;
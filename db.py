@@ -0,0 +1,210 @@
+import os
+import sqlite3
+import threading
+import time
+from flask import g, current_app
+
+# PRAGMAs aplicados em toda conexão nova do pool.
+# WAL permite que leitores não bloqueiem o escritor (e vice-versa), o que
+# importa nos domingos de manhã, quando várias pessoas editam ao mesmo tempo.
+PRAGMAS_PADRAO = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',     # seguro com WAL e bem mais rápido que FULL
+    'cache_size': -16000,        # negativo = KiB (~16 MB por conexão)
+    'mmap_size': 134217728,      # 128 MB de leitura via mmap
+    'busy_timeout': 5000,        # ms esperando o lock do escritor antes de falhar
+    'temp_store': 'MEMORY',
+}
+
+
+# Intervalo entre tentativas quando a espera é cooperativa (dormir)
+INTERVALO_ESPERA = 0.005
+
+
+class PoolEsgotado(sqlite3.OperationalError):
+    """Nenhuma conexão ficou livre dentro do tempo limite do pool"""
+
+
+class ConnectionPool:
+    """Pool de conexões SQLite de um processo (um por worker)"""
+
+    def __init__(self, path, size=5, pragmas=None, cached_statements=256, timeout=10.0, dormir=None):
+        self.path = path
+        self.size = size
+        self.pragmas = dict(PRAGMAS_PADRAO if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        # Espera cooperativa (socketio.sleep no modo eventlet); None = Condition.wait
+        self.dormir = dormir
+        self.pid = os.getpid()
+
+        self._lock = threading.Condition()
+        self._ociosas = []
+        self._criadas = 0
+        self._em_uso = 0
+
+        # Contadores expostos em stats()
+        self._checkouts = 0
+        self._reusos = 0
+        self._esperas = 0
+        self._tempo_espera = 0.0
+        self._timeouts = 0
+
+    def _conectar(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.pragmas.get('busy_timeout', 5000) / 1000,
+            check_same_thread=False,  # a conexão troca de thread/greenlet entre requisições
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        for nome, valor in self.pragmas.items():
+            conn.execute(f"PRAGMA {nome} = {valor}")
+        return conn
+
+    def acquire(self):
+        """Retira uma conexão do pool, criando uma nova se ainda houver espaço"""
+        inicio = time.monotonic()
+        esperou = False
+        while True:
+            with self._lock:
+                if self._ociosas or self._criadas < self.size:
+                    if esperou:
+                        self._esperas += 1
+                        self._tempo_espera += time.monotonic() - inicio
+
+                    if self._ociosas:
+                        conn = self._ociosas.pop()
+                        self._reusos += 1
+                    else:
+                        # Reserva a vaga antes de conectar para não estourar o tamanho
+                        self._criadas += 1
+                        conn = None
+                    self._em_uso += 1
+                    self._checkouts += 1
+                    break
+
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._timeouts += 1
+                    raise PoolEsgotado(
+                        f"Nenhuma conexão livre após {self.timeout}s (pool de {self.size})"
+                    )
+                esperou = True
+                if self.dormir is None:
+                    self._lock.wait(restante)
+                    continue
+            # Com eventlet sem monkey patch, esperar no Condition travaria o hub
+            # inteiro, inclusive as requisições que iam devolver a conexão
+            self.dormir(min(INTERVALO_ESPERA, restante))
+
+        if conn is None:
+            try:
+                conn = self._conectar()
+            except Exception:
+                with self._lock:
+                    self._criadas -= 1
+                    self._em_uso -= 1
+                    self._lock.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        """Devolve a conexão ao pool, desfazendo qualquer transação esquecida aberta"""
+        descartar = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            descartar = True
+
+        with self._lock:
+            self._em_uso -= 1
+            if descartar:
+                self._criadas -= 1
+            else:
+                self._ociosas.append(conn)
+            self._lock.notify()
+
+        if descartar:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def close_all(self):
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, []
+            self._criadas -= len(ociosas)
+        for conn in ociosas:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'path': self.path,
+                'size': self.size,
+                'criadas': self._criadas,
+                'em_uso': self._em_uso,
+                'ociosas': len(self._ociosas),
+                'checkouts': self._checkouts,
+                'reusos': self._reusos,
+                'esperas': self._esperas,
+                'tempo_espera_total_ms': round(self._tempo_espera * 1000, 2),
+                'timeouts': self._timeouts,
+                'cached_statements': self.cached_statements,
+                'pragmas': dict(self.pragmas),
+            }
+
+
+def _ler_pragmas_env(pragmas):
+    """Permite sobrescrever PRAGMAs por variável de ambiente (ex.: DB_PRAGMA_SYNCHRONOUS=FULL)"""
+    resultado = dict(pragmas)
+    for nome in list(resultado):
+        valor = os.environ.get(f"DB_PRAGMA_{nome.upper()}")
+        if valor is not None:
+            resultado[nome] = valor
+    return resultado
+
+
+def init_app(app, dormir=None):
+    """Registra configuração padrão do banco e a devolução da conexão ao fim do contexto.
+    dormir deve ceder a vez ao hub quando o servidor é eventlet (socketio.sleep)"""
+    app.config.setdefault('DB_PATH', os.environ.get('DB_PATH', 'database/atas.db'))
+    app.config.setdefault('DB_POOL_SIZE', int(os.environ.get('DB_POOL_SIZE', 5)))
+    app.config.setdefault('DB_POOL_TIMEOUT', float(os.environ.get('DB_POOL_TIMEOUT', 10)))
+    app.config.setdefault('DB_STATEMENT_CACHE', int(os.environ.get('DB_STATEMENT_CACHE', 256)))
+    app.config.setdefault('DB_PRAGMAS', _ler_pragmas_env(PRAGMAS_PADRAO))
+    app.extensions['db_pool_dormir'] = dormir
+    app.teardown_appcontext(_devolver_conexao)
+
+
+def get_pool(app=None):
+    """Pool do processo atual; recriado após fork (gunicorn com --preload)"""
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get('db_pool')
+    if pool is None or pool.pid != os.getpid():
+        pool = ConnectionPool(
+            app.config['DB_PATH'],
+            size=app.config['DB_POOL_SIZE'],
+            pragmas=app.config['DB_PRAGMAS'],
+            cached_statements=app.config['DB_STATEMENT_CACHE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+            dormir=app.extensions.get('db_pool_dormir'),
+        )
+        app.extensions['db_pool'] = pool
+    return pool
+
+
+def get_db():
+    """Conexão do contexto atual; a mesma durante toda a requisição/evento"""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def _devolver_conexao(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
@@ -0,0 +1,137 @@
+# Operações de texto para a edição colaborativa dos campos longos.
+#
+# Uma operação percorre o texto inteiro, da esquerda para a direita, como uma
+# lista de componentes (o mesmo formato do ot.js):
+#   n > 0   mantém os próximos n caracteres
+#   n < 0   apaga os próximos -n caracteres
+#   'abc'   insere o texto
+# Ex.: em "Hino 12", [5, '85', -2] troca "12" por "85".
+#
+# Posições e tamanhos contam unidades UTF-16, como o JavaScript (um emoji vale
+# 2), para que navegador e servidor concordem sobre a mesma operação.
+
+
+def tamanho(texto):
+    """Tamanho em unidades UTF-16"""
+    return len(texto.encode('utf-16-le', 'surrogatepass')) // 2
+
+
+def _acrescentar(ops, componente):
+    if componente == 0 or componente == '':
+        return
+    if ops:
+        ultimo = ops[-1]
+        if isinstance(componente, str):
+            if isinstance(ultimo, str):
+                ops[-1] = ultimo + componente
+                return
+            if ultimo < 0:
+                # Inserção sempre antes da remoção na mesma posição (forma canônica)
+                if len(ops) > 1 and isinstance(ops[-2], str):
+                    ops[-2] += componente
+                else:
+                    ops.insert(len(ops) - 1, componente)
+                return
+        elif not isinstance(ultimo, str) and (ultimo > 0) == (componente > 0):
+            ops[-1] = ultimo + componente
+            return
+    ops.append(componente)
+
+
+def validar(op):
+    """Levanta ValueError se op não for uma lista de componentes válidos"""
+    if not isinstance(op, list):
+        raise ValueError("operação deve ser uma lista")
+    for componente in op:
+        if isinstance(componente, bool) or not isinstance(componente, (int, str)) or componente in (0, ''):
+            raise ValueError(f"componente inválido: {componente!r}")
+
+
+def aplicar(texto, op):
+    """Aplica op ao texto; ValueError se op não cobrir exatamente o texto"""
+    validar(op)
+    unidades = texto.encode('utf-16-le', 'surrogatepass')
+    partes = []
+    posicao = 0
+    for componente in op:
+        if isinstance(componente, str):
+            partes.append(componente.encode('utf-16-le', 'surrogatepass'))
+            continue
+        fim = posicao + abs(componente) * 2
+        if fim > len(unidades):
+            raise ValueError("operação maior que o texto")
+        if componente > 0:
+            partes.append(unidades[posicao:fim])
+        posicao = fim
+    if posicao != len(unidades):
+        raise ValueError("operação não cobre o texto inteiro")
+    return b''.join(partes).decode('utf-16-le', 'surrogatepass')
+
+
+def transformar(a, b):
+    """(a', b') para duas operações sobre o mesmo texto, tal que
+    aplicar(aplicar(t, a), b') == aplicar(aplicar(t, b), a').
+    Inserções na mesma posição: a fica antes de b."""
+    a_linha, b_linha = [], []
+    ia, ib = iter(a), iter(b)
+    x, y = next(ia, None), next(ib, None)
+    while x is not None or y is not None:
+        if isinstance(x, str):
+            _acrescentar(a_linha, x)
+            _acrescentar(b_linha, tamanho(x))
+            x = next(ia, None)
+            continue
+        if isinstance(y, str):
+            _acrescentar(a_linha, tamanho(y))
+            _acrescentar(b_linha, y)
+            y = next(ib, None)
+            continue
+        if x is None or y is None:
+            raise ValueError("operações sobre textos de tamanhos diferentes")
+
+        passo = min(abs(x), abs(y))
+        if x > 0 and y > 0:
+            _acrescentar(a_linha, passo)
+            _acrescentar(b_linha, passo)
+        elif x < 0 and y > 0:
+            _acrescentar(a_linha, -passo)
+        elif x > 0 and y < 0:
+            _acrescentar(b_linha, -passo)
+        # x < 0 e y < 0: os dois apagaram o mesmo trecho, nada a fazer
+
+        x = _restante(x, passo) or next(ia, None)
+        y = _restante(y, passo) or next(ib, None)
+    return a_linha, b_linha
+
+
+def _restante(componente, passo):
+    if componente > 0:
+        return componente - passo
+    return componente + passo
+
+
+def diferenca(antes, depois):
+    """Operação que leva antes a depois (um único trecho trocado, prefixo e sufixo comuns mantidos)"""
+    a = antes.encode('utf-16-le', 'surrogatepass')
+    b = depois.encode('utf-16-le', 'surrogatepass')
+    n_a, n_b = len(a) // 2, len(b) // 2
+
+    inicio = 0
+    while inicio < min(n_a, n_b) and a[inicio * 2:inicio * 2 + 2] == b[inicio * 2:inicio * 2 + 2]:
+        inicio += 1
+    fim = 0
+    while (fim < min(n_a, n_b) - inicio
+           and a[(n_a - fim - 1) * 2:(n_a - fim) * 2] == b[(n_b - fim - 1) * 2:(n_b - fim) * 2]):
+        fim += 1
+    # Não corta um par substituto (emoji) ao meio
+    if inicio and 0xD800 <= int.from_bytes(a[inicio * 2 - 2:inicio * 2], 'little') <= 0xDBFF:
+        inicio -= 1
+    if fim and 0xDC00 <= int.from_bytes(a[(n_a - fim) * 2:(n_a - fim) * 2 + 2], 'little') <= 0xDFFF:
+        fim -= 1
+
+    ops = []
+    _acrescentar(ops, inicio)
+    _acrescentar(ops, b[inicio * 2:(n_b - fim) * 2].decode('utf-16-le', 'surrogatepass'))
+    _acrescentar(ops, -(n_a - inicio - fim))
+    _acrescentar(ops, fim)
+    return ops
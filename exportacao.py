@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+import re
+import zipfile
+from xml.sax.saxutils import escape
+import models as dbHandler
+
+# Exportação tabular do histórico de atas da ala (CSV ou XLSX), em streaming.
+#
+# As atas saem do cursor do SQLite em blocos de BLOCO (fetchmany), cada bloco
+# com os detalhes de models.detalhes_das_atas, e vão para o cliente assim que
+# são escritas: na memória fica um bloco por vez, tenha a ala um ano ou dez.
+# Uma linha por ata, com os detalhes achatados nas colunas de COLUNAS: os
+# mesmos nomes que a importação (importacao.py) aceita, então o CSV exportado
+# pode ser importado de volta. Listas viram um array JSON na célula
+# (["Anúncio; com ponto e vírgula", "Outro"]): um separador solto se
+# confundiria com o texto dos itens.
+#
+# O XLSX é escrito à mão, sem biblioteca: é um ZIP com alguns XML fixos e a
+# planilha, que vai sendo comprimida linha a linha, com os textos dentro de
+# cada célula (inlineStr) em vez da tabela de textos compartilhados que
+# obrigaria a guardar todos até o fim (o mesmo que o modo constant_memory do
+# xlsxwriter faz).
+
+FORMATOS = ('csv', 'xlsx')
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+BLOCO = 500
+
+# Campos dos dois tipos, na ordem do formulário, sem repetir os comuns
+CAMPOS = tuple(dict.fromkeys(
+    campo
+    for tipo in ('sacramental', 'batismo')
+    for campo in (
+        *dbHandler.COLUNAS_AUTOSAVE[tipo],
+        *dbHandler.TEXTOS_PARTICIPANTES[tipo],
+        *dbHandler.LISTAS_PARTICIPANTES[tipo],
+    )
+))
+COLUNAS = ('id', 'tipo', 'data', 'status') + CAMPOS
+
+# Sem período: o histórico inteiro (ainda pelo índice de (ala_id, data))
+PERIODO_COMPLETO = ('0001-01-01', '9999-12-31')
+
+
+class SaidaZip:
+    """Destino sem seek para o zipfile: guarda os bytes até o próximo yield"""
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b"".join(self.partes)
+        self.partes = []
+        return dados
+
+
+def blocos_de_linhas(ala_id, inicio=None, fim=None, tamanho_bloco=BLOCO):
+    """Listas de valores na ordem de COLUNAS, em blocos, da ata mais antiga para a mais recente"""
+    if inicio is None:
+        inicio, fim = PERIODO_COMPLETO
+    cursor = dbHandler.atas_do_periodo(ala_id, inicio, fim)
+    while True:
+        atas = cursor.fetchmany(tamanho_bloco)
+        if not atas:
+            return
+        detalhes = dbHandler.detalhes_das_atas(atas)
+        yield [_achatar(ata, detalhes[ata['id']]) for ata in atas]
+
+
+def _achatar(ata, detalhes):
+    valores = [ata['id'], ata['tipo'], ata['data'], ata['status']]
+    for campo in CAMPOS:
+        valor = detalhes.get(campo)
+        valores.append(json.dumps(valor, ensure_ascii=False) if isinstance(valor, list) else valor or '')
+    return valores
+
+
+def gerar(formato, blocos):
+    """bytes do arquivo no formato pedido, um pedaço por bloco de atas"""
+    return gerar_xlsx(blocos) if formato == 'xlsx' else gerar_csv(blocos)
+
+
+def gerar_csv(blocos):
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    # BOM: sem ele o Excel abre o UTF-8 como Latin-1
+    saida.write('\ufeff')
+    escritor.writerow(COLUNAS)
+    for linhas in blocos:
+        escritor.writerows(linhas)
+        yield saida.getvalue().encode('utf-8')
+        saida.seek(0)
+        saida.truncate()
+    yield saida.getvalue().encode('utf-8')
+
+
+# ------------------------------------------------------------------
+# XLSX
+# ------------------------------------------------------------------
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_PARTES_XLSX = {
+    '[Content_Types].xml': _XML + (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': _XML + (
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Atas" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Estilo 1 = negrito (cabeçalho)
+    'xl/styles.xml': _XML + (
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+# Cabeçalho congelado no topo
+_INICIO_PLANILHA = _XML + (
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews><sheetData>'
+)
+_FIM_PLANILHA = '</sheetData></worksheet>'
+
+# Caracteres de controle não são permitidos em XML 1.0
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_MAX_TEXTO_CELULA = 32767
+_LETRAS = [chr(ord('A') + i) if i < 26 else 'A' + chr(ord('A') + i - 26) for i in range(len(COLUNAS))]
+
+
+def _linha_xml(numero, valores, estilo=0):
+    celulas = []
+    atributo_estilo = f' s="{estilo}"' if estilo else ''
+    for letra, valor in zip(_LETRAS, valores):
+        if valor == '' or valor is None:
+            continue
+        referencia = f'{letra}{numero}'
+        if isinstance(valor, int):
+            celulas.append(f'<c r="{referencia}"{atributo_estilo}><v>{valor}</v></c>')
+        else:
+            texto = escape(_INVALIDOS_XML.sub('', str(valor))[:_MAX_TEXTO_CELULA])
+            celulas.append(
+                f'<c r="{referencia}"{atributo_estilo} t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+            )
+    return f'<row r="{numero}">{"".join(celulas)}</row>'
+
+
+def gerar_xlsx(blocos):
+    saida = SaidaZip()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo:
+        for nome, conteudo in _PARTES_XLSX.items():
+            arquivo.writestr(nome, conteudo)
+        # Tamanho final desconhecido: zip64 desde o início
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write((_INICIO_PLANILHA + _linha_xml(1, COLUNAS, estilo=1)).encode('utf-8'))
+            numero = 1
+            for linhas in blocos:
+                partes = []
+                for valores in linhas:
+                    numero += 1
+                    partes.append(_linha_xml(numero, valores))
+                planilha.write(''.join(partes).encode('utf-8'))
+                yield saida.esvaziar()
+            planilha.write(_FIM_PLANILHA.encode('utf-8'))
+    yield saida.esvaziar()
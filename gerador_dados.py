@@ -0,0 +1,262 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+# Gerador determinístico de dados de volume: alas (users + unidades) e anos de
+# atas sacramentais e de batismo com conteúdo plausível em português.
+#
+# Cada ala tem seus membros, bispado, pianista e regente; os discursantes e as
+# orações saem desses membros, então os nomes se repetem como numa ala de
+# verdade (o que importa para ultimas_falas e para a busca). O primeiro
+# domingo do mês é reunião de jejum e testemunhos, sem discursantes. Batismos
+# caem em alguns sábados. Mesma --semente, mesmos parâmetros: mesmo banco,
+# byte a byte nos dados (a data final é fixa, --ate, para não depender de hoje).
+#
+# As atas são gravadas por importacao.importar, o mesmo caminho de
+# `flask --app app importar-atas`: revisão, estatisticas_ala, índice de busca
+# e ultimas_falas ficam coerentes, como se as atas tivessem vindo pelo app.
+# Alguns milhões de linhas (1.000 alas x 10 anos = ~620 mil atas, ~6 milhões
+# de linhas contando os participantes) levam uns 4 minutos.
+#
+#   python gerador_dados.py --banco /tmp/volume.db
+#   python gerador_dados.py --banco /tmp/volume.db --alas 1000 --anos 10
+#   python verificar_planos.py --banco /tmp/volume.db
+#
+# Usuários gerados: <prefixo><n> com a mesma senha (ala1/ala1, ala2/ala2...).
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+NOMES_MASCULINOS = (
+    'João', 'Pedro', 'Lucas', 'Mateus', 'Gabriel', 'Rafael', 'Felipe', 'Gustavo', 'Bruno', 'Daniel',
+    'Eduardo', 'Henrique', 'André', 'Thiago', 'Rodrigo', 'Marcelo', 'Carlos', 'Paulo', 'Ricardo', 'Samuel',
+    'Davi', 'Vinícius', 'Leonardo', 'Otávio', 'Fernando', 'Antônio', 'José', 'Sérgio', 'Renato', 'Caio',
+)
+NOMES_FEMININOS = (
+    'Ana', 'Maria', 'Juliana', 'Camila', 'Fernanda', 'Patrícia', 'Aline', 'Gabriela', 'Larissa', 'Mariana',
+    'Beatriz', 'Letícia', 'Natália', 'Isabela', 'Vitória', 'Sabrina', 'Cláudia', 'Débora', 'Raquel', 'Sara',
+    'Rebeca', 'Priscila', 'Helena', 'Lúcia', 'Tatiane', 'Vanessa', 'Eliane', 'Rosângela', 'Jéssica', 'Luíza',
+)
+SOBRENOMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Pereira', 'Costa', 'Rodrigues', 'Almeida', 'Nascimento', 'Lima',
+    'Araújo', 'Fernandes', 'Carvalho', 'Gomes', 'Martins', 'Rocha', 'Ribeiro', 'Alves', 'Monteiro', 'Mendes',
+    'Barbosa', 'Freitas', 'Cardoso', 'Teixeira', 'Correia', 'Dias', 'Machado', 'Vieira', 'Moreira', 'Nunes',
+    'Zanette', 'Bortolotto', 'De Luca', 'Colombo', 'Pacheco', 'Medeiros', 'Cechinel', 'Búrigo', 'Damiani', 'Rosso',
+)
+CIDADES = (
+    'Criciúma', 'Araranguá', 'Içara', 'Tubarão', 'Laguna', 'Urussanga', 'Forquilhinha', 'Sombrio',
+    'Florianópolis', 'Joinville', 'Blumenau', 'Lages', 'Chapecó', 'Itajaí', 'Palhoça', 'São José',
+)
+HINOS = (
+    '1 - A Alva Rompe', '2 - Alva Luz', '5 - Ó Deus de Israel', '19 - Somos Gratos, Ó Deus, Pelo Profeta',
+    '26 - Jesus Quer Ser Nosso Guia', '30 - Vinde, Ó Santos', '41 - Oração pelo Profeta',
+    '55 - Tende Bom Ânimo', '62 - Vinde, Ó Filhos do Senhor', '72 - Louvai a Deus, Nosso Rei',
+    '85 - Que Firme Alicerce', '86 - Como Grande És Tu', '98 - Mais Perto Quero Estar',
+    '116 - Vinde a Cristo', '123 - Oh! Meu Pai', '131 - Mais Santidade Dá-me',
+    '134 - Eu Preciso de Ti', '140 - Acaso Fiz Alguém Feliz?', '152 - Deus Vos Guarde',
+    '160 - Senhor, Meu Deus', '169 - Enquanto Aqui Reunidos', '173 - Ao Partirmos Este Pão',
+    '175 - Ó Deus, Senhor Eterno', '181 - Que Manso Amor', '193 - Eu Sei Que Vive Meu Senhor',
+    '196 - Jesus, Em Tua Cruz', '200 - Cristo É Ressurreto', '207 - Noite Feliz',
+)
+HINOS_SACRAMENTAIS = (
+    '169 - Enquanto Aqui Reunidos', '173 - Ao Partirmos Este Pão', '181 - Que Manso Amor', '196 - Jesus, Em Tua Cruz',
+)
+TEMAS = (
+    'Fé no Senhor Jesus Cristo', 'Arrependimento', 'O convênio do batismo', 'O dom do Espírito Santo',
+    'A lei do dízimo', 'O jejum e a oferta de jejum', 'Oração pessoal e familiar', 'Estudo das escrituras',
+    'O sacramento', 'A Expiação de Jesus Cristo', 'Família eterna', 'Obra missionária',
+    'Templo e história da família', 'Ministração', 'Gratidão', 'A Palavra de Sabedoria',
+    'Perdão', 'Esperança', 'Caridade, o puro amor de Cristo', 'O Livro de Mórmon',
+    'Profetas vivos', 'Autossuficiência', 'Santificar o Dia do Senhor', 'Discipulado',
+)
+ATIVIDADES = (
+    'Noite familiar da ala', 'Atividade da Primária', 'Reunião dos Rapazes', 'Atividade das Moças',
+    'Noite do Templo', 'Mutirão de limpeza da capela', 'Jantar da ala', 'Aula de preparação missionária',
+    'Conferência de estaca', 'Baile da juventude', 'Feira de história da família', 'Reunião da Sociedade de Socorro',
+)
+DIAS_SEMANA = ('segunda-feira', 'terça-feira', 'quarta-feira', 'quinta-feira', 'sexta-feira', 'sábado')
+CHAMADOS = (
+    'presidente da Primária', 'conselheira da Sociedade de Socorro', 'secretário da ala',
+    'professor da Escola Dominical', 'consultora das Moças', 'líder missionário da ala',
+    'especialista de história da família', 'presidente do quórum de élderes',
+)
+
+
+def _nome(sorteio, feminino=None):
+    if feminino is None:
+        feminino = sorteio.random() < 0.5
+    primeiro = sorteio.choice(NOMES_FEMININOS if feminino else NOMES_MASCULINOS)
+    return f"{primeiro} {sorteio.choice(SOBRENOMES)} {sorteio.choice(SOBRENOMES)}", feminino
+
+
+class Membro:
+    __slots__ = ('nome', 'feminino')
+
+    def __init__(self, sorteio, feminino=None):
+        self.nome, self.feminino = _nome(sorteio, feminino)
+
+    @property
+    def tratamento(self):
+        return f"{'Irmã' if self.feminino else 'Irmão'} {self.nome}"
+
+
+class GeradorAla:
+    """Atas de uma ala, sempre as mesmas para o mesmo sorteio"""
+
+    def __init__(self, sorteio, membros=150):
+        self.sorteio = sorteio
+        self.cidade = sorteio.choice(CIDADES)
+        self.membros = [Membro(sorteio) for _ in range(membros)]
+        self.homens = [m for m in self.membros if not m.feminino] or self.membros
+        self.novo_bispado()
+
+    def novo_bispado(self):
+        """Bispo, conselheiros e os chamados da reunião (trocam a cada poucos anos)"""
+        sorteio = self.sorteio
+        self.bispo, self.conselheiro1, self.conselheiro2 = sorteio.sample(self.homens, 3)
+        self.pianista, self.regente = sorteio.sample(self.membros, 2)
+        self.recepcionistas = sorteio.sample(self.homens, 2)
+
+    def _membro(self):
+        return self.sorteio.choice(self.membros).tratamento
+
+    def _anuncio(self):
+        sorteio = self.sorteio
+        return (f"{sorteio.choice(ATIVIDADES)} na {sorteio.choice(DIAS_SEMANA)} "
+                f"às {sorteio.choice((9, 10, 14, 15, 19, 20))}h")
+
+    def _acao(self, probabilidade, modelo):
+        if self.sorteio.random() >= probabilidade:
+            return ''
+        return modelo.format(membro=self._membro(), chamado=self.sorteio.choice(CHAMADOS))
+
+    def sacramental(self, dia):
+        sorteio = self.sorteio
+        dirigente = sorteio.choice((self.bispo, self.conselheiro1, self.conselheiro2))
+        testemunhos = dia.day <= 7
+        discursantes = [] if testemunhos else [self._membro() for _ in range(sorteio.choice((2, 3, 3, 4)))]
+        return {
+            'tipo': 'sacramental',
+            'data': dia.isoformat(),
+            'presidido': f"Bispo {self.bispo.nome}",
+            'dirigido': dirigente.tratamento if dirigente is not self.bispo else f"Bispo {self.bispo.nome}",
+            'recepcionistas': ' e '.join(m.tratamento for m in self.recepcionistas),
+            'tema': 'Reunião de jejum e testemunhos' if testemunhos else sorteio.choice(TEMAS),
+            'pianista': self.pianista.tratamento,
+            'regente_musica': self.regente.tratamento,
+            'reconhecemos_presenca': "Presidente da estaca" if sorteio.random() < 0.1 else '',
+            'anuncios': [self._anuncio() for _ in range(sorteio.randint(0, 4))],
+            'hino_abertura': sorteio.choice(HINOS),
+            'oracao_abertura': self._membro(),
+            'desobrigacoes': self._acao(0.15, "{membro}, {chamado}"),
+            'apoios': self._acao(0.2, "{membro}, {chamado}"),
+            'confirmacoes_batismo': self._acao(0.05, "{membro}"),
+            'apoio_membros': self._acao(0.05, "{membro}, vindo de outra ala"),
+            'bencao_criancas': self._acao(0.03, "{membro}"),
+            'hino_sacramental': sorteio.choice(HINOS_SACRAMENTAIS),
+            'hino_intermediario': '' if testemunhos else sorteio.choice(HINOS),
+            'discursantes': discursantes,
+            'ultimo_discursante': '' if testemunhos else self._membro(),
+            'hino_encerramento': sorteio.choice(HINOS),
+            'oracao_encerramento': self._membro(),
+        }
+
+    def batismo(self, dia):
+        sorteio = self.sorteio
+        batizados = [_nome(sorteio)[0] for _ in range(sorteio.choice((1, 1, 1, 2, 3)))]
+        testemunha1, testemunha2 = sorteio.sample(self.homens, 2)
+        return {
+            'tipo': 'batismo',
+            'data': dia.isoformat(),
+            'presidido': f"Bispo {self.bispo.nome}",
+            'dirigido': sorteio.choice((self.conselheiro1, self.conselheiro2)).tratamento,
+            'dedicado': self._membro(),
+            'testemunha1': testemunha1.tratamento,
+            'testemunha2': testemunha2.tratamento,
+            'batizados': batizados,
+        }
+
+    def atas(self, inicio, fim, batismos_por_ano=10):
+        """Atas de inicio a fim (inclusive): todo domingo e alguns sábados, em ordem de data"""
+        dia = inicio + timedelta(days=(6 - inicio.weekday()) % 7)
+        probabilidade_batismo = batismos_por_ano / 52
+        semanas = 0
+        while dia <= fim:
+            if self.sorteio.random() < probabilidade_batismo:
+                yield self.batismo(dia - timedelta(days=1))
+            yield self.sacramental(dia)
+            semanas += 1
+            if semanas % 156 == 0:
+                self.novo_bispado()
+            dia += timedelta(days=7)
+
+
+def gerar(alas, anos, semente, fim, prefixo='ala', tamanho_lote=1000):
+    """Grava as alas <prefixo>1..N com suas unidades e atas no banco do app; devolve o total de atas.
+    Precisa de um contexto da aplicação (app.app_context())."""
+    import importacao
+    from db import get_db
+
+    conn = get_db()
+    inicio = fim - timedelta(days=round(365.25 * anos))
+    total = 0
+    for numero in range(1, alas + 1):
+        # Uma semente por ala: a ala N é a mesma com --alas 3 ou --alas 300
+        ala = GeradorAla(random.Random(semente * 1_000_003 + numero))
+        usuario = f"{prefixo}{numero}"
+        ala_id = conn.execute(
+            "INSERT INTO users (username, password) VALUES (?, ?)", (usuario, usuario)
+        ).lastrowid
+        conn.execute(
+            "INSERT INTO unidades (ala_id, nome, bispo, conselheiros, estaca, horario) VALUES (?, ?, ?, ?, ?, ?)",
+            (ala_id, f"Ala {ala.cidade} {numero}", ala.bispo.nome,
+             f"{ala.conselheiro1.nome}, {ala.conselheiro2.nome}", ala.cidade,
+             ala.sorteio.choice(('08:00', '09:00', '10:30', '13:00')))
+        )
+        conn.commit()
+        relatorio = importacao.importar(ala_id, enumerate(ala.atas(inicio, fim), 1), tamanho_lote)
+        if relatorio['total_erros']:
+            raise RuntimeError(f"ala {usuario}: {relatorio['erros'][:3]}")
+        total += relatorio['importadas']
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera alas e atas determinísticas para testes de volume")
+    parser.add_argument('--banco', required=True, help="banco SQLite (criado com as migrações se não existir)")
+    parser.add_argument('--alas', type=int, default=100)
+    parser.add_argument('--anos', type=int, default=5, help="anos de atas por ala")
+    parser.add_argument('--ate', type=date.fromisoformat, default=date(2025, 12, 31),
+                        help="data da última ata (YYYY-MM-DD)")
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--prefixo', default='ala', help="prefixo dos usuários gerados")
+    parser.add_argument('--lote', type=int, default=1000, help="atas por transação")
+    args = parser.parse_args(argv)
+
+    os.environ['DB_PATH'] = os.path.abspath(args.banco)
+    sys.path.insert(0, RAIZ)
+    from app import app
+    from db import get_db
+
+    with app.app_context():
+        if get_db().execute("SELECT 1 FROM users WHERE username = ?", (f"{args.prefixo}1",)).fetchone():
+            print(f"{args.banco} já tem usuários '{args.prefixo}N': use outro --prefixo ou outro banco")
+            return 2
+        inicio = time.perf_counter()
+        total = gerar(args.alas, args.anos, args.semente, args.ate, args.prefixo, args.lote)
+        segundos = time.perf_counter() - inicio
+        linhas = {
+            tabela: get_db().execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+            for tabela in ('users', 'unidades', 'atas', 'sacramental', 'batismo', 'ata_participantes')
+        }
+
+    print(f"{args.alas} ala(s), {total} atas em {segundos:.1f} s ({total / segundos:.0f} atas/s)")
+    for tabela, quantidade in linhas.items():
+        print(f"  {tabela}: {quantidade} linhas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
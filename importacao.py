@@ -0,0 +1,311 @@
+import csv
+import io
+import itertools
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+import models as dbHandler
+from db import get_db
+
+# Importação em lote de atas antigas (planilhas, sistemas anteriores).
+#
+# O arquivo é lido aos poucos, uma linha por vez, nunca inteiro em memória:
+#   - CSV com cabeçalho (vírgula ou ponto e vírgula, detectado pela primeira
+#     linha). Colunas: tipo, data e os campos dos detalhes com os mesmos nomes
+#     de detalhes_sacramental/detalhes_batismo. Listas (discursantes, anuncios,
+#     batizados) como array JSON na célula, que é o que a exportação escreve
+#     (["Anúncio; com ponto e vírgula", "Outro"]), ou, em planilhas feitas à
+#     mão, separadas por ';'.
+#   - JSON: uma lista de objetos ou JSON Lines (um objeto por linha, como o
+#     NDJSON de /api/v1/atas). O objeto pode ter os campos soltos ou em
+#     "detalhes", como na API.
+# Cada linha é validada sozinha: a inválida entra no relatório com o número da
+# linha e o motivo, e as demais seguem. As válidas são gravadas em lotes de
+# IMPORTACAO_LOTE atas, com executemany e uma transação por lote.
+#
+# O trabalho derivado (revisão, estatisticas_ala, índice de busca,
+# ultimas_falas) é feito uma vez por lote, em SQL por conjunto, em vez de linha
+# a linha pelos triggers: uma ata sacramental com 8 participantes refaria o
+# documento da busca 9 vezes. Os triggers de INSERT saem no começo da
+# transação do lote e voltam, com o SQL guardado em sqlite_master, antes do
+# COMMIT; DDL no SQLite é transacional, então nenhuma outra conexão escreve
+# sem eles. Os índices B-tree ficam: a aplicação continua no ar durante a
+# importação, e sem eles toda consulta viraria varredura da tabela.
+
+FORMATOS = ('csv', 'json')
+
+# Triggers de INSERT com trabalho por linha (migrações 0006, 0010 e 0012)
+TRIGGERS_POR_LINHA = (
+    'trg_atas_revisao_insert', 'trg_sacramental_revisao_insert', 'trg_batismo_revisao_insert',
+    'trg_participantes_revisao_insert', 'trg_atas_estatisticas_insert',
+    'trg_busca_sacramental_insert', 'trg_busca_batismo_insert', 'trg_busca_participantes_insert',
+)
+
+# Erros guardados no relatório (o total é sempre contado)
+MAX_ERROS_RELATORIO = 1000
+
+_SEPARADOR_LISTA = ';'
+
+# Colunas aceitas em qualquer linha (um CSV misto tem as colunas dos dois
+# tipos). id e status vêm da exportação (exportacao.py) e não são importados:
+# a ata importada é sempre nova e começa pendente.
+_CAMPOS_CONHECIDOS = {'tipo', 'data', 'detalhes', 'id', 'status'}.union(
+    *dbHandler.COLUNAS_AUTOSAVE.values(),
+    *dbHandler.TEXTOS_PARTICIPANTES.values(),
+    *dbHandler.LISTAS_PARTICIPANTES.values(),
+)
+
+
+def init_app(app):
+    app.config.setdefault('IMPORTACAO_LOTE', int(os.environ.get('IMPORTACAO_LOTE', 1000)))
+
+
+def formato_do_arquivo(nome=None, mimetype=None):
+    """'csv' ou 'json' pela extensão do nome ou pelo tipo MIME; None se não der para saber"""
+    extensao = os.path.splitext(nome or '')[1].lower()
+    if extensao == '.csv' or mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    if extensao in ('.json', '.jsonl', '.ndjson') or mimetype in ('application/json', 'application/x-ndjson'):
+        return 'json'
+    return None
+
+
+# ------------------------------------------------------------------
+# Leitura
+# ------------------------------------------------------------------
+
+def ler_arquivo(arquivo, formato, codificacao='utf-8-sig'):
+    """(número da linha, linha) de um arquivo binário aberto, lido aos poucos"""
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, newline='' if formato == 'csv' else None)
+    if formato == 'csv':
+        return linhas_csv(texto)
+    return linhas_json(texto)
+
+
+def linhas_csv(texto):
+    cabecalho = texto.readline()
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    leitor = csv.DictReader(itertools.chain([cabecalho], texto), delimiter=delimitador)
+    for linha in leitor:
+        yield leitor.line_num, linha
+
+
+def linhas_json(texto, tamanho_bloco=65536):
+    """Lista JSON lida objeto a objeto, ou JSON Lines (cada linha vai como texto para ler_linha)"""
+    # readline limitado: uma lista JSON costuma vir inteira numa linha só
+    numero, linha = 1, texto.readline(tamanho_bloco)
+    while linha.endswith('\n') and not linha.strip():
+        numero, linha = numero + 1, texto.readline(tamanho_bloco)
+    if not linha.lstrip().startswith('['):
+        if linha and not linha.endswith('\n'):
+            linha += texto.readline()
+        for numero, linha in enumerate(itertools.chain([linha], texto), numero):
+            if linha.strip():
+                yield numero, linha
+        return
+
+    # Lista: raw_decode de um objeto por vez, lendo mais quando o objeto não
+    # coube no que já foi lido
+    decodificador = json.JSONDecoder()
+    buffer, fim, posicao = linha.lstrip()[1:], False, 0
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if not buffer and not fim:
+            buffer = texto.read(tamanho_bloco)
+            fim = not buffer
+            continue
+        if buffer.startswith(']') or (not buffer and fim):
+            return
+        try:
+            objeto, tamanho = decodificador.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            bloco = '' if fim else texto.read(tamanho_bloco)
+            if not bloco:
+                raise ValueError(f"JSON malformado depois do item {posicao}: {e.msg}")
+            buffer += bloco
+            continue
+        posicao += 1
+        buffer = buffer[tamanho:]
+        yield posicao, objeto
+
+
+def _ler_data(valor):
+    """'YYYY-MM-DD' a partir de 'YYYY-MM-DD' ou 'DD/MM/YYYY' (como sai das planilhas)"""
+    if isinstance(valor, str):
+        for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+            try:
+                return datetime.strptime(valor.strip(), formato).date().isoformat()
+            except ValueError:
+                pass
+    raise ValueError("data deve ser YYYY-MM-DD ou DD/MM/YYYY")
+
+
+def ler_lista(texto):
+    """Itens de uma célula de lista: array JSON de textos ou, se não for, separados por ';'"""
+    if texto.lstrip().startswith('['):
+        try:
+            itens = json.loads(texto)
+        except json.JSONDecodeError:
+            itens = None
+        if isinstance(itens, list) and all(isinstance(item, str) for item in itens):
+            return itens
+    return texto.split(_SEPARADOR_LISTA)
+
+
+def ler_linha(linha, ignorados=None):
+    """(tipo, data, detalhes) de uma linha do arquivo; ValueError com o motivo se inválida.
+    Campos desconhecidos não impedem a linha e vão para o conjunto ignorados."""
+    if isinstance(linha, str):
+        try:
+            linha = json.loads(linha)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON inválido: {e.msg}")
+    if not isinstance(linha, dict):
+        raise ValueError("linha deve ser um objeto")
+
+    tipo = linha.get('tipo')
+    tipo = tipo.strip().lower() if isinstance(tipo, str) else tipo
+    if tipo not in dbHandler.COLUNAS_AUTOSAVE:
+        raise ValueError("tipo deve ser 'sacramental' ou 'batismo'")
+    data = _ler_data(linha.get('data'))
+
+    campos = linha['detalhes'] if isinstance(linha.get('detalhes'), dict) else linha
+    textos = dbHandler.COLUNAS_AUTOSAVE[tipo] + dbHandler.TEXTOS_PARTICIPANTES[tipo]
+    listas = dbHandler.LISTAS_PARTICIPANTES[tipo]
+    detalhes = {campo: campos.get(campo) for campo in textos}
+    for campo in listas:
+        valor = campos.get(campo)
+        detalhes[campo] = ler_lista(valor) if isinstance(valor, str) else valor
+    dbHandler.validar_detalhes(tipo, detalhes)
+
+    if ignorados is not None:
+        # (None é a sobra de uma linha de CSV com mais colunas que o cabeçalho)
+        ignorados.update(str(campo) for campo in campos if campo not in _CAMPOS_CONHECIDOS)
+    for campo in textos:
+        detalhes[campo] = (detalhes[campo] or '').strip()
+    for campo in listas:
+        detalhes[campo] = [nome.strip() for nome in detalhes[campo] or [] if nome.strip()]
+    return tipo, data, detalhes
+
+
+# ------------------------------------------------------------------
+# Gravação
+# ------------------------------------------------------------------
+
+def importar(ala_id, linhas, tamanho_lote=1000):
+    """Valida e grava as linhas [(número, linha)] na ala, em lotes; devolve o relatório"""
+    inicio = time.perf_counter()
+    relatorio = {'lidas': 0, 'importadas': 0, 'total_erros': 0, 'erros': [], 'lotes': 0}
+    ignorados = set()
+    lote = []
+
+    def erro(numero, motivo):
+        relatorio['total_erros'] += 1
+        if len(relatorio['erros']) < MAX_ERROS_RELATORIO:
+            relatorio['erros'].append({'linha': numero, 'erro': motivo})
+
+    def gravar():
+        try:
+            _carregar_lote(ala_id, lote)
+        except sqlite3.Error as e:
+            print(f"Importação na ala {ala_id}: lote de {len(lote)} ata(s) não gravado: {e}")
+            for numero, *_ in lote:
+                erro(numero, f"lote não gravado: {e}")
+            return
+        relatorio['importadas'] += len(lote)
+        relatorio['lotes'] += 1
+
+    try:
+        for numero, linha in linhas:
+            relatorio['lidas'] += 1
+            try:
+                lote.append((numero, *ler_linha(linha, ignorados)))
+            except ValueError as e:
+                erro(numero, str(e))
+                continue
+            if len(lote) >= tamanho_lote:
+                gravar()
+                lote = []
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        # Arquivo quebrado no meio: o que já foi lido é gravado, o resto não dá para ler
+        erro(None, f"leitura interrompida: {e}")
+    if lote:
+        gravar()
+
+    segundos = time.perf_counter() - inicio
+    relatorio['campos_ignorados'] = sorted(ignorados)
+    relatorio['segundos'] = round(segundos, 3)
+    relatorio['linhas_por_segundo'] = round(relatorio['lidas'] / segundos) if segundos else None
+    print(
+        f"Importação na ala {ala_id}: {relatorio['importadas']} de {relatorio['lidas']} linha(s) "
+        f"em {relatorio['segundos']}s ({relatorio['linhas_por_segundo']} linhas/s), {relatorio['total_erros']} erro(s)"
+    )
+    return relatorio
+
+
+def _carregar_lote(ala_id, lote):
+    """Grava [(número, tipo, data, detalhes)] numa transação, sem os triggers de INSERT por linha"""
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        triggers = conn.execute(
+            f"SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({','.join('?' * len(TRIGGERS_POR_LINHA))})",
+            TRIGGERS_POR_LINHA
+        ).fetchall()
+        for nome in TRIGGERS_POR_LINHA:
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+
+        # Ids reservados de uma vez: atas é AUTOINCREMENT, então vale o maior entre a sequência e o maior id
+        primeiro = conn.execute("""
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'atas'), 0),
+                       COALESCE((SELECT MAX(id) FROM atas), 0)) + 1
+        """).fetchone()[0]
+        ultimo = primeiro + len(lote) - 1
+        atas = [(ata_id, tipo, data, detalhes) for ata_id, (_, tipo, data, detalhes) in zip(itertools.count(primeiro), lote)]
+
+        conn.executemany(
+            "INSERT INTO atas (id, tipo, data, ala_id) VALUES (?, ?, ?, ?)",
+            [(ata_id, tipo, data, ala_id) for ata_id, tipo, data, _ in atas]
+        )
+        for tabela, colunas in dbHandler.COLUNAS_AUTOSAVE.items():
+            conn.executemany(
+                f"INSERT INTO {tabela} (ata_id, {', '.join(colunas)}) VALUES (?, {', '.join('?' * len(colunas))})",
+                [(ata_id, *(detalhes[c] for c in colunas)) for ata_id, tipo, _, detalhes in atas if tipo == tabela]
+            )
+        participantes = [
+            linha
+            for ata_id, tipo, _, detalhes in atas
+            for linha in dbHandler.linhas_participantes(ata_id, dbHandler.itens_participantes(tipo, detalhes))
+        ]
+        conn.executemany(dbHandler.SQL_INSERIR_PARTICIPANTE, participantes)
+        for (sql,) in triggers:
+            conn.execute(sql)
+
+        # O que os triggers fariam linha a linha, uma vez para o lote todo.
+        # Revisões (0010): uma nova por ata, em sequência, tiradas do mesmo contador
+        conn.execute("""
+            UPDATE atas SET revisao = (SELECT versao FROM versoes_cache WHERE nome = 'atas') + id - ? + 1,
+                            atualizada_em = CURRENT_TIMESTAMP
+            WHERE id BETWEEN ? AND ?
+        """, (primeiro, primeiro, ultimo))
+        conn.execute("UPDATE versoes_cache SET versao = versao + ? WHERE nome = 'atas'", (len(atas),))
+        # Contadores por ala, tipo e mês (0006)
+        conn.execute("""
+            INSERT INTO estatisticas_ala (ala_id, tipo, mes, total)
+            SELECT ala_id, tipo, substr(data, 1, 7), COUNT(*) FROM atas
+            WHERE id BETWEEN ? AND ?
+            GROUP BY ala_id, tipo, substr(data, 1, 7)
+            ON CONFLICT (ala_id, tipo, mes) DO UPDATE SET total = total + excluded.total
+        """, (primeiro, ultimo))
+        # Busca (0012): um documento por ata, montado já com todos os participantes
+        conn.execute("""
+            INSERT INTO busca_atas (rowid, tema, discursantes, anuncios, batizados, testemunhas, acoes, pessoas, ala)
+            SELECT * FROM busca_atas_documentos WHERE ata_id BETWEEN ? AND ?
+        """, (primeiro, ultimo))
+        dbHandler.atualizar_ultimas_falas(ala_id, {p[4] for p in participantes if p[1] == 'discursante'})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,152 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import socketio as python_socketio
+
+# Fila de mensagens do Socket.IO entre workers.
+#
+# Com mais de um worker (gunicorn -w N), cada processo só conhece os clientes
+# conectados nele: um emit(to=sala) feito no worker A não chega a quem está na
+# mesma sala pelo worker B. Com uma fila de mensagens, todo emit é publicado na
+# fila e cada worker entrega aos seus próprios clientes.
+#
+# SOCKETIO_MESSAGE_QUEUE escolhe o backend:
+#   (vazio)                  -> sem fila; só serve para um worker
+#   sqlite                   -> broker local em database/socketio.db
+#   sqlite:///caminho.db     -> broker local no arquivo indicado
+#   redis://, amqp://, ...   -> repassado ao Flask-SocketIO (message_queue)
+#
+# O broker SQLite não precisa de nenhum serviço externo: as mensagens vão para
+# uma tabela num arquivo separado do banco das atas (para não disputar o lock
+# de escrita com os saves) e cada worker lê as novas a cada SOCKETIO_MQ_POLL_MS.
+# Só funciona com os workers na mesma máquina; para várias máquinas use redis.
+
+CANAL = 'sistema-atas'
+CAMINHO_PADRAO = os.path.join('database', 'socketio.db')
+
+
+class SqliteManager(python_socketio.PubSubManager):
+    """PubSubManager do python-socketio sobre uma tabela SQLite"""
+    name = 'sqlite'
+
+    def __init__(self, caminho, intervalo=0.02, retencao=60, channel=CANAL, write_only=False, logger=None):
+        self.caminho = caminho
+        self.intervalo = intervalo  # segundos entre leituras da tabela
+        self.retencao = retencao    # mensagens mais velhas que isso são apagadas
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._limpeza = 0.0
+        self._contadores = {'publicadas': 0, 'recebidas': 0, 'apagadas': 0}
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _conexao(self):
+        # Uma conexão por processo: a do processo pai não serve depois do fork
+        if self._conn is None or self._pid != os.getpid():
+            pasta = os.path.dirname(self.caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            conn = _conectar(self.caminho)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS mensagens (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    canal TEXT NOT NULL,
+                    dados BLOB NOT NULL,
+                    criada_em REAL NOT NULL
+                )
+            """)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _publish(self, data):
+        with self._lock:
+            conn = self._conexao()
+            conn.execute(
+                "INSERT INTO mensagens (canal, dados, criada_em) VALUES (?, ?, ?)",
+                (self.channel, pickle.dumps(data), time.time())
+            )
+            self._contadores['publicadas'] += 1
+
+    def _ler(self, ultimo):
+        with self._lock:
+            conn = self._conexao()
+            if ultimo is None:
+                # Começa do fim: o que foi publicado antes deste worker subir não é para ele
+                return conn.execute("SELECT COALESCE(MAX(id), 0) FROM mensagens").fetchone()[0], []
+            linhas = conn.execute(
+                "SELECT id, dados FROM mensagens WHERE id > ? AND canal = ? ORDER BY id",
+                (ultimo, self.channel)
+            ).fetchall()
+            agora = time.time()
+            if agora - self._limpeza > self.retencao:
+                self._limpeza = agora
+                apagadas = conn.execute(
+                    "DELETE FROM mensagens WHERE criada_em < ?", (agora - self.retencao,)
+                ).rowcount
+                self._contadores['apagadas'] += apagadas
+        if linhas:
+            ultimo = linhas[-1][0]
+            self._contadores['recebidas'] += len(linhas)
+        return ultimo, [dados for _, dados in linhas]
+
+    def _listen(self):
+        ultimo = None
+        while True:
+            try:
+                ultimo, mensagens = self._ler(ultimo)
+            except Exception as e:
+                print(f"Erro lendo a fila do Socket.IO: {e}")
+                mensagens = []
+            for dados in mensagens:
+                yield pickle.loads(dados)
+            self.server.sleep(self.intervalo)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._contadores)
+        stats['backend'] = self.name
+        stats['caminho'] = self.caminho
+        stats['poll_ms'] = round(self.intervalo * 1000)
+        stats['host_id'] = self.host_id
+        return stats
+
+
+def _conectar(caminho):
+    # autocommit: cada mensagem é uma transação curta
+    conn = sqlite3.connect(caminho, timeout=5, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")  # mensagens perdidas num crash não importam
+    return conn
+
+
+def init_app(app):
+    app.config.setdefault('SOCKETIO_MESSAGE_QUEUE', os.environ.get('SOCKETIO_MESSAGE_QUEUE', ''))
+    app.config.setdefault('SOCKETIO_MQ_POLL_MS', int(os.environ.get('SOCKETIO_MQ_POLL_MS', 20)))
+    app.config.setdefault('SOCKETIO_MQ_RETENCAO_SEGUNDOS', int(os.environ.get('SOCKETIO_MQ_RETENCAO_SEGUNDOS', 60)))
+
+
+def opcoes_socketio(app):
+    """Argumentos extras do SocketIO(...) conforme SOCKETIO_MESSAGE_QUEUE"""
+    url = app.config['SOCKETIO_MESSAGE_QUEUE'].strip()
+    if not url:
+        return {}
+    if url == 'sqlite' or url.startswith('sqlite://'):
+        caminho = url[len('sqlite:///'):] if url.startswith('sqlite:///') else CAMINHO_PADRAO
+        return {'client_manager': SqliteManager(
+            caminho,
+            intervalo=app.config['SOCKETIO_MQ_POLL_MS'] / 1000,
+            retencao=app.config['SOCKETIO_MQ_RETENCAO_SEGUNDOS'],
+        )}
+    return {'message_queue': url, 'channel': CANAL}
+
+
+def stats(socketio):
+    """Situação da fila usada por este SocketIO"""
+    manager = socketio.server.manager
+    if isinstance(manager, SqliteManager):
+        return manager.stats()
+    if isinstance(manager, python_socketio.PubSubManager):
+        return {'backend': manager.name, 'host_id': manager.host_id}
+    return {'backend': None}
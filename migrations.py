@@ -0,0 +1,152 @@
+"""Migrações versionadas do banco, controladas por PRAGMA user_version.
+
+Cada arquivo em database/migrations/ chamado NNNN_descricao.sql ou
+NNNN_descricao.py é uma migração; o número é a versão que o banco passa a ter
+depois dela. Arquivos .py precisam expor aplicar(conn). Cada migração roda uma
+única vez, dentro da sua própria transação junto com a troca de user_version.
+
+Uso pela linha de comando:
+    python migrations.py status
+    python migrations.py aplicar [--ate N]
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sqlite3
+import sys
+from functools import lru_cache
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'migrations')
+_ARQUIVO_MIGRACAO = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+
+
+class Migracao:
+    def __init__(self, versao, nome, caminho):
+        self.versao = versao
+        self.nome = nome
+        self.caminho = caminho
+
+    def __repr__(self):
+        return f"<Migracao {self.versao:04d} {self.nome}>"
+
+    def executar(self, conn):
+        """Executa o conteúdo da migração na transação já aberta em conn"""
+        if self.caminho.endswith('.py'):
+            spec = importlib.util.spec_from_file_location(f"migracao_{self.versao:04d}", self.caminho)
+            modulo = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(modulo)
+            modulo.aplicar(conn)
+        else:
+            with open(self.caminho, encoding='utf-8') as f:
+                for comando in dividir_comandos(f.read()):
+                    conn.execute(comando)
+
+
+def dividir_comandos(script):
+    """Quebra um script SQL em comandos completos (respeitando ';' dentro de strings)"""
+    comandos = []
+    atual = ''
+    for parte in script.split(';'):
+        atual += parte + ';'
+        if sqlite3.complete_statement(atual):
+            if _tem_sql(atual):
+                comandos.append(atual.strip())
+            atual = ''
+    return comandos
+
+
+def _tem_sql(comando):
+    linhas = [l for l in comando.splitlines() if not l.strip().startswith('--')]
+    return ''.join(linhas).strip(' \t\n;') != ''
+
+
+@lru_cache(maxsize=None)
+def listar_migracoes(pasta=PASTA_MIGRACOES):
+    """Migrações disponíveis, em ordem de versão (lidas uma vez por processo)"""
+    migracoes = []
+    for arquivo in sorted(os.listdir(pasta)):
+        encontrado = _ARQUIVO_MIGRACAO.match(arquivo)
+        if encontrado:
+            migracoes.append(Migracao(int(encontrado.group(1)), encontrado.group(2), os.path.join(pasta, arquivo)))
+
+    for esperado, migracao in enumerate(migracoes, start=1):
+        if migracao.versao != esperado:
+            raise RuntimeError(f"Migrações fora de sequência: esperava {esperado:04d}, achei {migracao!r}")
+    return tuple(migracoes)
+
+
+def versao_atual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pendentes(conn, pasta=PASTA_MIGRACOES):
+    versao = versao_atual(conn)
+    return [m for m in listar_migracoes(pasta) if m.versao > versao]
+
+
+def migrar(conn, ate=None, pasta=PASTA_MIGRACOES):
+    """Aplica as migrações pendentes (até a versão `ate`, se informada).
+
+    Com o banco em dia isso é só uma leitura de user_version. Vários workers
+    subindo ao mesmo tempo se serializam no BEGIN IMMEDIATE, e cada um confere
+    de novo a versão antes de aplicar.
+    """
+    migracoes = listar_migracoes(pasta)
+    alvo = ate if ate is not None else (migracoes[-1].versao if migracoes else 0)
+    if versao_atual(conn) >= alvo:
+        return []
+
+    aplicadas = []
+    for migracao in migracoes:
+        if migracao.versao > alvo:
+            break
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if versao_atual(conn) >= migracao.versao:
+                conn.rollback()
+                continue
+            migracao.executar(conn)
+            conn.execute(f"PRAGMA user_version = {migracao.versao}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        aplicadas.append(migracao)
+    return aplicadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrações do banco de atas")
+    parser.add_argument('--db', default=os.environ.get('DB_PATH', 'database/atas.db'),
+                        help="caminho do banco SQLite (padrão: $DB_PATH ou database/atas.db)")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('status', help="mostra a versão do banco e as migrações pendentes")
+    aplicar = sub.add_parser('aplicar', help="aplica as migrações pendentes")
+    aplicar.add_argument('--ate', type=int, help="para nesta versão")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.comando == 'status':
+            versao = versao_atual(conn)
+            print(f"Banco: {args.db} (versão {versao})")
+            for migracao in listar_migracoes():
+                marca = 'x' if migracao.versao <= versao else ' '
+                print(f"  [{marca}] {migracao.versao:04d} {migracao.nome}")
+            faltando = len(pendentes(conn))
+            print(f"{faltando} migração(ões) pendente(s)" if faltando else "Schema em dia")
+        else:
+            aplicadas = migrar(conn, ate=args.ate)
+            for migracao in aplicadas:
+                print(f"Aplicada {migracao.versao:04d} {migracao.nome}")
+            print(f"Versão atual: {versao_atual(conn)}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
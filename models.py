@@ -1,4 +1,10 @@
-import sqlite3 as sql
+import json
+import re
+import unicodedata
+from functools import lru_cache
+from datetime import datetime, timedelta
+from markupsafe import Markup, escape
+from db import get_db
 
 # def insertUser(username,password):
 #     con = sql.connect("database/atas.db")
@@ -8,9 +14,539 @@ import sqlite3 as sql
 #     con.close()
 
 def retrieveUsers():
-	con = sql.connect("database/atas.db")
-	cur = con.cursor()
-	cur.execute("SELECT username, password FROM users")
-	users = cur.fetchall()
-	con.close()
-	return users 
\ No newline at end of file
+	con = get_db()
+	users = con.execute("SELECT username, password FROM users").fetchall()
+	return users
+
+# ==================================================================
+# Consultas por mês
+# ==================================================================
+# Nunca filtre atas com strftime('%Y-%m', data) = ?: a função em volta da
+# coluna impede o uso de idx_atas_ala_data_id e obriga o SQLite a varrer todas
+# as atas da ala. Use sempre o intervalo semiaberto abaixo.
+FILTRO_MES = "a.ala_id = ? AND a.data >= ? AND a.data < ?"
+
+def intervalo_mes(mes):
+    """Converte 'YYYY-MM' em (primeiro dia do mês, primeiro dia do mês seguinte)"""
+    inicio = datetime.strptime(mes, "%Y-%m").date()
+    proximo = (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio.isoformat(), proximo.isoformat()
+
+def atas_do_mes(ala_id, mes):
+    """Atas da ala no mês 'YYYY-MM', da mais recente para a mais antiga"""
+    inicio, fim = intervalo_mes(mes)
+    return get_db().execute(
+        f"SELECT a.* FROM atas a WHERE {FILTRO_MES} ORDER BY a.data DESC",
+        (ala_id, inicio, fim)
+    ).fetchall()
+
+def contar_atas_do_mes(ala_id, mes):
+    """Quantidade de atas da ala no mês 'YYYY-MM'"""
+    inicio, fim = intervalo_mes(mes)
+    return get_db().execute(
+        f"SELECT COUNT(*) FROM atas a WHERE {FILTRO_MES}",
+        (ala_id, inicio, fim)
+    ).fetchone()[0]
+
+def revisao_do_mes(ala_id, mes):
+    """(maior revisão, quantidade) das atas da ala no mês: muda sempre que o conteúdo do mês muda (migração 0010)"""
+    inicio, fim = intervalo_mes(mes)
+    row = get_db().execute(
+        f"SELECT COALESCE(MAX(a.revisao), 0), COUNT(*) FROM atas a WHERE {FILTRO_MES}",
+        (ala_id, inicio, fim)
+    ).fetchone()
+    return row[0], row[1]
+
+def ler_periodo(args):
+    """(inicio, fim) semiaberto a partir de ?mes=YYYY-MM, ?ano=YYYY ou ?inicio=&fim= (inclusivos); ValueError se inválido"""
+    if args.get("mes"):
+        return intervalo_mes(args["mes"])
+    if args.get("ano"):
+        ano = datetime.strptime(args["ano"], "%Y").year
+        return f"{ano}-01-01", f"{ano + 1}-01-01"
+    inicio = datetime.strptime(args.get("inicio", ""), "%Y-%m-%d").date()
+    fim = datetime.strptime(args.get("fim", ""), "%Y-%m-%d").date() + timedelta(days=1)
+    if fim <= inicio:
+        raise ValueError("fim antes do início")
+    return inicio.isoformat(), fim.isoformat()
+
+def atas_do_periodo(ala_id, inicio, fim, tipo=None):
+    """Atas da ala com data em [inicio, fim), da mais antiga para a mais recente (cursor, sem carregar tudo)"""
+    sql = f"SELECT a.* FROM atas a WHERE {FILTRO_MES}"
+    parametros = [ala_id, inicio, fim]
+    if tipo:
+        sql += " AND a.tipo = ?"
+        parametros.append(tipo)
+    return get_db().execute(sql + " ORDER BY a.data, a.id", parametros)
+
+# ==================================================================
+# Listagem paginada (/atas)
+# ==================================================================
+# Paginação por chave (keyset), nunca por OFFSET: a página seguinte começa
+# logo depois da última ata mostrada, na ordem (data DESC, id DESC) de
+# idx_atas_ala_data_id, então o custo de cada página é o mesmo no primeiro ano
+# ou no décimo. O cursor é "data_id" da última ata da página anterior.
+
+def cursor_da_ata(ata):
+    return f"{ata['data']}_{ata['id']}"
+
+def ler_cursor(cursor):
+    """(data, id) de um cursor; ValueError se inválido"""
+    data, _, ata_id = cursor.partition('_')
+    datetime.strptime(data, "%Y-%m-%d")
+    return data, int(ata_id)
+
+def pagina_de_atas(ala_id, cursor=None, limite=30):
+    """(atas com tema, cursor da próxima página ou None), da mais recente para a mais antiga"""
+    sql = "SELECT a.*, s.tema FROM atas a LEFT JOIN sacramental s ON a.id = s.ata_id WHERE a.ala_id = ?"
+    parametros = [ala_id]
+    if cursor:
+        sql += " AND (a.data, a.id) < (?, ?)"
+        parametros.extend(ler_cursor(cursor))
+    # Uma a mais só para saber se existe próxima página
+    atas = get_db().execute(
+        sql + " ORDER BY a.data DESC, a.id DESC LIMIT ?", (*parametros, limite + 1)
+    ).fetchall()
+    if len(atas) > limite:
+        return atas[:limite], cursor_da_ata(atas[limite - 1])
+    return atas, None
+
+# ==================================================================
+# Busca de texto completo (tabela busca_atas, FTS5, mantida por triggers)
+# ==================================================================
+# O texto digitado nunca vai direto para o MATCH: cada palavra vira um termo
+# entre aspas com prefixo ("dizim"*), todos obrigatórios, então aspas, AND,
+# parênteses etc. digitados pelo usuário não causam erro de sintaxe do FTS5.
+# A ala também é um termo do índice (coluna ala), e a ordem é o rank com os
+# pesos gravados na migração 0012: o FTS5 entrega as mais relevantes primeiro
+# e trecho/destaque só são calculados para as que entram no LIMIT.
+_INICIO_DESTAQUE, _FIM_DESTAQUE = '\x02', '\x03'
+
+def consulta_fts(texto, max_termos=8):
+    """Expressão MATCH segura para o texto digitado, ou None se não sobrar termo"""
+    termos = [t for t in re.findall(r"\w+", texto or "") if len(t) > 1][:max_termos]
+    if not termos:
+        return None
+    return " ".join(f'"{termo}"*' for termo in termos)
+
+def _destacar(trecho):
+    """Escapa o texto da ata e troca os marcadores do snippet por <mark>"""
+    return Markup(str(escape(trecho or "")).replace(_INICIO_DESTAQUE, "<mark>").replace(_FIM_DESTAQUE, "</mark>"))
+
+def buscar_atas(ala_id, texto, limite=20):
+    """Atas da ala que contêm todos os termos, das mais relevantes para as menos, com trecho destacado"""
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    linhas = get_db().execute("""
+        SELECT a.id, a.tipo, a.data, a.status,
+               highlight(busca_atas, 0, ?, ?) AS tema,
+               snippet(busca_atas, -1, ?, ?, '…', 16) AS trecho
+        FROM busca_atas f
+        JOIN atas a ON a.id = f.rowid
+        WHERE busca_atas MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (_INICIO_DESTAQUE, _FIM_DESTAQUE, _INICIO_DESTAQUE, _FIM_DESTAQUE,
+          f"ala:ala{int(ala_id)} AND ({consulta})", limite)).fetchall()
+    resultados = []
+    for row in linhas:
+        resultado = dict(row)
+        resultado['tema'] = _destacar(row['tema'])
+        resultado['trecho'] = _destacar(row['trecho'])
+        resultados.append(resultado)
+    return resultados
+
+# ==================================================================
+# Estatísticas por ala (tabela estatisticas_ala, mantida por triggers)
+# ==================================================================
+# Contadores por (ala, tipo, mês). Nada aqui conta a tabela atas, exceto a
+# verificação de consistência, que existe justamente para recontar.
+SQL_RECONTAR_ESTATISTICAS = """
+    SELECT ala_id, tipo, substr(data, 1, 7) AS mes, COUNT(*) AS total
+    FROM atas
+    GROUP BY ala_id, tipo, substr(data, 1, 7)
+"""
+
+def estatisticas_da_ala(ala_id, mes):
+    """Totais da ala (geral, por tipo e no mês 'YYYY-MM') numa única consulta"""
+    row = get_db().execute("""
+        SELECT COALESCE(SUM(total), 0) AS total,
+               COALESCE(SUM(CASE WHEN tipo = 'sacramental' THEN total END), 0) AS sacramentais,
+               COALESCE(SUM(CASE WHEN tipo = 'batismo' THEN total END), 0) AS batismos,
+               COALESCE(SUM(CASE WHEN mes = ? THEN total END), 0) AS no_mes
+        FROM estatisticas_ala
+        WHERE ala_id = ?
+    """, (mes, ala_id)).fetchone()
+    return dict(row)
+
+def divergencias_estatisticas():
+    """[(ala_id, tipo, mes, guardado, real)] onde estatisticas_ala não bate com as atas"""
+    conn = get_db()
+    reais = {(r['ala_id'], r['tipo'], r['mes']): r['total'] for r in conn.execute(SQL_RECONTAR_ESTATISTICAS)}
+    guardadas = {
+        (r['ala_id'], r['tipo'], r['mes']): r['total']
+        for r in conn.execute("SELECT ala_id, tipo, mes, total FROM estatisticas_ala")
+    }
+    return [
+        (*chave, guardadas.get(chave, 0), reais.get(chave, 0))
+        for chave in sorted(reais.keys() | guardadas.keys(), key=str)
+        if guardadas.get(chave, 0) != reais.get(chave, 0)
+    ]
+
+def reconstruir_estatisticas():
+    """Refaz estatisticas_ala a partir das atas; devolve o número de linhas"""
+    conn = get_db()
+    conn.execute("DELETE FROM estatisticas_ala")
+    conn.execute(f"INSERT INTO estatisticas_ala (ala_id, tipo, mes, total) {SQL_RECONTAR_ESTATISTICAS}")
+    total = conn.execute("SELECT COUNT(*) FROM estatisticas_ala").fetchone()[0]
+    conn.commit()
+    return total
+
+# ==================================================================
+# Unidade (os templates ficam em registro_templates.py)
+# ==================================================================
+
+def unidade_da_ala(ala_id):
+    unidade = get_db().execute("SELECT * FROM unidades WHERE ala_id = ?", (ala_id,)).fetchone()
+    return dict(unidade) if unidade else {}
+
+# ==================================================================
+# Participantes das atas (discursantes, anúncios, hinos, orações, batizados)
+# ==================================================================
+# Cada item é uma linha de ata_participantes(ata_id, papel, ordem, nome).
+# Para hino e oracao a ordem é posicional: 0 = abertura, 1 = encerramento.
+PAPEIS_SACRAMENTAL = ('discursante', 'anuncio', 'hino', 'oracao')
+PAPEIS_BATISMO = ('batizado',)
+
+def participantes_da_ata(ata_id):
+    """{papel: {ordem: nome}} com os itens da ata, em ordem"""
+    itens = {}
+    for row in get_db().execute(
+        "SELECT papel, ordem, nome FROM ata_participantes WHERE ata_id = ? ORDER BY papel, ordem",
+        (ata_id,)
+    ):
+        itens.setdefault(row['papel'], {})[row['ordem']] = row['nome']
+    return itens
+
+SQL_INSERIR_PARTICIPANTE = "INSERT INTO ata_participantes (ata_id, papel, ordem, nome, chave) VALUES (?, ?, ?, ?, ?)"
+
+def itens_participantes(tipo, detalhes):
+    """{papel: [nomes na ordem]} a partir dos detalhes no formato de detalhes_sacramental/detalhes_batismo"""
+    if tipo == 'sacramental':
+        # Hinos/orações: 0 = abertura, 1 = encerramento
+        return {
+            'discursante': detalhes.get('discursantes') or [],
+            'anuncio': detalhes.get('anuncios') or [],
+            'hino': [detalhes.get('hino_abertura') or '', detalhes.get('hino_encerramento') or ''],
+            'oracao': [detalhes.get('oracao_abertura') or '', detalhes.get('oracao_encerramento') or ''],
+        }
+    return {'batizado': detalhes.get('batizados') or []}
+
+def linhas_participantes(ata_id, itens):
+    """Parâmetros de SQL_INSERIR_PARTICIPANTE; nomes vazios ficam de fora sem mudar a ordem dos demais"""
+    return [
+        (ata_id, papel, ordem, nome.strip(), normalizar_nome(nome))
+        for papel, nomes in itens.items()
+        for ordem, nome in enumerate(nomes)
+        if nome and nome.strip()
+    ]
+
+def salvar_participantes(ata_id, itens):
+    """Substitui os itens da ata; itens = {papel: [nomes na ordem]}. Não faz commit."""
+    conn = get_db()
+    conn.execute(
+        f"DELETE FROM ata_participantes WHERE ata_id = ? AND papel IN ({','.join('?' * len(itens))})",
+        (ata_id, *itens)
+    )
+    conn.executemany(SQL_INSERIR_PARTICIPANTE, linhas_participantes(ata_id, itens))
+
+def excluir_participantes(ata_id):
+    get_db().execute("DELETE FROM ata_participantes WHERE ata_id = ?", (ata_id,))
+
+def detalhes_sacramental(ata_id):
+    """Linha de sacramental + listas decodificadas, no formato que as telas e PDFs usam"""
+    row = get_db().execute("SELECT * FROM sacramental WHERE ata_id = ?", (ata_id,)).fetchone()
+    if not row:
+        return {}
+    return _decodificar_sacramental(row, participantes_da_ata(ata_id))
+
+def _decodificar_sacramental(row, itens):
+    detalhes = dict(row)
+    hinos = itens.get('hino', {})
+    oracoes = itens.get('oracao', {})
+    detalhes['discursantes'] = list(itens.get('discursante', {}).values())
+    detalhes['anuncios'] = list(itens.get('anuncio', {}).values())
+    detalhes['hino_abertura'] = hinos.get(0, '')
+    detalhes['hino_encerramento'] = hinos.get(1, '')
+    detalhes['oracao_abertura'] = oracoes.get(0, '')
+    detalhes['oracao_encerramento'] = oracoes.get(1, '')
+    return detalhes
+
+def detalhes_batismo(ata_id):
+    """Linha de batismo + lista de batizados"""
+    row = get_db().execute("SELECT * FROM batismo WHERE ata_id = ?", (ata_id,)).fetchone()
+    if not row:
+        return {}
+    return _decodificar_batismo(row, participantes_da_ata(ata_id))
+
+def _decodificar_batismo(row, itens):
+    detalhes = dict(row)
+    detalhes['batizados'] = list(itens.get('batizado', {}).values())
+    return detalhes
+
+def detalhes_das_atas(atas):
+    """{ata_id: detalhes} de várias atas em três consultas, com a mesma decodificação de detalhes_sacramental/detalhes_batismo"""
+    if not atas:
+        return {}
+    ids = [ata['id'] for ata in atas]
+    marcas = ','.join('?' * len(ids))
+    conn = get_db()
+    itens = {}
+    for ata_id, papel, ordem, nome in conn.execute(
+        f"SELECT ata_id, papel, ordem, nome FROM ata_participantes WHERE ata_id IN ({marcas}) ORDER BY ata_id, papel, ordem",
+        ids
+    ):
+        itens.setdefault(ata_id, {}).setdefault(papel, {})[ordem] = nome
+
+    # Como em visualizar_ata: o tipo da ata decide a tabela (o que não é sacramental é batismo)
+    detalhes = {}
+    for tabela, decodificar in (('sacramental', _decodificar_sacramental), ('batismo', _decodificar_batismo)):
+        ids_tabela = [ata['id'] for ata in atas if (ata['tipo'] == 'sacramental') == (tabela == 'sacramental')]
+        if not ids_tabela:
+            continue
+        for row in conn.execute(
+            f"SELECT * FROM {tabela} WHERE ata_id IN ({','.join('?' * len(ids_tabela))}) ORDER BY ata_id, id",
+            ids_tabela
+        ):
+            if row['ata_id'] not in detalhes:
+                detalhes[row['ata_id']] = decodificar(row, itens.get(row['ata_id'], {}))
+    return {ata_id: detalhes.get(ata_id, {}) for ata_id in ids}
+
+def gravar_ata(ala_id, tipo, data, detalhes, ata_id=None):
+    """Cria (ata_id None) ou substitui uma ata inteira a partir dos detalhes no formato de
+    detalhes_sacramental/detalhes_batismo; campos ausentes ficam vazios. Devolve o id. Não faz commit."""
+    conn = get_db()
+    if ata_id is None:
+        ata_id = conn.execute(
+            "INSERT INTO atas (tipo, data, ala_id) VALUES (?, ?, ?)", (tipo, data, ala_id)
+        ).lastrowid
+    else:
+        conn.execute("UPDATE atas SET tipo = ?, data = ? WHERE id = ?", (tipo, data, ata_id))
+
+    colunas = COLUNAS_AUTOSAVE[tipo]
+    valores = [detalhes.get(c) or '' for c in colunas]
+    atualizadas = conn.execute(
+        f"UPDATE {tipo} SET {', '.join(f'{c} = ?' for c in colunas)} WHERE ata_id = ?",
+        (*valores, ata_id)
+    ).rowcount
+    if not atualizadas:
+        conn.execute(
+            f"INSERT INTO {tipo} (ata_id, {', '.join(colunas)}) VALUES (?, {', '.join('?' * len(colunas))})",
+            (ata_id, *valores)
+        )
+
+    chaves_antes = chaves_discursantes(ata_id)
+    salvar_participantes(ata_id, itens_participantes(tipo, detalhes))
+    if tipo == 'sacramental':
+        # Discursantes recentes: recalcula quem saiu e quem entrou nesta ata
+        atualizar_ultimas_falas(ala_id, chaves_antes | chaves_discursantes(ata_id))
+    return ata_id
+
+# Campos dos detalhes que não são colunas: ficam em ata_participantes
+TEXTOS_PARTICIPANTES = {
+    'sacramental': ('hino_abertura', 'hino_encerramento', 'oracao_abertura', 'oracao_encerramento'),
+    'batismo': (),
+}
+LISTAS_PARTICIPANTES = {'sacramental': ('discursantes', 'anuncios'), 'batismo': ('batizados',)}
+
+def validar_detalhes(tipo, detalhes):
+    """ValueError se algum campo dos detalhes não for texto (ou lista de textos, nas listas)"""
+    if not isinstance(detalhes, dict):
+        raise ValueError("detalhes deve ser um objeto")
+    for campo in COLUNAS_AUTOSAVE[tipo] + TEXTOS_PARTICIPANTES[tipo]:
+        if not isinstance(detalhes.get(campo) or '', str):
+            raise ValueError(f"{campo} deve ser texto")
+    for campo in LISTAS_PARTICIPANTES[tipo]:
+        valor = detalhes.get(campo) or []
+        if not isinstance(valor, list) or not all(isinstance(nome, str) for nome in valor):
+            raise ValueError(f"{campo} deve ser uma lista de textos")
+
+# ==================================================================
+# Autosave da edição colaborativa (colaboracao.EstadoSalas)
+# ==================================================================
+# Colunas que o autosave pode gravar, por tipo de ata. Campos do formulário
+# fora desta lista (checkboxes incluir_*, listas) não viram coluna.
+COLUNAS_AUTOSAVE = {
+    'sacramental': (
+        'presidido', 'dirigido', 'recepcionistas', 'tema', 'pianista', 'regente_musica',
+        'reconhecemos_presenca', 'hino_sacramental', 'hino_intermediario', 'desobrigacoes',
+        'apoios', 'confirmacoes_batismo', 'apoio_membros', 'bencao_criancas', 'ultimo_discursante',
+    ),
+    'batismo': ('dedicado', 'presidido', 'dirigido', 'testemunha1', 'testemunha2'),
+}
+
+def salvar_colunas_ata(ata_id, tipo, valores):
+    """UPDATE só das colunas informadas em sacramental/batismo. Não faz commit."""
+    colunas = [c for c in valores if c in COLUNAS_AUTOSAVE[tipo]]
+    if not colunas:
+        return
+    get_db().execute(
+        f"UPDATE {tipo} SET {', '.join(f'{c} = ?' for c in colunas)} WHERE ata_id = ?",
+        (*(valores[c] for c in colunas), ata_id)
+    )
+
+def carregar_rascunho(sala):
+    row = get_db().execute("SELECT campos FROM rascunhos WHERE sala = ?", (sala,)).fetchone()
+    return json.loads(row['campos']) if row else None
+
+def salvar_rascunho(sala, ala_id, tipo, data, campos):
+    """Grava (ou substitui) o rascunho da sala. Não faz commit."""
+    get_db().execute("""
+        INSERT INTO rascunhos (sala, ala_id, tipo, data, campos, atualizado_em)
+        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (sala) DO UPDATE SET campos = excluded.campos, atualizado_em = excluded.atualizado_em
+    """, (sala, ala_id, tipo, data, json.dumps(campos, ensure_ascii=False)))
+
+def apagar_rascunho(sala):
+    """Não faz commit."""
+    get_db().execute("DELETE FROM rascunhos WHERE sala = ?", (sala,))
+
+# ==================================================================
+# Presença nas salas de edição (compartilhada entre workers)
+# ==================================================================
+
+def registrar_presenca(sid, sala, worker, agora):
+    db = get_db()
+    db.execute("""
+        INSERT INTO presenca (sid, sala, worker, visto_em) VALUES (?, ?, ?, ?)
+        ON CONFLICT (sid) DO UPDATE SET sala = excluded.sala, worker = excluded.worker,
+                                        entrou_em = CURRENT_TIMESTAMP, visto_em = excluded.visto_em
+    """, (sid, sala, worker, agora))
+    db.commit()
+
+def remover_presenca(sid):
+    db = get_db()
+    db.execute("DELETE FROM presenca WHERE sid = ?", (sid,))
+    db.commit()
+
+def contar_presenca(sala):
+    return get_db().execute("SELECT COUNT(*) FROM presenca WHERE sala = ?", (sala,)).fetchone()[0]
+
+def limpar_presenca_worker(worker):
+    """Apaga as linhas de um worker (ex.: de um processo antigo com o mesmo host:pid)"""
+    db = get_db()
+    apagadas = db.execute("DELETE FROM presenca WHERE worker = ?", (worker,)).rowcount
+    db.commit()
+    return apagadas
+
+def renovar_presenca(worker, sids, agora):
+    """Batimento: marca as conexões ainda vivas do worker e apaga as que ele não tem mais"""
+    db = get_db()
+    db.execute("UPDATE presenca SET visto_em = ? WHERE worker = ?", (agora, worker))
+    vivos = set(sids)
+    orfas = [row['sid'] for row in db.execute("SELECT sid FROM presenca WHERE worker = ?", (worker,))
+             if row['sid'] not in vivos]
+    db.executemany("DELETE FROM presenca WHERE sid = ?", [(sid,) for sid in orfas])
+    db.commit()
+    return len(orfas)
+
+def expirar_presenca(limite):
+    """Apaga as linhas sem batimento desde limite; devolve as salas afetadas"""
+    db = get_db()
+    salas = [row['sala'] for row in db.execute(
+        "SELECT DISTINCT sala FROM presenca WHERE visto_em < ?", (limite,)
+    )]
+    if salas:
+        db.execute("DELETE FROM presenca WHERE visto_em < ?", (limite,))
+    db.commit()
+    return salas
+
+def listar_presenca():
+    return get_db().execute(
+        "SELECT sala, sid, worker, entrou_em, visto_em FROM presenca ORDER BY sala, entrou_em"
+    ).fetchall()
+
+# ==================================================================
+# Discursantes recentes (tabela ultimas_falas)
+# ==================================================================
+# ultimas_falas guarda, por ala e nome normalizado, a ata mais recente em que
+# a pessoa discursou. É atualizada na mesma transação do save/exclusão da
+# ata, recalculando só os nomes que a ata tinha antes e depois da mudança.
+
+@lru_cache(maxsize=4096)
+def normalizar_nome(nome):
+    """Chave de comparação de nomes: minúsculo, sem acentos e com espaços colapsados"""
+    sem_acento = ''.join(c for c in unicodedata.normalize('NFKD', nome) if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+def chaves_discursantes(ata_id):
+    """Chaves dos discursantes gravados hoje para a ata"""
+    return {
+        row[0] for row in get_db().execute(
+            "SELECT chave FROM ata_participantes WHERE ata_id = ? AND papel = 'discursante'",
+            (ata_id,)
+        )
+    }
+
+def atualizar_ultimas_falas(ala_id, chaves):
+    """Recalcula a última fala de cada chave na ala (consulta indexada por chave). Não faz commit."""
+    conn = get_db()
+    for chave in chaves:
+        ultima = conn.execute("""
+            SELECT p.nome, a.data, a.id, p.ordem
+            FROM ata_participantes p
+            JOIN atas a ON a.id = p.ata_id
+            WHERE p.chave = ? AND p.papel = 'discursante' AND a.ala_id = ? AND a.tipo = 'sacramental'
+            ORDER BY a.data DESC, a.id DESC, p.ordem
+            LIMIT 1
+        """, (chave, ala_id)).fetchone()
+        if ultima:
+            conn.execute(
+                "INSERT OR REPLACE INTO ultimas_falas (ala_id, chave, nome, data, ata_id, ordem) VALUES (?, ?, ?, ?, ?, ?)",
+                (ala_id, chave, ultima['nome'], ultima['data'], ultima['id'], ultima['ordem'])
+            )
+        else:
+            conn.execute("DELETE FROM ultimas_falas WHERE ala_id = ? AND chave = ?", (ala_id, chave))
+
+def reconstruir_ultimas_falas():
+    """Refaz ultimas_falas a partir de ata_participantes; devolve o número de linhas"""
+    conn = get_db()
+    conn.execute("DELETE FROM ultimas_falas")
+    conn.execute("""
+        INSERT INTO ultimas_falas (ala_id, chave, nome, data, ata_id, ordem)
+        SELECT ala_id, chave, nome, data, ata_id, ordem
+        FROM (
+            -- Mesma escolha de atualizar_ultimas_falas: data, depois id, depois ordem
+            SELECT a.ala_id, p.chave, p.nome, a.data, a.id AS ata_id, p.ordem,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY a.ala_id, p.chave ORDER BY a.data DESC, a.id DESC, p.ordem
+                   ) AS posicao
+            FROM ata_participantes p
+            JOIN atas a ON a.id = p.ata_id
+            WHERE p.papel = 'discursante' AND a.tipo = 'sacramental'
+        )
+        WHERE posicao = 1
+    """)
+    total = conn.execute("SELECT COUNT(*) FROM ultimas_falas").fetchone()[0]
+    conn.commit()
+    return total
+
+def discursantes_recentes(ala_id, desde, limite=20):
+    """Discursantes distintos da ala desde a data, com a data (e tema) da fala mais recente"""
+    rows = get_db().execute("""
+        SELECT u.nome, u.data, s.tema
+        FROM ultimas_falas u
+        LEFT JOIN sacramental s ON s.ata_id = u.ata_id
+        WHERE u.ala_id = ? AND u.data >= ?
+        ORDER BY u.data DESC, u.ordem
+        LIMIT ?
+    """, (ala_id, desde, limite)).fetchall()
+    return [
+        {
+            'nome': row['nome'],
+            'data': datetime.strptime(row['data'], "%Y-%m-%d").strftime("%d/%m/%Y"),
+            'tema': row['tema'],
+        }
+        for row in rows
+    ]
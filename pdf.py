@@ -0,0 +1,330 @@
+import io
+import threading
+from datetime import datetime
+from xml.sax.saxutils import escape
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import (
+    BaseDocTemplate, Frame, HRFlowable, KeepTogether, PageTemplate,
+    Paragraph, Spacer, Table, TableStyle,
+)
+from reportlab.lib import colors
+
+# Geração dos PDFs das atas. As funções recebem só dicionários simples
+# (ata, detalhes, template, unidade) e devolvem os bytes do PDF, sem tocar
+# no banco nem na sessão.
+
+
+def _texto_template(template, campo, padrao):
+    """Texto do template da ala para o campo, ou o texto padrão se não houver"""
+    return template.get(campo) or padrao
+
+
+# PDF simples (em desenvolvimento, ajustando para ser dinamica com cada ala)
+def gerar_pdf_simples(ata, detalhes):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.setFont("Helvetica", 14)
+    c.drawString(50, 800, f"Ata de {ata['tipo'].capitalize()} - {ata['data']}")
+    c.setFont("Helvetica", 12)
+
+    if ata["tipo"] == "sacramental":
+        detalhes_dict = detalhes
+        if detalhes_dict:
+            discursantes = detalhes_dict["discursantes"]
+            anuncios = detalhes_dict["anuncios"]
+            
+            c.drawString(50, 770, f"Presidido por: {detalhes_dict['presidido']}")
+            c.drawString(50, 750, f"Dirigido por: {detalhes_dict['dirigido']}")
+            c.drawString(50, 730, f"Pianista: {detalhes_dict.get('pianista', '')}")  # NOVO
+            c.drawString(50, 710, f"Regente de Música: {detalhes_dict.get('regente_musica', '')}")
+            
+            # Anúncios
+            y = 690
+            if anuncios and len(anuncios) > 0:
+                c.drawString(50, 690, "Anúncios:")
+                y = 670
+                for a in anuncios:
+                    c.drawString(70, y, f"- {a}")
+                    y -= 20
+            
+            c.drawString(50, y-20, f"Hino de Abertura: {detalhes_dict['hino_abertura']}")
+            c.drawString(50, y-40, f"Oração de Abertura: {detalhes_dict['oracao_abertura']}")
+            c.drawString(50, y-60, f"Hino Sacramental: {detalhes_dict.get('hino_sacramental', '')}")
+            
+            # Discursantes
+            y_disc = y-80
+            if discursantes and len(discursantes) > 0:
+                c.drawString(50, y_disc, "Discursantes:")
+                y_disc -= 20
+                for d in discursantes:
+                    c.drawString(70, y_disc, f"- {d}")
+                    y_disc -= 20
+            
+            c.drawString(50, y_disc-20, f"Hino Intermediário: {detalhes_dict.get('hino_intermediario', '')}")
+            c.drawString(50, y_disc-40, f"Hino de Encerramento: {detalhes_dict['hino_encerramento']}")
+            c.drawString(50, y_disc-60, f"Oração de Encerramento: {detalhes_dict['oracao_encerramento']}")
+    else:
+        detalhes_dict = detalhes
+        if detalhes_dict:
+            batizados = detalhes_dict["batizados"]
+            c.drawString(50, 770, f"Presidido por: {detalhes_dict['presidido']}")
+            c.drawString(50, 750, f"Dirigido por: {detalhes_dict['dirigido']}")
+            c.drawString(50, 730, f"Dedicado a: {detalhes_dict['dedicado']}")
+            c.drawString(50, 710, f"Testemunha 1: {detalhes_dict.get('testemunha1', '')}")
+            c.drawString(50, 690, f"Testemunha 2: {detalhes_dict.get('testemunha2', '')}")
+            y = 670
+            if batizados and len(batizados) > 0:
+                c.drawString(50, 670, "Batizados:")
+                y = 650
+                for b in batizados:
+                    c.drawString(70, y, f"- {b}")
+                    y -= 20
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+# ==================================================================
+# PDF sacramental (platypus)
+# ==================================================================
+# O layout é uma "story" de flowables: o ReportLab quebra as páginas sozinho,
+# então listas longas de anúncios ou discursantes empurram o resto para a
+# página seguinte em vez de sobrepor o texto. Estilos e tabelas de estilo são
+# montados uma vez por processo; a página (frame + PageTemplate) uma vez por thread,
+# porque o Frame guarda estado durante o build.
+
+# CORES - Baseadas no site da Igreja
+AZUL_IGREJA = colors.HexColor("#004272")  # Azul escuro
+AZUL_CLARO = colors.HexColor("#E6F2FF")   # Azul claro para fundos
+CINZA_LINHA = colors.HexColor("#E2E8F0")
+
+LARGURA, ALTURA = A4
+MARGEM = 50
+LARGURA_UTIL = LARGURA - 2 * MARGEM
+NAO_INFORMADO = "Não informado"
+
+ESTILO_TITULO = ParagraphStyle(
+    'Titulo', fontName='Helvetica-Bold', fontSize=16, leading=20,
+    alignment=TA_CENTER, textColor=AZUL_IGREJA, spaceAfter=10,
+)
+ESTILO_PARAGRAFO = ParagraphStyle(
+    'Normal', fontName='Helvetica', fontSize=12, leading=15,
+    alignment=TA_JUSTIFY, textColor=colors.black, spaceBefore=6, spaceAfter=6,
+)
+ESTILO_TEXTO = ParagraphStyle(
+    'Texto', parent=ESTILO_PARAGRAFO, fontSize=10, leading=13, spaceBefore=2, spaceAfter=6,
+)
+ESTILO_LINHA = ParagraphStyle(
+    'Linha', fontName='Helvetica', fontSize=12, leading=15, textColor=colors.black,
+)
+ESTILO_ITEM = ParagraphStyle(
+    'Item', parent=ESTILO_LINHA, leftIndent=15, bulletIndent=5,
+)
+ESTILO_SUBTITULO = ParagraphStyle(
+    'Subtitulo', parent=ESTILO_LINHA, fontName='Helvetica-Bold', spaceBefore=4, spaceAfter=0,
+)
+ESTILO_SECAO = ParagraphStyle(
+    'Secao', fontName='Helvetica-Bold', fontSize=15, leading=18,
+    textColor=AZUL_IGREJA, spaceAfter=6,
+)
+
+TABELA_CABECALHO = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), AZUL_IGREJA),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.white),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+])
+TABELA_DESTAQUE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), AZUL_CLARO),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+])
+TABELA_DISCURSANTES = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), AZUL_CLARO),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+])
+
+_pagina = threading.local()
+
+
+def _templates_pagina():
+    """[PageTemplate] A4 com margens de 50pt, criado uma vez por thread"""
+    if not hasattr(_pagina, 'templates'):
+        frame = Frame(MARGEM, 40, LARGURA_UTIL, ALTURA - 80, id='conteudo',
+                      leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
+        _pagina.templates = [PageTemplate(id='ata', frames=[frame])]
+    return _pagina.templates
+
+
+def _texto(valor):
+    """Escapa o texto digitado pelo usuário para dentro de um Paragraph"""
+    return escape(str(valor))
+
+
+def _campo(detalhes, campo):
+    return detalhes.get(campo) or NAO_INFORMADO
+
+
+def _divisoria():
+    return HRFlowable(width='100%', thickness=3, color=CINZA_LINHA, spaceBefore=6, spaceAfter=10)
+
+
+def _rotulo(rotulo, valor=''):
+    return Paragraph(f"<b>{rotulo}</b> {_texto(valor)}", ESTILO_LINHA)
+
+
+def _secao(titulo, *conteudo):
+    """Título da seção junto do primeiro bloco, para não ficar sozinho no fim da página"""
+    if not conteudo:
+        return [Paragraph(titulo, ESTILO_SECAO)]
+    return [KeepTogether([Paragraph(titulo, ESTILO_SECAO), conteudo[0]]), *conteudo[1:]]
+
+
+def _bloco(titulo, texto):
+    return KeepTogether([Paragraph(titulo, ESTILO_SUBTITULO), Paragraph(_texto(texto), ESTILO_TEXTO)])
+
+
+def _tabela(linhas, larguras, estilo):
+    tabela = Table(linhas, colWidths=larguras)
+    tabela.setStyle(estilo)
+    return tabela
+
+
+def _story_sacramental(ata, detalhes, template, unidade):
+    nome_ala = unidade.get('nome') or "ALA [NOME]"
+    data_formatada = datetime.strptime(ata['data'], "%Y-%m-%d").strftime("%d/%m/%Y")
+    story = [Paragraph("ATA REUNIÃO SACRAMENTAL", ESTILO_TITULO)]
+
+    # Tabela de informações
+    story.append(_tabela(
+        [[nome_ala.upper(), f"ESTACA {(unidade.get('estaca') or 'Criciúma').upper()}",
+          f"HORÁRIO {unidade.get('horario') or '[ARRUMAR]'}", f"DATA {data_formatada}"]],
+        [LARGURA_UTIL / 4] * 4, TABELA_CABECALHO,
+    ))
+
+    # Boas-vindas
+    texto_boas_vindas = _texto_template(
+        template, 'boas_vindas',
+        "Bom dia irmãos e irmãs! Gostaríamos de fazer todos muito bem vindos a mais uma Reunião Sacramental da ALA [NOME], Estaca Criciúma, neste dia [DATA]. Desejamos que todos se sintam bem entre nós, especialmente aqueles que nos visitam."
+    ).replace("ALA [NOME]", nome_ala).replace("[DATA]", data_formatada)
+    story.append(Paragraph(_texto(texto_boas_vindas), ESTILO_PARAGRAFO))
+
+    # Informações de presidência
+    story += [
+        _rotulo("Esta Reunião está sendo presidida por:", _campo(detalhes, 'presidido')),
+        _rotulo("E dirigida por:", _campo(detalhes, 'dirigido')),
+        _rotulo("Como recepcionistas:", detalhes.get('recepcionistas') or ''),
+        _rotulo("Como pianista:", _campo(detalhes, 'pianista')),
+        _rotulo("E regente de música:", _campo(detalhes, 'regente_musica')),
+        _divisoria(),
+    ]
+
+    # SEÇÃO: ABERTURA
+    anuncios = [a for a in detalhes.get('anuncios') or [] if a and a.strip()]
+    itens_anuncios = [Paragraph(_texto(a), ESTILO_ITEM, bulletText='•') for a in anuncios] \
+        or [Paragraph("Nenhum anúncio informado", ESTILO_ITEM)]
+    story += _secao(
+        "ABERTURA (6 min)",
+        _rotulo("Reconhecemos a Presença:", detalhes.get('reconhecemos_presenca') or ''),
+        _rotulo("Temos como anúncios:"),
+        *itens_anuncios,
+        Spacer(1, 10),
+        _tabela([
+            ["CANTAREMOS O HINO DE ABERTURA:", "E A PRIMEIRA ORAÇÃO SERÁ FEITA POR:"],
+            [_campo(detalhes, 'hino_abertura'), _campo(detalhes, 'oracao_abertura')],
+        ], [LARGURA_UTIL / 2] * 2, TABELA_DESTAQUE),
+    )
+    story.append(_divisoria())
+
+    # SEÇÃO: AÇÕES
+    story += _secao(
+        "AÇÕES (5 min)",
+        _bloco("DESOBRIGAÇÕES", _texto_template(template, 'desobrigacoes', "É proposto dar um voto de agradecimento aos serviços prestados pelo(a) irmã(o) [NOME] que serviu como [CHAMADO]. Todos os que desejam se manifestar, levantem a mão")),
+        _bloco("APOIOS", _texto_template(template, 'apoios', "O(a) irmã(o) [NOME] está sendo chamado(a) como [CHAMADO]. Todos que forem a favor manifestem-se. Os que forem contrários, manifestem-se")),
+        _bloco("CONFIRMAÇÕES BATISMAIS", _texto_template(template, 'confirmacoes_batismo', "O(a) irmã(o) [NOME] foram batizados, gostaríamos de convida-los(a) para virem até o púlpito para que possamos fazer sua confirmação como Membro de A Igreja de Jesus Cristo dos Santos dos Ultimos Dias.")),
+        _bloco("APOIO A NOVOS MEMBROS", _texto_template(template, 'apoio_membro_novo', "O(a) irmã(o) [NOME] foi batizado e confirmado membro da igreja, e gostarámos do apoio de todos os irmãos de plena aceitação como mais novo membro da ala. Todos a favor, manifestem-se")),
+        _bloco("BENÇÃO DE CRIANÇAS", _texto_template(template, 'bencao_crianca', "Gostaríamos de chamar ao púlpito o irmão [NOME] que irá dar a benção de apresentação da(a) [NOME]")),
+    )
+    story.append(_divisoria())
+
+    # SEÇÃO: SACRAMENTO
+    hino_sacramental = _campo(detalhes, 'hino_sacramental')
+    story += _secao(
+        "SACRAMENTO (10 min)",
+        Paragraph(_texto(f"Passaremos ao Sacramento, que é a parte mais importante de nossa reunião. Cantaremos como Hino Sacramental {hino_sacramental}, o Sacramento será abençoado e distribuído a todos"), ESTILO_PARAGRAFO),
+        Paragraph(f"<b>HINO SACRAMENTAL (3 min):</b> {_texto(hino_sacramental)}", ESTILO_TEXTO),
+    )
+    story.append(_divisoria())
+
+    # SEÇÃO: MENSAGENS
+    mensagens = [Paragraph("Agradecemos a todos pela reverência durante o Sacramento. Passaremos agora a parte dos discursantes. Gostaria de lembrar todos que estejam assitindo a transmissão da reunião, que se identifiquem para que possamos contá-los também", ESTILO_PARAGRAFO)]
+    discursantes = [d for d in detalhes.get('discursantes') or [] if d and d.strip()]
+    if discursantes:
+        linhas = []
+        for i, discursante in enumerate(discursantes):
+            tempo = "3-5 min" if i == 0 else "5-7 min" if i == 1 else "8-10 min"
+            linhas.append([f"{i+1}º ORADOR ({tempo})", discursante])
+        mensagens.append(_tabela(linhas, [120, LARGURA_UTIL - 120], TABELA_DISCURSANTES))
+    if detalhes.get('hino_intermediario'):
+        mensagens.append(Spacer(1, 8))
+        mensagens.append(_rotulo("HINO INTERMEDIÁRIO (3 min):", detalhes['hino_intermediario']))
+    story += _secao("MENSAGENS (35 min)", *mensagens)
+    story.append(_divisoria())
+
+    # SEÇÃO: AGRADECIMENTOS FINAIS
+    hino_encerramento = _campo(detalhes, 'hino_encerramento')
+    oracao_encerramento = _campo(detalhes, 'oracao_encerramento')
+    story += _secao(
+        "AGRADECIMENTOS FINAIS",
+        Paragraph(_texto(f"Agradecemos a presença e participação de todos, especialmente aqueles que contribuíram de alguma forma para que essa reunião acontecesse. E convidamos todos para que estejam aqui no próximo domingo. Ouviremos como último orador o(a) irmã(o) [NOME]. Logo após, cantaremos o hino {hino_encerramento}, e o(a) irmã(o) {oracao_encerramento} oferecerá a última oração. Desejamos a todos uma ótima semana e que o Espírito do Senhor os acompanhe."), ESTILO_PARAGRAFO),
+    )
+
+    # SEÇÃO: ENCERRAMENTO
+    story += _secao(
+        "ENCERRAMENTO (2 min)",
+        _tabela([
+            ["HINO DE ENCERRAMENTO:", "ORAÇÃO DE ENCERRAMENTO:"],
+            [hino_encerramento, oracao_encerramento],
+        ], [LARGURA_UTIL / 2] * 2, TABELA_DESTAQUE),
+    )
+    return story
+
+
+# PDF sacramental formatado e bunitinho (*SAMUEL ESTÁ EM DESENVOLVIMENTO :), AJUSTANDO PARA SER DINAMICA A CADA ALA COM O BD*)
+def gerar_pdf_sacramental(ata, detalhes, template=None, unidade=None):
+    buffer = io.BytesIO()
+    doc = BaseDocTemplate(
+        buffer, pagesize=A4, pageTemplates=_templates_pagina(),
+        leftMargin=MARGEM, rightMargin=MARGEM, topMargin=40, bottomMargin=40,
+        title=f"Ata sacramental {ata['data']}",
+    )
+    doc.build(_story_sacramental(ata, detalhes or {}, template or {}, unidade or {}))
+    return buffer.getvalue()
+
+
+def gerar(tipo, ata, detalhes, template=None, unidade=None):
+    """Gera o PDF do tipo pedido ('simples' ou 'sacramental').
+
+    É o ponto de entrada usado pelos processos de pdf_jobs, então só recebe
+    e devolve valores que podem ser serializados (dicts e bytes).
+    """
+    if tipo == 'sacramental':
+        return gerar_pdf_sacramental(ata, detalhes, template, unidade)
+    if tipo == 'simples':
+        return gerar_pdf_simples(ata, detalhes)
+    raise ValueError(f"Tipo de PDF desconhecido: {tipo}")
@@ -0,0 +1,190 @@
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+# Cache de PDFs endereçado por conteúdo.
+#
+# A chave é o SHA-256 de tudo que alimenta o layout (ata, detalhes, template,
+# unidade e a versão do layout), então um PDF em cache nunca fica desatualizado:
+# se algo muda, a chave muda. As invalidações explícitas (save, exclusão,
+# edição de template/unidade) só liberam espaço na hora certa.
+#
+# Nome de cada entrada: ala<ala>_ata<ata>_tpl<template>_<tipo>_<hash>.pdf
+# O prefixo permite apagar exatamente as entradas de uma ata, ala ou template.
+
+# Aumente quando mudar o desenho dos PDFs, para não servir o layout antigo
+VERSAO_LAYOUT = 2
+
+
+def _serializar(valor):
+    return json.dumps(valor, sort_keys=True, default=str, ensure_ascii=False)
+
+
+class PdfCache:
+    """Cache em dois níveis: LRU em memória (por worker) e pasta em disco (compartilhada)"""
+
+    def __init__(self, pasta, max_memoria_bytes, max_disco_bytes):
+        self.pasta = os.path.abspath(pasta)
+        self.max_memoria_bytes = max_memoria_bytes
+        self.max_disco_bytes = max_disco_bytes
+        self.pid = os.getpid()
+        os.makedirs(self.pasta, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memoria = OrderedDict()
+        self._memoria_bytes = 0
+        self._contadores = {
+            'hits_memoria': 0,
+            'hits_disco': 0,
+            'misses': 0,
+            'gravacoes': 0,
+            'remocoes_lru_memoria': 0,
+            'remocoes_lru_disco': 0,
+            'invalidacoes': 0,
+        }
+
+    @staticmethod
+    def nome_entrada(tipo, ata, detalhes, template=None, unidade=None):
+        """Nome da entrada para este conjunto exato de dados"""
+        conteudo = _serializar([VERSAO_LAYOUT, tipo, ata, detalhes, template, unidade])
+        resumo = hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:32]
+        template_id = (template or {}).get('id') or 0
+        return f"ala{ata['ala_id']}_ata{ata['id']}_tpl{template_id}_{tipo}_{resumo}.pdf"
+
+    @staticmethod
+    def etag(nome):
+        return nome.rsplit('_', 1)[1][:-len('.pdf')]
+
+    def caminho(self, nome):
+        return os.path.join(self.pasta, nome)
+
+    def _contar(self, contador):
+        with self._lock:
+            self._contadores[contador] += 1
+
+    def buscar(self, nome):
+        """('memoria', bytes), ('disco', caminho) ou (None, None)"""
+        with self._lock:
+            dados = self._memoria.get(nome)
+            if dados is not None:
+                self._memoria.move_to_end(nome)
+                self._contadores['hits_memoria'] += 1
+                return 'memoria', dados
+
+        caminho = self.caminho(nome)
+        try:
+            os.utime(caminho)  # mtime = último uso, para a remoção LRU em disco
+        except FileNotFoundError:
+            self._contar('misses')
+            return None, None
+
+        self._contar('hits_disco')
+        return 'disco', caminho
+
+    def guardar(self, nome, dados):
+        """Grava a entrada nos dois níveis (escrita atômica no disco)"""
+        caminho = self.caminho(nome)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'wb') as f:
+            f.write(dados)
+        os.replace(temporario, caminho)
+        self._contar('gravacoes')
+        self._guardar_memoria(nome, dados)
+        self._limitar_disco()
+        return caminho
+
+    def _guardar_memoria(self, nome, dados):
+        if len(dados) > self.max_memoria_bytes:
+            return
+        with self._lock:
+            anterior = self._memoria.pop(nome, None)
+            if anterior is not None:
+                self._memoria_bytes -= len(anterior)
+            self._memoria[nome] = dados
+            self._memoria_bytes += len(dados)
+            while self._memoria_bytes > self.max_memoria_bytes:
+                _, removido = self._memoria.popitem(last=False)
+                self._memoria_bytes -= len(removido)
+                self._contadores['remocoes_lru_memoria'] += 1
+
+    def _limitar_disco(self):
+        """Remove os PDFs usados há mais tempo até a pasta caber no limite"""
+        entradas = []
+        total = 0
+        for entrada in os.scandir(self.pasta):
+            if entrada.name.endswith('.pdf'):
+                info = entrada.stat()
+                entradas.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+        if total <= self.max_disco_bytes:
+            return
+        entradas.sort()
+        for _, tamanho, caminho in entradas:
+            if total <= self.max_disco_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+            self._contar('remocoes_lru_disco')
+
+    def invalidar(self, ala_id=None, ata_id=None, template_id=None):
+        """Apaga as entradas da ata, da ala e/ou do template informados"""
+        padrao = (
+            f"ala{ala_id if ala_id is not None else '*'}"
+            f"_ata{ata_id if ata_id is not None else '*'}"
+            f"_tpl{template_id if template_id is not None else '*'}_*.pdf"
+        )
+        removidas = 0
+        for caminho in glob.glob(os.path.join(glob.escape(self.pasta), padrao)):
+            try:
+                os.remove(caminho)
+                removidas += 1
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            for nome in [n for n in self._memoria if fnmatch.fnmatchcase(n, padrao)]:
+                self._memoria_bytes -= len(self._memoria.pop(nome))
+                removidas += 1
+            self._contadores['invalidacoes'] += removidas
+        return removidas
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats['entradas_memoria'] = len(self._memoria)
+            stats['bytes_memoria'] = self._memoria_bytes
+        consultas = stats['hits_memoria'] + stats['hits_disco'] + stats['misses']
+        stats['taxa_acerto'] = round((stats['hits_memoria'] + stats['hits_disco']) / consultas, 3) if consultas else None
+        stats['pid'] = self.pid
+        stats['pasta'] = self.pasta
+        stats['max_memoria_bytes'] = self.max_memoria_bytes
+        stats['max_disco_bytes'] = self.max_disco_bytes
+        return stats
+
+
+def init_app(app):
+    app.config.setdefault('PDF_CACHE_DIR', os.environ.get('PDF_CACHE_DIR', 'database/pdf_cache'))
+    app.config.setdefault('PDF_CACHE_MEMORIA_MB', int(os.environ.get('PDF_CACHE_MEMORIA_MB', 32)))
+    app.config.setdefault('PDF_CACHE_DISCO_MB', int(os.environ.get('PDF_CACHE_DISCO_MB', 256)))
+
+
+def get_cache(app=None):
+    """Cache do processo atual (a parte em memória não é compartilhada entre workers)"""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('pdf_cache')
+    if cache is None or cache.pid != os.getpid():
+        cache = PdfCache(
+            app.config['PDF_CACHE_DIR'],
+            max_memoria_bytes=app.config['PDF_CACHE_MEMORIA_MB'] * 1024 * 1024,
+            max_disco_bytes=app.config['PDF_CACHE_DISCO_MB'] * 1024 * 1024,
+        )
+        app.extensions['pdf_cache'] = cache
+    return cache
@@ -0,0 +1,321 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from flask import current_app
+import pdf
+
+# Fila de geração de PDFs em processos separados.
+#
+# O ReportLab é CPU puro; rodando no worker eventlet ele trava o hub e, com
+# ele, todas as salas do Socket.IO. Aqui cada PDF vai para um
+# ProcessPoolExecutor e quem precisa do resultado espera de forma cooperativa
+# (socketio.sleep entre consultas), liberando o hub para as outras conexões.
+#
+# Limites: PDF_FILA_MAX jobs ainda não concluídos por worker (além disso,
+# FilaCheia) e PDF_TIMEOUT segundos por job (além disso, TempoEsgotado).
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+PRONTO = 'pronto'
+ERRO = 'erro'
+EXPIRADO = 'expirado'
+
+# Jobs concluídos ficam consultáveis por este tempo
+RETENCAO_SEGUNDOS = 600
+
+
+class FilaCheia(Exception):
+    """Já há jobs demais esperando processamento"""
+
+
+class TempoEsgotado(Exception):
+    """O job passou do tempo limite"""
+
+
+class JobPdf:
+    def __init__(self, nome, tipo, ata_id, future, criado):
+        self.id = uuid.uuid4().hex
+        self.nome = nome          # nome da entrada no pdf_cache
+        self.tipo = tipo
+        self.ata_id = ata_id
+        self.future = future
+        self.criado = criado
+        self.concluido = None
+        self.expirado = False
+        self.erro = None
+        self.compartilhado = False  # reaproveitado por outra requisição
+
+    @property
+    def status(self):
+        if self.expirado:
+            return EXPIRADO
+        if self.future.done():
+            return ERRO if self.erro or self.future.cancelled() else PRONTO
+        return EXECUTANDO if self.future.running() else PENDENTE
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'ata_id': self.ata_id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'criado': self.criado,
+            'concluido': self.concluido,
+            'erro': self.erro,
+        }
+
+
+class FilaPdf:
+    def __init__(self, processos, max_fila, timeout, cache, dormir=time.sleep):
+        self.processos = processos
+        self.max_fila = max_fila
+        self.timeout = timeout
+        self.cache = cache
+        self.dormir = dormir
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = {}
+        self._por_nome = {}  # nome da entrada -> job em andamento (evita gerar o mesmo PDF duas vezes)
+        self._contadores = {
+            'submetidos': 0,
+            'reaproveitados': 0,
+            'concluidos': 0,
+            'erros': 0,
+            'expirados': 0,
+            'recusados_fila_cheia': 0,
+            'tempo_render_total_ms': 0.0,
+        }
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: o processo filho não herda o estado do eventlet do worker
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processos,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    def _em_andamento(self):
+        return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def _limpar(self):
+        limite = time.time() - RETENCAO_SEGUNDOS
+        for job_id in [j.id for j in self._jobs.values() if j.concluido and j.concluido < limite]:
+            del self._jobs[job_id]
+
+    def submeter(self, nome, tipo, ata, detalhes, template=None, unidade=None):
+        """Enfileira a geração do PDF e devolve o job (ou o job já em andamento para o mesmo PDF)"""
+        with self._lock:
+            existente = self._por_nome.get(nome)
+            # Um job expirado que ainda roda não é reaproveitado: quem chega agora ganha um novo
+            if existente is not None and not existente.future.done() and not existente.expirado:
+                self._contadores['reaproveitados'] += 1
+                existente.compartilhado = True
+                return existente
+
+            self._limpar()
+            if self._em_andamento() >= self.max_fila:
+                self._contadores['recusados_fila_cheia'] += 1
+                raise FilaCheia(f"{self.max_fila} PDFs já estão na fila")
+
+            criado = time.time()
+            future = self._get_executor().submit(pdf.gerar, tipo, ata, detalhes, template, unidade)
+            job = JobPdf(nome, tipo, ata['id'], future, criado)
+            self._jobs[job.id] = job
+            self._por_nome[nome] = job
+            self._contadores['submetidos'] += 1
+
+        future.add_done_callback(lambda f, job=job: self._finalizar(job))
+        return job
+
+    def _finalizar(self, job):
+        """Roda quando o processo devolve o resultado: grava no cache e atualiza contadores"""
+        job.concluido = time.time()
+        erro = None
+        if job.future.cancelled():
+            erro = 'cancelado'
+        else:
+            erro = job.future.exception()
+        if erro is None:
+            try:
+                self.cache.guardar(job.nome, job.future.result())
+            except OSError as e:
+                erro = e
+        with self._lock:
+            if self._por_nome.get(job.nome) is job:
+                del self._por_nome[job.nome]
+            if erro is not None:
+                job.erro = str(erro)
+                self._contadores['erros'] += 1
+            else:
+                self._contadores['concluidos'] += 1
+                self._contadores['tempo_render_total_ms'] += (job.concluido - job.criado) * 1000
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def aguardar(self, job):
+        """Espera o job sem bloquear o hub: consulta future.done() e cede a vez entre as consultas.
+        O prazo conta de quando esta chamada começa, não de quando o job (talvez compartilhado) foi criado."""
+        intervalo = 0.01
+        limite = time.time() + self.timeout
+        while not job.future.done():
+            if time.time() >= limite:
+                self.expirar(job)
+                raise TempoEsgotado(f"PDF não ficou pronto em {self.timeout}s")
+            self.dormir(intervalo)
+            intervalo = min(intervalo * 2, 0.1)
+        if job.erro or job.future.exception() is not None:
+            raise RuntimeError(job.erro or job.future.exception())
+        return job.future.result()
+
+    def renderizar_varios(self, itens, janela=None):
+        """Gera vários PDFs com no máximo `janela` jobs em andamento ao mesmo tempo.
+
+        itens: iterável (pode ser preguiçoso) de (chave, nome, tipo, ata, detalhes, template, unidade).
+        Devolve (chave, pdf, erro) na ordem em que cada PDF fica pronto; pdf é None quando houve erro.
+        """
+        janela = max(1, min(janela or self.max_fila, self.max_fila))
+        itens = iter(itens)
+        em_andamento = []
+        proximo = None
+        fila_cheia_desde = None
+        intervalo = 0.01
+
+        while True:
+            while len(em_andamento) < janela:
+                if proximo is None:
+                    proximo = next(itens, None)
+                    if proximo is None:
+                        break
+                chave, nome = proximo[0], proximo[1]
+
+                nivel, conteudo = self.cache.buscar(nome)
+                if nivel is not None:
+                    proximo = None
+                    if nivel == 'disco':
+                        with open(conteudo, 'rb') as f:
+                            conteudo = f.read()
+                    yield chave, conteudo, None
+                    continue
+
+                try:
+                    job = self.submeter(nome, *proximo[2:])
+                except FilaCheia:
+                    # Outras requisições ocupam a fila: espera abrir vaga, mas não para sempre
+                    fila_cheia_desde = fila_cheia_desde or time.time()
+                    if not em_andamento and time.time() - fila_cheia_desde > self.timeout:
+                        proximo = None
+                        yield chave, None, 'fila cheia'
+                        continue
+                    break
+                fila_cheia_desde = None
+                proximo = None
+                em_andamento.append((chave, job, time.time() + self.timeout))
+
+            if not em_andamento and proximo is None:
+                return
+
+            prontos = [item for item in em_andamento if item[1].future.done()]
+            agora = time.time()
+            expirados = []
+            for item in em_andamento:
+                if item not in prontos and agora >= item[2]:
+                    self.expirar(item[1])
+                    expirados.append(item)
+            prontos += expirados
+
+            if not prontos:
+                self.dormir(intervalo)
+                intervalo = min(intervalo * 2, 0.1)
+                continue
+
+            intervalo = 0.01
+            for item in prontos:
+                em_andamento.remove(item)
+                chave, job, _ = item
+                if item in expirados:
+                    resultado = (chave, None, 'tempo esgotado')
+                elif job.future.cancelled() or job.future.exception() is not None:
+                    resultado = (chave, None, job.erro or str(job.future.exception()))
+                else:
+                    resultado = (chave, job.future.result(), None)
+                self._descartar(job)
+                yield resultado
+
+    def _descartar(self, job):
+        """Tira o job da lista consultável (os lotes não são consultados pela API e o PDF já está no cache)"""
+        with self._lock:
+            if not job.compartilhado:
+                self._jobs.pop(job.id, None)
+
+    def expirar(self, job):
+        """Marca o job como expirado; se ainda não começou, sai da fila"""
+        job.future.cancel()
+        with self._lock:
+            if not job.expirado:
+                job.expirado = True
+                self._contadores['expirados'] += 1
+
+    def renderizar(self, nome, tipo, ata, detalhes, template=None, unidade=None):
+        """Submete e espera: o caminho usado pelas rotas de exportação"""
+        return self.aguardar(self.submeter(nome, tipo, ata, detalhes, template, unidade))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats['em_andamento'] = self._em_andamento()
+            stats['jobs_retidos'] = len(self._jobs)
+        stats['tempo_render_total_ms'] = round(stats['tempo_render_total_ms'], 2)
+        stats.update(pid=self.pid, processos=self.processos, max_fila=self.max_fila, timeout=self.timeout)
+        return stats
+
+
+class FilaLocal(FilaPdf):
+    """Sem processos (PDF_PROCESSOS=0): gera na hora, no próprio worker. Útil em desenvolvimento."""
+
+    def _get_executor(self):
+        return _ExecutorLocal()
+
+
+class _ExecutorLocal:
+    def submit(self, funcao, *args):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(funcao(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def init_app(app, dormir=time.sleep):
+    """dormir deve ceder a vez ao hub (socketio.sleep no modo eventlet)"""
+    app.config.setdefault('PDF_PROCESSOS', int(os.environ.get('PDF_PROCESSOS', min(2, os.cpu_count() or 1))))
+    app.config.setdefault('PDF_FILA_MAX', int(os.environ.get('PDF_FILA_MAX', 16)))
+    app.config.setdefault('PDF_TIMEOUT', float(os.environ.get('PDF_TIMEOUT', 30)))
+    app.extensions['pdf_jobs_dormir'] = dormir
+
+
+def get_fila(app=None):
+    """Fila do processo atual (recriada após fork)"""
+    import pdf_cache
+    app = app or current_app._get_current_object()
+    fila = app.extensions.get('pdf_jobs')
+    if fila is None or fila.pid != os.getpid():
+        classe = FilaPdf if app.config['PDF_PROCESSOS'] > 0 else FilaLocal
+        fila = classe(
+            app.config['PDF_PROCESSOS'],
+            max_fila=app.config['PDF_FILA_MAX'],
+            timeout=app.config['PDF_TIMEOUT'],
+            cache=pdf_cache.get_cache(app),
+            dormir=app.extensions.get('pdf_jobs_dormir', time.sleep),
+        )
+        app.extensions['pdf_jobs'] = fila
+    return fila
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from flask import current_app
+from db import get_db
+
+# Registro em memória da tabela templates.
+#
+# Os templates mudam raramente (salvar/criar/apagar em Configurações), mas são
+# lidos em toda visualização e exportação de ata. Cada worker carrega a tabela
+# inteira uma vez e depois só confere versoes_cache.versao (mantida por
+# triggers, migração 0005), no máximo a cada TEMPLATES_VERIFICAR_SEGUNDOS.
+# Dentro desse intervalo as leituras não fazem nenhuma consulta; uma edição
+# feita em outro worker aparece aqui em até esse tempo, e no próprio worker
+# na hora (invalidar()).
+
+NOME_SACRAMENTAL_PADRAO = 'Sacramental Padrão'
+
+
+class RegistroTemplates:
+    def __init__(self, intervalo_verificacao):
+        self.intervalo_verificacao = intervalo_verificacao
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._versao = None
+        self._templates = []
+        self._por_id = {}
+        self._verificado_em = 0.0
+        self._contadores = {
+            'leituras': 0,
+            'verificacoes': 0,
+            'recargas': 0,
+        }
+
+    def _atualizar(self):
+        """Recarrega a tabela se o contador do banco mudou (ou se passou do intervalo sem conferir)"""
+        agora = time.monotonic()
+        with self._lock:
+            self._contadores['leituras'] += 1
+            if self._versao is not None and agora - self._verificado_em < self.intervalo_verificacao:
+                return
+
+        conn = get_db()
+        versao = conn.execute("SELECT versao FROM versoes_cache WHERE nome = 'templates'").fetchone()
+        versao = versao[0] if versao else 0
+        with self._lock:
+            self._contadores['verificacoes'] += 1
+            self._verificado_em = agora
+            if versao == self._versao:
+                return
+
+        # Versão lida antes das linhas: se alguém gravar no meio, a próxima verificação recarrega de novo
+        templates = [dict(t) for t in conn.execute("SELECT * FROM templates ORDER BY id")]
+        with self._lock:
+            self._templates = templates
+            self._por_id = {t['id']: t for t in templates}
+            self._versao = versao
+            self._contadores['recargas'] += 1
+
+    def invalidar(self):
+        """Força conferir a versão na próxima leitura (chamar depois de gravar em templates)"""
+        with self._lock:
+            self._verificado_em = 0.0
+
+    def versao(self):
+        """Versão atual da tabela templates (muda a cada escrita, migração 0005)"""
+        self._atualizar()
+        return self._versao
+
+    def todos(self):
+        """Cópia de todos os templates, em ordem de id"""
+        self._atualizar()
+        return [dict(t) for t in self._templates]
+
+    def por_id(self, template_id):
+        self._atualizar()
+        template = self._por_id.get(template_id)
+        return dict(template) if template else None
+
+    def sacramental(self):
+        """Template usado nas atas sacramentais: 'Sacramental Padrão' ou o primeiro do tipo 1"""
+        self._atualizar()
+        templates = self._templates
+        template = next((t for t in templates if t['nome'] == NOME_SACRAMENTAL_PADRAO), None)
+        if template is None:
+            template = next((t for t in templates if str(t['tipo_template']) == '1'), None)
+        return dict(template) if template else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats['versao'] = self._versao
+            stats['templates'] = len(self._templates)
+        stats['pid'] = self.pid
+        stats['intervalo_verificacao'] = self.intervalo_verificacao
+        return stats
+
+
+def init_app(app):
+    app.config.setdefault('TEMPLATES_VERIFICAR_SEGUNDOS', float(os.environ.get('TEMPLATES_VERIFICAR_SEGUNDOS', 5)))
+
+
+def get_registro(app=None):
+    """Registro do processo atual (recriado após fork)"""
+    app = app or current_app._get_current_object()
+    registro = app.extensions.get('registro_templates')
+    if registro is None or registro.pid != os.getpid():
+        registro = RegistroTemplates(app.config['TEMPLATES_VERIFICAR_SEGUNDOS'])
+        app.extensions['registro_templates'] = registro
+    return registro
@@ -0,0 +1,550 @@
+// Edição colaborativa em tempo real.
+// O formulário marcado com data-colaboracao envia cada alteração de campo
+// (field_update), recebe o estado completo ao entrar (estado_inicial) e aplica
+// os lotes que o servidor agrupa (fields_update). A sala é escolhida pelo
+// servidor a partir dos campos ocultos editar/tipo/data do formulário.
+//
+// Para listas que crescem (discursantes[], batizados[]), a página pode
+// registrar em window.colaboracaoAdicionar[nome] a função que cria mais um campo.
+//
+// Campos longos (lista 'delta' do estado_inicial) não mandam o valor inteiro:
+// mandam field_delta com a operação de texto (formato de deltas.py) sobre a
+// revisão que o cliente conhece, no máximo uma por vez por campo. O que for
+// digitado enquanto ela não volta confirmada vai na próxima. Operações dos
+// outros chegam em fields_delta e são transformadas contra o que ainda não foi
+// confirmado antes de entrar no campo.
+//
+// Com data-esquema no formulário o cliente pede o modo compacto no join: os
+// eventos frequentes passam a ir e vir como bytes no evento 'b' (formato de
+// compacto.py), com os nomes dos campos trocados pelos números do esquema. Se o
+// servidor não confirmar no estado_inicial, tudo continua em JSON.
+(function () {
+  const form = document.querySelector('form[data-colaboracao]');
+  if (!form || typeof io === 'undefined') return;
+
+  function valorOculto(nome) {
+    const campo = form.querySelector('input[type="hidden"][name="' + nome + '"]');
+    return campo ? campo.value : '';
+  }
+
+  const esquema = form.dataset.esquema && typeof TextEncoder !== 'undefined' ? JSON.parse(form.dataset.esquema) : null;
+  let compacto = false;  // confirmado pelo servidor no estado_inicial
+  let eu = null;         // nosso autor no modo compacto (crc32 do sid)
+
+  const socket = io();
+  // Reconexão também entra de novo na sala e recebe o estado atualizado
+  socket.on('connect', function () {
+    compacto = false;
+    const dados = { editar: valorOculto('editar'), tipo: valorOculto('tipo'), data: valorOculto('data') };
+    if (esquema) dados.compacto = esquema.versao;
+    socket.emit('join', dados);
+  });
+
+  function enviar(evento, dados) {
+    if (compacto) socket.emit('b', codificar(evento, dados));
+    else socket.emit(evento, dados);
+  }
+
+  function meu(autor) {
+    return autor !== undefined && autor === (compacto ? eu : socket.id);
+  }
+
+  // Campos repetidos (ex.: discursantes[]) são identificados pela posição: "discursantes[]#1"
+  function camposComNome(nome) {
+    return form.querySelectorAll('[name="' + CSS.escape(nome) + '"]');
+  }
+
+  function chaveDoCampo(campo) {
+    const iguais = camposComNome(campo.name);
+    if (iguais.length <= 1) return campo.name;
+    return campo.name + '#' + Array.prototype.indexOf.call(iguais, campo);
+  }
+
+  function campoDaChave(chave) {
+    const partes = chave.split('#');
+    const indice = partes.length > 1 ? parseInt(partes[1], 10) : 0;
+    const adicionar = (window.colaboracaoAdicionar || {})[partes[0]];
+    // Cria os campos que faltam na lista (quem entrou depois tem menos campos na tela)
+    while (adicionar && camposComNome(partes[0]).length <= indice) {
+      const antes = camposComNome(partes[0]).length;
+      adicionar();
+      if (camposComNome(partes[0]).length === antes) break;
+    }
+    return camposComNome(partes[0])[indice];
+  }
+
+  function aplicar(chave, valor) {
+    const campo = campoDaChave(chave);
+    if (!campo) return;
+    if (campo.type === 'checkbox' || campo.type === 'radio') {
+      campo.checked = !!valor;
+      return;
+    }
+    if (campo.value === valor) return;
+    // Mantém o cursor de quem está digitando no mesmo campo
+    const focado = campo === document.activeElement && typeof campo.selectionStart === 'number';
+    const inicio = focado ? campo.selectionStart : null;
+    const fim = focado ? campo.selectionEnd : null;
+    campo.value = valor;
+    if (focado) campo.setSelectionRange(Math.min(inicio, valor.length), Math.min(fim, valor.length));
+  }
+
+  // ---- Operações de texto (mesmo formato e regras de deltas.py) ----
+  // n > 0 mantém n caracteres, n < 0 apaga -n, string insere. Tamanhos em
+  // unidades UTF-16, que é o que String.length conta.
+  function acrescentar(ops, c) {
+    if (c === 0 || c === '') return;
+    const n = ops.length;
+    if (n) {
+      const ultimo = ops[n - 1];
+      if (typeof c === 'string') {
+        if (typeof ultimo === 'string') { ops[n - 1] = ultimo + c; return; }
+        if (ultimo < 0) {
+          if (n > 1 && typeof ops[n - 2] === 'string') ops[n - 2] += c;
+          else ops.splice(n - 1, 0, c);
+          return;
+        }
+      } else if (typeof ultimo !== 'string' && (ultimo > 0) === (c > 0)) {
+        ops[n - 1] = ultimo + c;
+        return;
+      }
+    }
+    ops.push(c);
+  }
+
+  function aplicarOp(texto, op) {
+    let posicao = 0;
+    let saida = '';
+    op.forEach(function (c) {
+      if (typeof c === 'string') {
+        saida += c;
+        return;
+      }
+      if (c > 0) saida += texto.slice(posicao, posicao + c);
+      posicao += Math.abs(c);
+    });
+    if (posicao !== texto.length) throw new Error('operação não cobre o texto');
+    return saida;
+  }
+
+  // [a', b'] com aplicar(aplicar(t, a), b') === aplicar(aplicar(t, b), a'); empate de inserção: a antes
+  function transformar(a, b) {
+    const aLinha = [];
+    const bLinha = [];
+    let i = 0;
+    let j = 0;
+    let x = a[0];
+    let y = b[0];
+    while (x !== undefined || y !== undefined) {
+      if (typeof x === 'string') {
+        acrescentar(aLinha, x);
+        acrescentar(bLinha, x.length);
+        x = a[++i];
+        continue;
+      }
+      if (typeof y === 'string') {
+        acrescentar(aLinha, y.length);
+        acrescentar(bLinha, y);
+        y = b[++j];
+        continue;
+      }
+      if (x === undefined || y === undefined) throw new Error('operações sobre textos diferentes');
+      const passo = Math.min(Math.abs(x), Math.abs(y));
+      if (x > 0 && y > 0) {
+        acrescentar(aLinha, passo);
+        acrescentar(bLinha, passo);
+      } else if (x < 0 && y > 0) {
+        acrescentar(aLinha, -passo);
+      } else if (x > 0 && y < 0) {
+        acrescentar(bLinha, -passo);
+      }
+      x = x > 0 ? x - passo : x + passo;
+      if (x === 0) x = a[++i];
+      y = y > 0 ? y - passo : y + passo;
+      if (y === 0) y = b[++j];
+    }
+    return [aLinha, bLinha];
+  }
+
+  // Uma operação equivalente a aplicar a e depois b
+  function compor(a, b) {
+    const saida = [];
+    let i = 0;
+    let j = 0;
+    let x = a[0];
+    let y = b[0];
+    while (x !== undefined || y !== undefined) {
+      if (typeof x === 'number' && x < 0) {
+        acrescentar(saida, x);
+        x = a[++i];
+        continue;
+      }
+      if (typeof y === 'string') {
+        acrescentar(saida, y);
+        y = b[++j];
+        continue;
+      }
+      if (x === undefined || y === undefined) throw new Error('operações não encadeiam');
+      const tamanhoX = typeof x === 'string' ? x.length : x;
+      const passo = Math.min(tamanhoX, Math.abs(y));
+      if (y > 0) acrescentar(saida, typeof x === 'string' ? x.slice(0, passo) : passo);
+      else if (typeof x !== 'string') acrescentar(saida, -passo);
+      // inserção de a apagada por b: as duas somem
+      if (typeof x === 'string') x = x.length > passo ? x.slice(passo) : a[++i];
+      else x = x > passo ? x - passo : a[++i];
+      y = y > 0 ? (y > passo ? y - passo : b[++j]) : (-y > passo ? y + passo : b[++j]);
+    }
+    return saida;
+  }
+
+  function diferenca(antes, depois) {
+    const limite = Math.min(antes.length, depois.length);
+    let inicio = 0;
+    while (inicio < limite && antes.charCodeAt(inicio) === depois.charCodeAt(inicio)) inicio++;
+    let fim = 0;
+    while (fim < limite - inicio &&
+           antes.charCodeAt(antes.length - fim - 1) === depois.charCodeAt(depois.length - fim - 1)) fim++;
+    // Não corta um par substituto (emoji) ao meio
+    if (inicio && antes.charCodeAt(inicio - 1) >= 0xD800 && antes.charCodeAt(inicio - 1) <= 0xDBFF) inicio--;
+    if (fim && antes.charCodeAt(antes.length - fim) >= 0xDC00 && antes.charCodeAt(antes.length - fim) <= 0xDFFF) fim--;
+    const ops = [];
+    acrescentar(ops, inicio);
+    acrescentar(ops, depois.slice(inicio, depois.length - fim));
+    acrescentar(ops, -(antes.length - inicio - fim));
+    acrescentar(ops, fim);
+    return ops;
+  }
+
+  function moverCursor(posicao, op) {
+    let i = 0;
+    let nova = posicao;
+    for (let k = 0; k < op.length && i < posicao; k++) {
+      const c = op[k];
+      if (typeof c === 'string') {
+        nova += c.length;
+      } else if (c > 0) {
+        i += c;
+      } else {
+        nova -= Math.min(-c, posicao - i);
+        i -= c;
+      }
+    }
+    return nova;
+  }
+
+  // ---- Modo compacto (mesmo formato de compacto.py) ----
+  const idsDoEsquema = {};
+  if (esquema) esquema.campos.forEach(function (nome, i) { idsDoEsquema[nome] = i + 1; });
+  const utf8 = esquema ? new TextEncoder() : null;
+  const deUtf8 = esquema ? new TextDecoder() : null;
+
+  function escreverVarint(saida, n) {
+    while (n > 0x7F) {
+      saida.push((n % 128) | 0x80);
+      n = Math.floor(n / 128);
+    }
+    saida.push(n);
+  }
+
+  function escreverBytes(saida, bytes, marca) {
+    escreverVarint(saida, marca === undefined ? bytes.length : bytes.length * 4 + marca);
+    for (let i = 0; i < bytes.length; i++) saida.push(bytes[i]);
+  }
+
+  function escreverCampo(saida, chave) {
+    const partes = chave.split('#');
+    const id = idsDoEsquema[partes[0]] || 0;
+    escreverVarint(saida, id * 2 + (partes.length > 1 ? 1 : 0));
+    if (!id) escreverBytes(saida, utf8.encode(partes[0]));
+    if (partes.length > 1) escreverVarint(saida, parseInt(partes[1], 10));
+  }
+
+  function codificar(evento, dados) {
+    const saida = [];
+    if (evento === 'field_update') {
+      saida.push(1);
+      escreverCampo(saida, dados.name);
+      const valor = dados.value;
+      if (valor === true) saida.push(1);
+      else if (valor === false) saida.push(2);
+      else if (valor === null || valor === undefined) saida.push(3);
+      else {
+        saida.push(0);
+        escreverBytes(saida, utf8.encode(String(valor)));
+      }
+    } else {
+      saida.push(2);
+      escreverCampo(saida, dados.name);
+      escreverVarint(saida, dados.rev);
+      escreverVarint(saida, dados.op.length);
+      dados.op.forEach(function (c) {
+        if (typeof c === 'string') escreverBytes(saida, utf8.encode(c), 2);
+        else if (c > 0) escreverVarint(saida, c * 4);
+        else escreverVarint(saida, -c * 4 + 1);
+      });
+    }
+    return new Uint8Array(saida).buffer;
+  }
+
+  function leitor(dados) {
+    const bytes = dados instanceof ArrayBuffer ? new Uint8Array(dados)
+      : new Uint8Array(dados.buffer, dados.byteOffset, dados.byteLength);
+    let posicao = 0;
+    const l = {
+      byte: function () {
+        if (posicao >= bytes.length) throw new Error('mensagem truncada');
+        return bytes[posicao++];
+      },
+      varint: function () {
+        let n = 0;
+        let fator = 1;
+        let b;
+        do {
+          b = l.byte();
+          n += (b & 0x7F) * fator;
+          fator *= 128;
+        } while (b & 0x80);
+        return n;
+      },
+      bruto: function (tamanho) {
+        if (posicao + tamanho > bytes.length) throw new Error('mensagem truncada');
+        posicao += tamanho;
+        return deUtf8.decode(bytes.subarray(posicao - tamanho, posicao));
+      },
+      texto: function () { return l.bruto(l.varint()); },
+      u32: function () {
+        return l.byte() + l.byte() * 0x100 + l.byte() * 0x10000 + l.byte() * 0x1000000;
+      },
+      campo: function () {
+        const cabecalho = l.varint();
+        const id = Math.floor(cabecalho / 2);
+        const nome = id ? esquema.campos[id - 1] : l.texto();
+        return cabecalho % 2 ? nome + '#' + l.varint() : nome;
+      },
+      op: function () {
+        const op = [];
+        for (let n = l.varint(); n > 0; n--) {
+          const c = l.varint();
+          const tamanho = Math.floor(c / 4);
+          if (c % 4 === 2) op.push(l.bruto(tamanho));
+          else op.push(c % 4 === 1 ? -tamanho : tamanho);
+        }
+        return op;
+      }
+    };
+    return l;
+  }
+
+  // [evento, mensagem no mesmo formato do JSON]; autores viram números (ver meu())
+  function decodificar(dados) {
+    const l = leitor(dados);
+    const tipo = l.byte();
+    if (tipo === 3) {
+      const lote = { campos: {}, autores: {}, revisoes: {} };
+      for (let n = l.varint(); n > 0; n--) {
+        const chave = l.campo();
+        const marca = l.byte();
+        lote.campos[chave] = marca === 0 ? l.texto() : (marca === 1 ? true : (marca === 2 ? false : null));
+        const autor = l.u32();
+        if (autor) lote.autores[chave] = autor;
+        const rev = l.varint();
+        if (rev) lote.revisoes[chave] = rev - 1;
+      }
+      return ['fields_update', lote];
+    }
+    if (tipo === 4) {
+      const lote = { deltas: [], checkpoints: {} };
+      for (let n = l.varint(); n > 0; n--) {
+        const chave = l.campo();
+        const rev = l.varint();
+        const autor = l.u32();
+        lote.deltas.push([chave, rev, autor, l.op()]);
+      }
+      for (let n = l.varint(); n > 0; n--) {
+        const chave = l.campo();
+        const rev = l.varint();
+        lote.checkpoints[chave] = [rev, l.texto()];
+      }
+      return ['fields_delta', lote];
+    }
+    if (tipo === 5) return ['update_users', { count: l.varint() }];
+    throw new Error('tipo de mensagem desconhecido: ' + tipo);
+  }
+
+  // ---- Estado dos campos longos ----
+  // rev: última revisão do servidor aplicada; base: texto nessa revisão;
+  // pendente: operação enviada esperando confirmação; espera: o que foi digitado
+  // depois dela (composto), ainda não enviado; ultimo: valor do campo na tela.
+  let camposDelta = [];
+  let revisoesIniciais = {};
+  let deltas = {};
+
+  function chaveNormalizada(chave) {
+    const partes = chave.split('#');
+    return partes[0].endsWith('[]') ? partes[0] + '#' + (partes[1] || 0) : partes[0];
+  }
+
+  function ehDelta(chave) {
+    return camposDelta.indexOf(chave.split('#')[0]) !== -1;
+  }
+
+  function estadoDelta(chave) {
+    if (!deltas[chave]) {
+      deltas[chave] = { rev: revisoesIniciais[chave] || 0, base: '', pendente: null, espera: null, ultimo: '' };
+    }
+    return deltas[chave];
+  }
+
+  function mudaTexto(op) {
+    return op.some(function (c) { return typeof c === 'string' || c < 0; });
+  }
+
+  function enviarEspera(chave, estado) {
+    if (estado.pendente || !estado.espera) return;
+    estado.pendente = estado.espera;
+    estado.espera = null;
+    enviar('field_delta', { name: chave, rev: estado.rev, op: estado.pendente });
+  }
+
+  // Cada input vira uma operação precisa (um trecho), somada ao que ainda não saiu
+  function registrarDigitacao(chave, campo) {
+    const estado = estadoDelta(chave);
+    const op = diferenca(estado.ultimo, campo.value);
+    estado.ultimo = campo.value;
+    if (!mudaTexto(op)) return;
+    estado.espera = estado.espera ? compor(estado.espera, op) : op;
+    enviarEspera(chave, estado);  // só sai se não houver outra esperando confirmação
+  }
+
+  // Valor inteiro vindo do servidor (entrada, resync, checkpoint divergente)
+  function adotar(chave, rev, valor) {
+    deltas[chave] = { rev: rev, base: valor, pendente: null, espera: null, ultimo: valor };
+    aplicar(chave, valor);
+  }
+
+  function pedirResync(chave) {
+    socket.emit('field_resync', { name: chave });
+  }
+
+  function aplicarOpNoCampo(campo, op) {
+    const focado = campo === document.activeElement && typeof campo.selectionStart === 'number';
+    const inicio = focado ? campo.selectionStart : null;
+    const fim = focado ? campo.selectionEnd : null;
+    campo.value = aplicarOp(campo.value, op);
+    if (focado) campo.setSelectionRange(moverCursor(inicio, op), moverCursor(fim, op));
+  }
+
+  form.addEventListener('input', function (evento) {
+    const campo = evento.target;
+    if (!campo.name || campo.type === 'hidden') return;
+    const chave = chaveDoCampo(campo);
+    if (ehDelta(chave)) {
+      registrarDigitacao(chaveNormalizada(chave), campo);
+      return;
+    }
+    const valor = (campo.type === 'checkbox' || campo.type === 'radio') ? campo.checked : campo.value;
+    enviar('field_update', { name: chave, value: valor });
+  });
+
+  // Estado completo da sala ao entrar (inclui o que os outros digitaram antes)
+  socket.on('estado_inicial', function (estado) {
+    compacto = !!estado.compacto;
+    eu = estado.eu;
+    camposDelta = estado.delta || [];
+    revisoesIniciais = estado.revisoes || {};
+    deltas = {};
+    Object.keys(estado.campos).forEach(function (chave) {
+      if (ehDelta(chave)) adotar(chave, revisoesIniciais[chave] || 0, estado.campos[chave] || '');
+      else aplicar(chave, estado.campos[chave]);
+    });
+  });
+
+  // Lote agrupado pelo servidor: só o último valor de cada campo
+  function receberCampos(lote) {
+    const autores = lote.autores || {};
+    const revisoes = lote.revisoes || {};
+    Object.keys(lote.campos).forEach(function (chave) {
+      if (meu(autores[chave])) return;
+      if (chave in revisoes) adotar(chave, revisoes[chave], lote.campos[chave] || '');
+      else aplicar(chave, lote.campos[chave]);
+    });
+  }
+
+  // Operações dos campos longos, em ordem de revisão; as nossas voltam como confirmação
+  function receberDeltas(lote) {
+    const foraDeSincronia = {};
+    lote.deltas.forEach(function (delta) {
+      const chave = delta[0];
+      const rev = delta[1];
+      const op = delta[3];
+      if (foraDeSincronia[chave]) return;
+      const estado = estadoDelta(chave);
+      if (rev <= estado.rev) return;
+      if (rev > estado.rev + 1) {
+        foraDeSincronia[chave] = true;
+        pedirResync(chave);
+        return;
+      }
+      try {
+        if (meu(delta[2]) && estado.pendente) {
+          // Confirmação da nossa operação (já rebaseada pelo servidor)
+          estado.base = aplicarOp(estado.base, op);
+          estado.rev = rev;
+          estado.pendente = null;
+          enviarEspera(chave, estado);
+          return;
+        }
+        let remota = op;
+        if (estado.pendente) {
+          const t = transformar(estado.pendente, remota);
+          estado.pendente = t[0];
+          remota = t[1];
+        }
+        if (estado.espera) {
+          const t = transformar(estado.espera, remota);
+          estado.espera = t[0];
+          remota = t[1];
+        }
+        estado.base = aplicarOp(estado.base, op);
+        estado.rev = rev;
+        const campo = campoDaChave(chave);
+        if (campo) {
+          aplicarOpNoCampo(campo, remota);
+          estado.ultimo = campo.value;
+        }
+      } catch (erro) {
+        foraDeSincronia[chave] = true;
+        pedirResync(chave);
+      }
+    });
+
+    const checkpoints = lote.checkpoints || {};
+    Object.keys(checkpoints).forEach(function (chave) {
+      const estado = deltas[chave];
+      const rev = checkpoints[chave][0];
+      const valor = checkpoints[chave][1];
+      if (!estado || foraDeSincronia[chave] || estado.rev !== rev || estado.base === valor) return;
+      adotar(chave, rev, valor);  // divergiu: vale o servidor
+    });
+  }
+
+  socket.on('campo_estado', function (dados) {
+    adotar(dados.name, dados.rev, dados.value || '');
+  });
+
+  function receberUsuarios(dados) {
+    const contador = document.getElementById('users-count');
+    if (contador) contador.innerText = dados.count;
+  }
+
+  const recebedores = { fields_update: receberCampos, fields_delta: receberDeltas, update_users: receberUsuarios };
+  Object.keys(recebedores).forEach(function (evento) { socket.on(evento, recebedores[evento]); });
+  socket.on('b', function (dados) {
+    const mensagem = decodificar(dados);
+    recebedores[mensagem[0]](mensagem[1]);
+  });
+
+  window.addEventListener('beforeunload', function () {
+    socket.emit('leave', {});
+  });
+})();
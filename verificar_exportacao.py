@@ -0,0 +1,99 @@
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+# Verificação de ida e volta da exportação: o CSV de /atas/exportar, lido pela
+# importação, devolve as mesmas atas.
+#
+# Grava EXEMPLOS numa ala nova de um banco temporário (só o schema), exporta
+# com exportacao.blocos_de_linhas/gerar_csv, relê o arquivo com
+# importacao.linhas_csv/ler_linha e compara tipo, data e detalhes. Os exemplos
+# têm itens de lista com ';' e ',' (o separador das planilhas feitas à mão e o
+# do CSV) e aspas, que são o que uma codificação ambígua das listas quebraria.
+# Falha (código 1) na primeira diferença.
+#
+#   python verificar_exportacao.py
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+EXEMPLOS = [
+    {
+        'tipo': 'sacramental', 'data': '2025-03-02',
+        'presidido': 'Bispo Silva', 'tema': 'Fé; esperança e caridade',
+        'hino_abertura': '2 - Oh! Que Glória', 'oracao_abertura': 'Irmã Souza',
+        'discursantes': ['Irmão Lima; Jovem', 'Irmã "Cida" Ramos', 'Irmão Costa, sumo sacerdote'],
+        'anuncios': ['Batismo sábado; 10h na capela', '[Aviso] limpeza da capela'],
+    },
+    {
+        'tipo': 'sacramental', 'data': '2025-03-09',
+        'presidido': 'Bispo Silva', 'discursantes': [], 'anuncios': ['Só um anúncio'],
+    },
+    {
+        'tipo': 'batismo', 'data': '2025-03-15',
+        'presidido': 'Bispo Silva', 'testemunha1': 'Irmão Lima',
+        'batizados': ['Ana; filha de Paulo', 'Pedro'],
+    },
+]
+
+
+def ida_e_volta(ala_id):
+    """Lista de diferenças entre EXEMPLOS e o que volta do CSV exportado"""
+    import exportacao
+    import importacao
+
+    relatorio = importacao.importar(ala_id, enumerate(EXEMPLOS, 1))
+    if relatorio['total_erros']:
+        return [f"importação dos exemplos: {relatorio['erros']}"]
+
+    csv_exportado = b''.join(exportacao.gerar_csv(exportacao.blocos_de_linhas(ala_id))).decode('utf-8-sig')
+    lidas = [importacao.ler_linha(linha) for _, linha in importacao.linhas_csv(io.StringIO(csv_exportado, newline=''))]
+
+    esperadas = [importacao.ler_linha(exemplo) for exemplo in EXEMPLOS]
+    if len(lidas) != len(esperadas):
+        return [f"{len(esperadas)} atas gravadas, {len(lidas)} no CSV"]
+    diferencas = []
+    for (tipo, data, detalhes), (tipo_lido, data_lida, detalhes_lidos) in zip(esperadas, lidas):
+        if (tipo, data) != (tipo_lido, data_lida):
+            diferencas.append(f"{tipo} {data}: voltou como {tipo_lido} {data_lida}")
+            continue
+        for campo, valor in detalhes.items():
+            if detalhes_lidos.get(campo) != valor:
+                diferencas.append(f"{tipo} {data} {campo}: {valor!r} voltou como {detalhes_lidos.get(campo)!r}")
+    return diferencas
+
+
+def main(argv=None):
+    argparse.ArgumentParser(description="Falha se o CSV exportado não importar de volta as mesmas atas").parse_args(argv)
+
+    pasta = tempfile.TemporaryDirectory(prefix='verificar_exportacao_')
+    # Importar app.py aplica as migrações nesse banco
+    os.environ['DB_PATH'] = os.path.join(pasta.name, 'atas.db')
+    os.environ.setdefault('PDF_CACHE_DIR', os.path.join(pasta.name, 'pdf_cache'))
+    sys.path.insert(0, RAIZ)
+    from app import app
+    from db import get_db
+
+    try:
+        with app.app_context():
+            conn = get_db()
+            ala_id = conn.execute(
+                "INSERT INTO users (username, password) VALUES (?, ?)", ('exportacao', 'exportacao')
+            ).lastrowid
+            conn.commit()
+            diferencas = ida_e_volta(ala_id)
+    finally:
+        pasta.cleanup()
+
+    if diferencas:
+        print(f"{len(diferencas)} diferença(s) entre as atas gravadas e o CSV exportado:")
+        for diferenca in diferencas:
+            print(f"  {diferenca}")
+        return 1
+    print(f"{len(EXEMPLOS)} atas exportadas em CSV e importadas de volta sem diferenças")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import argparse
+import ast
+import importlib
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+# Verificação dos planos de consulta: nenhum SQL da aplicação pode varrer a
+# tabela inteira de atas ou sacramental.
+#
+# Lê o código de MODULOS (app.py e os módulos que as rotas chamam), acha cada
+# texto que começa com SELECT/INSERT/UPDATE/DELETE/WITH, inclusive f-strings,
+# roda EXPLAIN QUERY PLAN em cada um e falha (código 1) se o plano tiver
+# "SCAN atas" ou "SCAN sacramental" (com ou sem índice: varrer o índice
+# inteiro também cresce com a tabela). Os corpos dos triggers do banco entram
+# também, com NEW.x/OLD.x trocados por parâmetros. Um índice apagado ou uma
+# consulta nova que não usa nenhum aparece aqui antes de chegar à produção.
+#
+# As f-strings são montadas de verdade: os nomes vêm do próprio módulo
+# (FILTRO_MES, COLUNAS_AUTOSAVE...) e, para variáveis locais, de EXEMPLOS.
+# O que não dá para montar é listado como não verificado, sem falhar.
+# Varreduras intencionais (manutenção que lê tudo de propósito) ficam em
+# PERMITIDAS, com o motivo.
+#
+#   python verificar_planos.py                          (banco novo, só o schema)
+#   python verificar_planos.py --banco /tmp/volume.db   (banco do gerador_dados.py)
+#   python verificar_planos.py --planos                 (mostra o plano de cada SQL)
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+MODULOS = ('app', 'models', 'api', 'exportacao', 'importacao')
+TABELAS_VIGIADAS = ('atas', 'sacramental')
+
+# (módulo, função ou constante): motivo
+PERMITIDAS = {
+    ('models', 'SQL_RECONTAR_ESTATISTICAS'): "recontagem de todas as atas do verificar-estatisticas (comando administrativo)",
+    ('models', 'reconstruir_estatisticas'): "verificar-estatisticas --corrigir (comando administrativo)",
+}
+
+# Valores de exemplo para as variáveis locais usadas dentro das f-strings
+EXEMPLOS = {
+    'tipo': 'sacramental',
+    'tabela': 'sacramental',
+    'marcas': '?,?',
+    'ids': [1, 2],
+    'ids_tabela': [1, 2],
+    'colunas': ('presidido', 'dirigido'),
+    'itens': {'discursante': [], 'anuncio': []},
+}
+
+_INICIO_SQL = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b', re.IGNORECASE)
+_PARAMETRO_NOMEADO = re.compile(r'(?<![:\w]):(\w+)')
+_APELIDO = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_PALAVRAS = {
+    'where', 'join', 'left', 'inner', 'cross', 'on', 'using', 'order', 'group', 'limit', 'set',
+    'values', 'select', 'as', 'natural', 'outer', 'union', 'having', 'window', 'default', 'indexed',
+}
+_NEW_OLD = re.compile(r'\b(?:NEW|OLD)\.\w+', re.IGNORECASE)
+
+
+class Sql:
+    def __init__(self, origem, linha, texto=None, problema=None):
+        self.origem = origem        # (módulo, função)
+        self.linha = linha
+        self.texto = texto
+        self.problema = problema    # motivo de não ter sido verificado
+
+    @property
+    def local(self):
+        modulo, funcao = self.origem
+        return f"{modulo}.py:{self.linha} ({funcao})" if self.linha else f"trigger {funcao}"
+
+
+class _Coletor(ast.NodeVisitor):
+    """Textos SQL de um módulo, com a função onde aparecem"""
+
+    def __init__(self, nome, namespace):
+        self.nome = nome
+        self.namespace = namespace
+        self.funcao = '<módulo>'
+        self.encontrados = []
+
+    def visit_FunctionDef(self, no):
+        anterior, self.funcao = self.funcao, no.name
+        self.generic_visit(no)
+        self.funcao = anterior
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, no):
+        # SQL em constante do módulo (SQL_INSERIR_PARTICIPANTE...): a origem é o nome dela
+        if self.funcao == '<módulo>' and len(no.targets) == 1 and isinstance(no.targets[0], ast.Name):
+            self.funcao = no.targets[0].id
+            self.generic_visit(no)
+            self.funcao = '<módulo>'
+        else:
+            self.generic_visit(no)
+
+    def visit_Expr(self, no):
+        # Texto solto é docstring ("UPDATE só das colunas..."), nunca SQL executado
+        if not (isinstance(no.value, ast.Constant) and isinstance(no.value.value, str)):
+            self.generic_visit(no)
+
+    def visit_Constant(self, no):
+        if isinstance(no.value, str) and _INICIO_SQL.match(no.value):
+            self.encontrados.append(Sql((self.nome, self.funcao), no.lineno, no.value))
+
+    def visit_JoinedStr(self, no):
+        # Só a f-string de fora: as partes e as f-strings internas não são SQL sozinhas
+        primeira = no.values[0] if no.values else None
+        if not (isinstance(primeira, ast.Constant) and _INICIO_SQL.match(primeira.value)):
+            return
+        try:
+            texto = eval(compile(ast.Expression(no), self.nome, 'eval'), {**self.namespace, **EXEMPLOS})
+        except Exception as e:
+            self.encontrados.append(Sql((self.nome, self.funcao), no.lineno, problema=f"f-string: {e}"))
+            return
+        self.encontrados.append(Sql((self.nome, self.funcao), no.lineno, texto))
+
+
+def sql_dos_modulos(modulos=MODULOS):
+    for nome in modulos:
+        modulo = importlib.import_module(nome)
+        with open(modulo.__file__, encoding='utf-8') as arquivo:
+            arvore = ast.parse(arquivo.read(), modulo.__file__)
+        coletor = _Coletor(nome, vars(modulo))
+        coletor.visit(arvore)
+        yield from coletor.encontrados
+
+
+def sql_dos_triggers(conn):
+    for nome, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"):
+        corpo = sql[sql.upper().index('BEGIN') + len('BEGIN'):sql.upper().rindex('END')]
+        for comando in corpo.split(';'):
+            if comando.strip():
+                yield Sql(('trigger', nome), None, _NEW_OLD.sub('?', comando.strip()))
+
+
+def apelidos(conn):
+    """{apelido ou nome: tabela} tirado do SQL das views (o das consultas é somado depois)"""
+    mapa = {}
+    for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view'"):
+        mapa.update(_apelidos_do_sql(sql))
+    return mapa
+
+
+def _apelidos_do_sql(sql):
+    mapa = {}
+    for tabela, apelido in _APELIDO.findall(sql):
+        mapa[tabela.lower()] = tabela.lower()
+        if apelido and apelido.lower() not in _PALAVRAS:
+            mapa[apelido.lower()] = tabela.lower()
+    return mapa
+
+
+def plano(conn, sql):
+    nomes = _PARAMETRO_NOMEADO.findall(sql)
+    parametros = dict.fromkeys(nomes) if nomes else [None] * sql.count('?')
+    return [linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+
+
+def varreduras(detalhes, mapa):
+    """Linhas do plano que varrem uma das TABELAS_VIGIADAS"""
+    encontradas = []
+    for detalhe in detalhes:
+        partes = detalhe.split()
+        if len(partes) >= 2 and partes[0] == 'SCAN' and mapa.get(partes[1].lower()) in TABELAS_VIGIADAS:
+            encontradas.append(detalhe)
+    return encontradas
+
+
+def verificar(conn, comandos, mostrar_planos=False):
+    """(verificados, não verificados, violações, permitidos)"""
+    mapa_views = apelidos(conn)
+    verificados, nao_verificados, violacoes, permitidos = [], [], [], []
+    for sql in comandos:
+        if sql.problema:
+            nao_verificados.append(sql)
+            continue
+        try:
+            detalhes = plano(conn, sql.texto)
+        except sqlite3.Error as e:
+            sql.problema = str(e)
+            nao_verificados.append(sql)
+            continue
+        verificados.append(sql)
+        if mostrar_planos:
+            print(f"{sql.local}: {' | '.join(detalhes)}")
+        encontradas = varreduras(detalhes, {**mapa_views, **_apelidos_do_sql(sql.texto)})
+        if encontradas:
+            (permitidos if sql.origem in PERMITIDAS else violacoes).append((sql, encontradas))
+    return verificados, nao_verificados, violacoes, permitidos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Falha se algum SQL do app varrer atas ou sacramental inteiras")
+    parser.add_argument('--banco', help="banco a usar (padrão: um banco novo, só com as migrações)")
+    parser.add_argument('--planos', action='store_true', help="mostra o plano de cada SQL")
+    args = parser.parse_args(argv)
+
+    pasta = tempfile.TemporaryDirectory(prefix='verificar_planos_')
+    caminho = os.path.abspath(args.banco) if args.banco else os.path.join(pasta.name, 'atas.db')
+    # Importar app.py aplica as migrações nesse banco
+    os.environ['DB_PATH'] = caminho
+    os.environ.setdefault('PDF_CACHE_DIR', os.path.join(pasta.name, 'pdf_cache'))
+    sys.path.insert(0, RAIZ)
+
+    comandos = list(sql_dos_modulos())
+    conn = sqlite3.connect(caminho)
+    try:
+        comandos += list(sql_dos_triggers(conn))
+        verificados, nao_verificados, violacoes, permitidos = verificar(conn, comandos, args.planos)
+    finally:
+        conn.close()
+        pasta.cleanup()
+
+    print(f"{len(verificados)} SQL verificados ({len(comandos)} encontrados em {', '.join(MODULOS)} e nos triggers)")
+    for sql in nao_verificados:
+        print(f"  não verificado: {sql.local}: {sql.problema}")
+    for sql, encontradas in permitidos:
+        print(f"  permitido: {sql.local}: {'; '.join(encontradas)} ({PERMITIDAS[sql.origem]})")
+    if violacoes:
+        print(f"{len(violacoes)} SQL varrem {' ou '.join(TABELAS_VIGIADAS)} inteira:")
+        for sql, encontradas in violacoes:
+            print(f"  {sql.local}: {'; '.join(encontradas)}")
+            print(f"    {' '.join(sql.texto.split())[:200]}")
+        return 1
+    print(f"Nenhuma varredura completa de {' ou '.join(TABELAS_VIGIADAS)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())